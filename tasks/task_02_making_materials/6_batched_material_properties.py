@@ -0,0 +1,276 @@
+"""
+This script finds material densities and atom densities for arrays of
+temperature, pressure and enrichment in a single call.
+
+4_example_materials_parameter_study.ipynb calls nmm.Material.from_library
+once for every point. Each call makes a complete openmc.Material just to read
+the density, which is slow when thousands of points are needed (for example
+inside an optimisation loop).
+
+Here the density of each point is found without making materials:
+- coolants (water and helium) use the same CoolProp equation of state as the
+  Neutronics Material Maker. The equation of state is called once with arrays
+  for all the new temperature and pressure points and the results are stored
+  so repeated points are not calculated again.
+- solids (the lithium ceramic) get their density from a unit cell in the
+  Neutronics Material Maker. Changing the enrichment changes the mass of the
+  lithium atoms but not the number of atoms in the unit cell, so the density
+  scales with the molar mass. The Neutronics Material Maker is used once for
+  each material to get the reference density.
+
+An openmc.Material is only made when it is asked for with make_openmc_material.
+"""
+
+import functools
+import re
+import time
+
+import numpy as np
+import openmc
+import openmc.data
+from CoolProp.CoolProp import PropsSI
+
+import neutronics_material_maker as nmm
+
+AVOGADRO = 6.02214076e23
+
+# the chemical formula of each material and the name CoolProp uses for coolants
+material_properties = {
+    'H2O': {'chemical_equation': 'H2O', 'coolprop_name': 'Water'},
+    'He': {'chemical_equation': 'He', 'coolprop_name': 'Helium'},
+    'Li4SiO4': {'chemical_equation': 'Li4SiO4', 'enrichment_target': 'Li6'},
+}
+
+# densities in g/cm3 found with the equation of state, keyed by (fluid, temperature, pressure)
+_eos_densities = {}
+
+
+@functools.lru_cache(maxsize=None)
+def get_formula_elements(chemical_equation):
+    """Splits a chemical formula such as Li4SiO4 into elements and number of
+    atoms, for example {'Li': 4, 'Si': 1, 'O': 4}"""
+    elements = {}
+    for element, count in re.findall(r'([A-Z][a-z]?)(\d*)', chemical_equation):
+        elements[element] = elements.get(element, 0) + (int(count) if count else 1)
+    return elements
+
+
+@functools.lru_cache(maxsize=None)
+def get_element_nuclide_fractions(element, enrichment_target=None, enrichment=None):
+    """Finds the atom fraction of each nuclide in an element. Enrichment is
+    the atom percent of the enrichment target, the rest of the element is
+    made of the other nuclides in their natural proportions."""
+    natural = {
+        nuclide: abundance
+        for nuclide, abundance in openmc.data.NATURAL_ABUNDANCE.items()
+        if re.match(rf'{element}\d', nuclide)
+    }
+    if enrichment is None or enrichment_target not in natural:
+        return natural
+
+    others = {nuclide: abundance for nuclide, abundance in natural.items() if nuclide != enrichment_target}
+    others_total = sum(others.values())
+    fractions = {enrichment_target: enrichment / 100.}
+    for nuclide, abundance in others.items():
+        fractions[nuclide] = (1. - enrichment / 100.) * abundance / others_total
+    return fractions
+
+
+@functools.lru_cache(maxsize=None)
+def get_nuclide_atoms_per_formula(material_name, enrichment=None):
+    """Finds the number of atoms of each nuclide in one formula unit of the
+    material, for example Li6 0.3, Li7 3.7, Si28 0.92 ... for Li4SiO4"""
+    properties = material_properties[material_name]
+    atoms_per_formula = {}
+    for element, count in get_formula_elements(properties['chemical_equation']).items():
+        fractions = get_element_nuclide_fractions(element, properties.get('enrichment_target'), enrichment)
+        for nuclide, fraction in fractions.items():
+            atoms_per_formula[nuclide] = count * fraction
+    return atoms_per_formula
+
+
+def get_molar_mass(material_name, enrichments):
+    """Finds the mass in grams of a mole of formula units for an array of
+    enrichments. The molar mass is linear in the enrichment so it is found at
+    0 and 100 percent enrichment and interpolated."""
+    if 'enrichment_target' not in material_properties[material_name]:
+        mass = _molar_mass_at(material_name, None)
+        return np.full(np.shape(enrichments), mass)
+    mass_at_0 = _molar_mass_at(material_name, 0.)
+    mass_at_100 = _molar_mass_at(material_name, 100.)
+    return mass_at_0 + (mass_at_100 - mass_at_0) * np.asarray(enrichments) / 100.
+
+
+@functools.lru_cache(maxsize=None)
+def _molar_mass_at(material_name, enrichment):
+    atoms_per_formula = get_nuclide_atoms_per_formula(material_name, enrichment)
+    return sum(count * openmc.data.atomic_mass(nuclide) for nuclide, count in atoms_per_formula.items())
+
+
+@functools.lru_cache(maxsize=None)
+def get_reference_density(material_name, reference_enrichment=0.):
+    """Gets the density of a solid at one enrichment from the Neutronics
+    Material Maker. This is the only time a material is made for a solid."""
+    return nmm.Material.from_library(material_name, enrichment=reference_enrichment).openmc_material.density
+
+
+def get_coolant_densities(fluid, temperatures, pressures):
+    """Finds the density of a coolant in g/cm3 for arrays of temperature (K)
+    and pressure (Pa). Only the points that have not been found before are
+    sent to CoolProp, in a single call."""
+    temperatures, pressures = np.broadcast_arrays(
+        np.asarray(temperatures, dtype=float), np.asarray(pressures, dtype=float)
+    )
+    points = list(zip(temperatures.ravel().tolist(), pressures.ravel().tolist()))
+
+    new_points = sorted({point for point in points if (fluid, *point) not in _eos_densities})
+    if new_points:
+        new_temperatures, new_pressures = np.array(new_points).T
+        # CoolProp gives the density in kg/m3
+        new_densities = np.atleast_1d(PropsSI('D', 'T', new_temperatures, 'P', new_pressures, fluid)) / 1000.
+        for point, density in zip(new_points, new_densities):
+            _eos_densities[(fluid, *point)] = density
+
+    densities = np.array([_eos_densities[(fluid, *point)] for point in points])
+    return densities.reshape(temperatures.shape)
+
+
+def get_material_properties(material_name, temperatures=293., pressures=101325., enrichments=None):
+    """Finds the density and the atom densities of a material for arrays of
+    temperature, pressure and enrichment. The arrays are broadcast together so
+    a single value can be used for parameters that don't change.
+
+    Args:
+        material_name (str): a material in material_properties
+        temperatures (float or numpy.ndarray): temperature in K, used for coolants
+        pressures (float or numpy.ndarray): pressure in Pa, used for coolants
+        enrichments (float or numpy.ndarray): atom percent of the enrichment target
+
+    Returns:
+        dict: the 'density' in g/cm3, the total 'atom_density' in atom/b-cm
+            and the 'nuclide_atom_densities' in atom/b-cm as a dict of arrays
+    """
+    properties = material_properties[material_name]
+    if enrichments is None:
+        enrichments = np.nan  # nan marks natural composition
+    temperatures, pressures, enrichments = np.broadcast_arrays(
+        np.asarray(temperatures, dtype=float),
+        np.asarray(pressures, dtype=float),
+        np.asarray(enrichments, dtype=float),
+    )
+    natural = np.isnan(enrichments)
+
+    if 'coolprop_name' in properties:
+        densities = get_coolant_densities(properties['coolprop_name'], temperatures, pressures)
+        molar_masses = get_molar_mass(material_name, np.zeros(densities.shape))
+    else:
+        molar_masses = get_molar_mass(material_name, np.where(natural, 0., enrichments))
+        molar_masses = np.where(natural, _molar_mass_at(material_name, None), molar_masses)
+        # the number of formula units per cm3 does not change with enrichment
+        reference_density = get_reference_density(material_name)
+        densities = reference_density * molar_masses / _molar_mass_at(material_name, 0.)
+
+    # formula units per barn-cm
+    formula_densities = densities * AVOGADRO / molar_masses * 1e-24
+
+    nuclide_atom_densities = {}
+    for enrichment in np.unique(enrichments):
+        mask = np.isnan(enrichments) if np.isnan(enrichment) else enrichments == enrichment
+        key = None if np.isnan(enrichment) else float(enrichment)
+        for nuclide, count in get_nuclide_atoms_per_formula(material_name, key).items():
+            nuclide_atom_densities.setdefault(nuclide, np.zeros(densities.shape))
+            nuclide_atom_densities[nuclide][mask] = formula_densities[mask] * count
+
+    atoms_per_formula = sum(get_formula_elements(properties['chemical_equation']).values())
+    return {
+        'density': densities,
+        'atom_density': formula_densities * atoms_per_formula,
+        'nuclide_atom_densities': nuclide_atom_densities,
+    }
+
+
+def make_openmc_material(material_name, temperature=293., pressure=101325., enrichment=None):
+    """Makes an openmc.Material for a single point, for when a material is
+    needed for a simulation"""
+    results = get_material_properties(material_name, temperature, pressure, enrichment)
+    material = openmc.Material(name=material_name)
+    for nuclide, atom_densities in results['nuclide_atom_densities'].items():
+        if atom_densities.item() > 0.:
+            material.add_nuclide(nuclide, atom_densities.item())
+    material.set_density('atom/b-cm', results['atom_density'].item())
+    material.temperature = temperature
+    return material
+
+
+# the same parameter studies as 4_example_materials_parameter_study.ipynb
+temperatures = np.linspace(400, 800., 100)
+water = get_material_properties('H2O', temperatures=temperatures, pressures=15500000)
+
+pressures = np.linspace(1000000., 10000000., 100)
+helium = get_material_properties('He', temperatures=700, pressures=pressures)
+
+enrichments = np.linspace(0., 100., 50)
+li4sio4 = get_material_properties('Li4SiO4', enrichments=enrichments)
+
+# a 2D study of water density is a single call as well
+temperature_grid, pressure_grid = np.meshgrid(np.linspace(400, 600., 200), np.linspace(5e6, 20e6, 200))
+start = time.perf_counter()
+water_grid = get_material_properties('H2O', temperatures=temperature_grid, pressures=pressure_grid)
+print(f'{temperature_grid.size} water densities found in {time.perf_counter() - start:.3f} seconds')
+
+# repeated points are read from the stored equation of state results
+start = time.perf_counter()
+get_material_properties('H2O', temperatures=temperature_grid, pressures=pressure_grid)
+print(f'the same {temperature_grid.size} points again in {time.perf_counter() - start:.3f} seconds')
+
+# checks a few points against the Neutronics Material Maker
+for temperature, density in zip(temperatures[::25], water['density'][::25]):
+    nmm_density = nmm.Material.from_library('H2O', temperature=temperature, pressure=15500000).openmc_material.density
+    print(f'water at {temperature:.0f}K {density:.5f} g/cm3, Neutronics Material Maker {nmm_density:.5f} g/cm3')
+for enrichment, density in zip(enrichments[::10], li4sio4['density'][::10]):
+    nmm_density = nmm.Material.from_library('Li4SiO4', enrichment=enrichment).openmc_material.density
+    print(f'Li4SiO4 at {enrichment:.0f}% enrichment {density:.5f} g/cm3, Neutronics Material Maker {nmm_density:.5f} g/cm3')
+
+# plotting results
+import plotly.graph_objs as go
+
+fig = go.Figure()
+fig.add_trace(go.Scatter(x=temperatures, y=water['density'], mode='lines', name='density'))
+fig.update_layout(
+    title="Water density as a function of temperature (at constant pressure)",
+    xaxis_title="Temperature in K",
+    yaxis_title="Density (g/cm3)"
+)
+fig.show()
+
+fig = go.Figure()
+fig.add_trace(go.Scatter(x=pressures, y=helium['atom_density'], mode='lines', name='atom density'))
+fig.update_layout(
+    title="Helium atom density as a function of pressure (at constant temperature)",
+    xaxis_title="Pressure in Pa",
+    yaxis_title="Atom density (atom/b-cm)"
+)
+fig.show()
+
+fig = go.Figure()
+for nuclide in ['Li6', 'Li7']:
+    fig.add_trace(go.Scatter(x=enrichments, y=li4sio4['nuclide_atom_densities'][nuclide], mode='lines', name=nuclide))
+fig.update_layout(
+    title="Lithium ceramic lithium atom densities as a function of Li-6 enrichment",
+    xaxis_title="Li-6 enrichment",
+    yaxis_title="Atom density (atom/b-cm)"
+)
+fig.show()
+
+fig = go.Figure(data=go.Contour(
+    z=water_grid['density'],
+    x=temperature_grid[0],
+    y=pressure_grid[:, 0],
+    colorbar={'title': 'Density (g/cm3)'},
+))
+fig.update_layout(
+    title="Water density as a function of temperature and pressure",
+    xaxis_title="Temperature in K",
+    yaxis_title="Pressure in Pa"
+)
+fig.show()
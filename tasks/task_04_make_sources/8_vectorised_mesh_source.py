@@ -0,0 +1,166 @@
+# this example makes a mesh source with a different source strength and energy
+# spectrum in every voxel of a cylindrical mesh without making a python source
+# object for every voxel.
+
+# 7_strucutured_mesh_source.py makes an openmc.IndependentSource for each voxel
+# in a python loop. That is fine for 1000 voxels, but a plasma source mesh with
+# 10^6 voxels takes minutes and gigabytes of memory to make and export.
+
+# Here the strength and the energy spectrum of every voxel are found with numpy
+# arrays from the voxel centres. The voxels only use a few different energy
+# spectra, so each voxel just stores the index of its spectrum in a small
+# table. The settings.xml is then written directly. The XML for each spectrum
+# is made once and reused for every voxel, and the voxels are written to the
+# file a chunk at a time.
+
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import openmc
+
+# setting the nuclear data path to the correct location in the docker image
+openmc.config['cross_sections'] = '/nuclear_data/cross_sections.xml'
+
+# a simple plasma, a ring with a major radius and a circular cross section
+major_radius = 1500
+minor_radius = 400
+peak_ion_temperature = 20e3  # eV
+
+# making a minimal geometry
+sphere_surf_1 = openmc.Sphere(r=2000, boundary_type='vacuum')
+sphere_cell_1 = openmc.Cell(region=-sphere_surf_1)
+
+my_geometry = openmc.Geometry([sphere_cell_1])
+my_materials = openmc.Materials()
+
+# creating the mesh used for the mesh source, this has a million voxels
+cylindrical_mesh = openmc.CylindricalMesh.from_domain(
+    my_geometry, # the corners of the mesh are being set automatically to surround the geometry
+    dimension=[100, 100, 100]
+)
+
+# the small table of energy spectra shared by the voxels, one for each ion temperature band
+ion_temperature_bands = np.linspace(0, peak_ion_temperature, 11)
+energy_distributions = [
+    openmc.stats.muir(e0=14.08e6, m_rat=5.0, kt=0.5 * (low + high))
+    for low, high in zip(ion_temperature_bands[:-1], ion_temperature_bands[1:])
+]
+
+start = time.perf_counter()
+
+# the r and z of the centre of every voxel, as arrays with the mesh shape (r, phi, z)
+r_centres = 0.5 * (cylindrical_mesh.r_grid[1:] + cylindrical_mesh.r_grid[:-1])
+z_centres = 0.5 * (cylindrical_mesh.z_grid[1:] + cylindrical_mesh.z_grid[:-1])
+r = r_centres[:, np.newaxis, np.newaxis]
+z = z_centres[np.newaxis, np.newaxis, :]
+
+# the normalised distance from the middle of the plasma, 0 in the middle and 1 at the edge
+rho = np.sqrt((r - major_radius)**2 + z**2) / minor_radius
+rho = np.broadcast_to(rho, cylindrical_mesh.dimension)
+
+# the neutron emission goes with the square of the ion density, here a parabolic profile
+strengths = np.where(rho < 1, (1 - rho**2)**2, 0.) * cylindrical_mesh.volumes
+strengths /= strengths.sum()  # the source strengths sum to 1 to make post processing easier
+
+ion_temperatures = np.where(rho < 1, peak_ion_temperature * (1 - rho**2), 0.)
+spectrum_indices = np.clip(np.digitize(ion_temperatures, ion_temperature_bands) - 1, 0, len(energy_distributions) - 1)
+
+print(f'voxel strengths and spectra found in {time.perf_counter() - start:.2f} seconds')
+
+
+def write_mesh_source_settings(settings, mesh, strengths, spectrum_indices, energy_distributions,
+                               angle=None, particle='neutron', filename='settings.xml', voxels_per_chunk=100_000):
+    """Writes a settings.xml file with a mesh source made from arrays instead
+    of a python source object for each voxel
+
+    Args:
+        settings (openmc.Settings): the settings, any source on the settings is replaced
+        mesh (openmc.StructuredMesh): the mesh of the mesh source
+        strengths (numpy.ndarray): the source strength of each voxel, with the mesh shape
+        spectrum_indices (numpy.ndarray): the index in energy_distributions of
+            each voxel's energy spectrum, with the mesh shape
+        energy_distributions (list): the energy distributions shared by the voxels
+        angle (openmc.stats.UnitSphere): the angle distribution of every voxel, isotropic by default
+        particle (str): the source particle
+        filename (str): the settings file to write
+        voxels_per_chunk (int): the number of voxels written to the file at once
+    """
+    if angle is None:
+        angle = openmc.stats.Isotropic()
+
+    # the XML for each spectrum is made once, the strength is put in each time it is used
+    marker = 'STRENGTH'
+    templates = []
+    for energy in energy_distributions:
+        element = openmc.IndependentSource(energy=energy, angle=angle, particle=particle).to_xml_element()
+        element.set('strength', marker)
+        templates.append(ET.tostring(element, encoding='unicode').split(marker))
+    prefixes = np.array([template[0] for template in templates], dtype=object)
+    suffixes = np.array([template[1] for template in templates], dtype=object)
+
+    # the rest of the settings are written by openmc then the mesh source is added
+    settings.source = []
+    root = settings.to_xml_element()
+    root.append(mesh.to_xml_element())
+    settings_xml = ET.tostring(root, encoding='unicode')
+    head, tail = settings_xml.rsplit('</settings>', 1)
+
+    # mesh sources list the voxels with the first mesh index changing fastest
+    flat_strengths = np.asarray(strengths).ravel(order='F')
+    flat_indices = np.asarray(spectrum_indices).ravel(order='F')
+
+    with open(filename, 'w') as settings_file:
+        settings_file.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        settings_file.write(head)
+        settings_file.write(f'<source type="mesh" mesh="{mesh.id}" strength="{flat_strengths.sum()}">')
+        for first in range(0, flat_strengths.size, voxels_per_chunk):
+            chunk_strengths = flat_strengths[first:first + voxels_per_chunk]
+            chunk_indices = flat_indices[first:first + voxels_per_chunk]
+            settings_file.write(''.join(
+                prefixes[chunk_indices] + chunk_strengths.astype(str).astype(object) + suffixes[chunk_indices]
+            ))
+        settings_file.write('</source>')
+        settings_file.write('</settings>' + tail)
+
+
+my_settings = openmc.Settings()
+my_settings.run_mode = 'fixed source'
+my_settings.batches = 1
+my_settings.particles = 1000
+
+start = time.perf_counter()
+write_mesh_source_settings(
+    settings=my_settings,
+    mesh=cylindrical_mesh,
+    strengths=strengths,
+    spectrum_indices=spectrum_indices,
+    energy_distributions=energy_distributions,
+)
+print(f'settings.xml with {strengths.size} voxel sources written in {time.perf_counter() - start:.2f} seconds')
+
+# the geometry and materials are written to separate files as the settings.xml
+# has been written above and model.xml would replace it
+my_geometry.export_to_xml()
+my_materials.export_to_xml()
+
+# samples some source particles with openmc.lib to check the source
+import openmc.lib
+import matplotlib.pyplot as plt
+
+openmc.lib.init(output=False)
+particles = openmc.lib.sample_external_source(n_samples=10000)
+openmc.lib.finalize()
+
+positions = np.array([particle.r for particle in particles])
+energies = np.array([particle.E for particle in particles])
+
+fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+ax1.scatter(np.hypot(positions[:, 0], positions[:, 1]), positions[:, 2], s=1)
+ax1.set_xlabel('r [cm]')
+ax1.set_ylabel('z [cm]')
+ax1.set_title('Sampled source positions')
+ax2.hist(energies / 1e6, bins=100)
+ax2.set_xlabel('Energy [MeV]')
+ax2.set_title('Sampled source energies')
+plt.show()
@@ -0,0 +1,230 @@
+"""
+This script performs a parameter sweep to find Tritium Breeding Ratio (TBR)
+as a function of lithium 6 enrichment and breeder density using several
+processes that each load the nuclear data just once.
+
+3_example_tritium_production_study_with_openmc_lib.py loads the nuclear data
+once but runs each simulation one after another in a single process. Here a
+number of worker processes are started and each one calls openmc.lib.init()
+once with its share of the CPU threads. The parameter points are sent to the
+workers through a queue and each worker changes the breeder material with
+set_densities, runs the simulation and sends back the tally mean and std_dev.
+
+This uses all the cores for a large sweep (200 points here) while only loading
+the nuclear data once per worker.
+"""
+
+import multiprocessing
+import os
+import queue
+import traceback
+from pathlib import Path
+
+import numpy as np
+import openmc
+
+# the number of worker processes, each worker gets an equal share of the cores as threads
+n_workers = 4
+threads_per_worker = max(1, os.cpu_count() // n_workers)
+
+enrichments = np.linspace(0.0001, 0.9999, 20)  # fraction of lithium that is Li6
+densities = np.linspace(9., 11.5, 10)  # breeder density in g/cm3
+
+
+def make_breeder_material(enrichment, density):
+    """Makes the breeder material for a given Li6 enrichment and density
+
+    Args:
+        enrichment (float): the fraction of the lithium that is Li6
+        density (float): the material density in g/cm3
+
+    Returns:
+        openmc.Material: the breeder material
+    """
+    breeder_material = openmc.Material(material_id=12)  # Pb84.2Li15.8
+    breeder_material.add_element('Pb', 84.2)
+    breeder_material.add_nuclide('Li6', 15.8 * enrichment)
+    breeder_material.add_nuclide('Li7', 15.8 * (1. - enrichment))
+    breeder_material.set_density('g/cm3', density)
+    return breeder_material
+
+
+def make_model():
+    """Makes the same simple sphere model as the other TBR examples"""
+
+    # natural lithium is used here so that both Li6 and Li7 data are loaded
+    breeder_material = openmc.Material(material_id=12)  # Pb84.2Li15.8
+    breeder_material.add_element('Pb', 84.2)
+    breeder_material.add_element('Li', 15.8)
+    breeder_material.set_density('g/cm3', 11.)
+
+    steel = openmc.Material(material_id=6)
+    steel.set_density('g/cm3', 7.75)
+    steel.add_element('Fe', 0.95)
+    steel.add_element('C', 0.05)
+
+    my_materials = openmc.Materials([breeder_material, steel])
+
+    # surfaces
+    vessel_inner = openmc.Sphere(r=500)
+    first_wall_outer_surface = openmc.Sphere(r=510)
+    breeder_blanket_outer_surface = openmc.Sphere(r=610, boundary_type='vacuum')
+
+    # cells
+    inner_vessel_cell = openmc.Cell(region=-vessel_inner)
+
+    first_wall_cell = openmc.Cell(region=-first_wall_outer_surface & +vessel_inner)
+    first_wall_cell.fill = steel
+
+    breeder_blanket_cell = openmc.Cell(region=+first_wall_outer_surface & -breeder_blanket_outer_surface)
+    breeder_blanket_cell.fill = breeder_material
+
+    my_geometry = openmc.Geometry([inner_vessel_cell, first_wall_cell, breeder_blanket_cell])
+
+    # SIMULATION SETTINGS
+    my_settings = openmc.Settings()
+    my_settings.batches = 10
+    my_settings.inactive = 0
+    my_settings.particles = 1000
+    my_settings.run_mode = 'fixed source'
+    # the results are read from memory so no statepoint or summary files are
+    # written, otherwise every worker would write them for every point
+    my_settings.statepoint = {'batches': []}
+    my_settings.output = {'summary': False, 'tallies': False}
+
+    source = openmc.IndependentSource()
+    source.space = openmc.stats.Point((0, 0, 0))
+    source.angle = openmc.stats.Isotropic()
+    source.energy = openmc.stats.Discrete([14e6], [1])
+    my_settings.source = source
+
+    # TALLIES
+    cell_filter = openmc.CellFilter(breeder_blanket_cell)
+    tbr_tally = openmc.Tally(name='TBR', tally_id=42)
+    tbr_tally.filters = [cell_filter]
+    tbr_tally.scores = ['(n,Xt)']  # Where X is a wildcard character, this catches any tritium production
+    my_tallies = openmc.Tallies([tbr_tally])
+
+    return openmc.model.Model(my_geometry, my_materials, my_settings, my_tallies)
+
+
+def worker(worker_id, task_queue, result_queue):
+    """Loads the nuclear data once then runs simulations for the parameter
+    points in the task queue until it receives None
+
+    Args:
+        worker_id (int): used to give each worker its own folder
+        task_queue (multiprocessing.Queue): (index, enrichment, density) tuples
+        result_queue (multiprocessing.Queue): (index, mean, std_dev) tuples,
+            or (None, error message) if the worker fails
+    """
+    import openmc.lib
+
+    try:
+        # each worker runs in its own folder so the model files don't clash
+        worker_folder = Path(f'worker_{worker_id}')
+        worker_folder.mkdir(exist_ok=True)
+        os.chdir(worker_folder)
+
+        make_model().export_to_model_xml()
+
+        # the nuclear data is loaded here, once for all the parameter points this worker runs
+        openmc.lib.init(args=['-s', str(threads_per_worker)], output=False)
+        lib_breeder_material = openmc.lib.materials[12]
+
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            index, enrichment, density = task
+
+            # resets the tally to 0 so we don't combine result with previous simulation
+            openmc.lib.hard_reset()
+
+            # get the breeder material nuclides and densities in atom/b-cm
+            new_composition = make_breeder_material(enrichment, density).get_nuclide_atom_densities()
+            lib_breeder_material.set_densities(
+                nuclides=list(new_composition.keys()),
+                densities=list(new_composition.values()),
+            )
+
+            openmc.lib.run(output=False)
+
+            tally = openmc.lib.tallies[42]
+            result_queue.put((index, tally.mean.flatten()[0], tally.std_dev.flatten()[0]))
+
+        # close down openmc lib interface
+        openmc.lib.finalize()
+    except Exception:
+        # the error is sent to the main process so it doesn't wait forever for results
+        result_queue.put((None, f'worker {worker_id} failed\n{traceback.format_exc()}'))
+
+
+# the if __name__ == "__main__" is needed as each worker process imports this script
+if __name__ == "__main__":
+
+    parameter_points = [
+        (enrichment, density) for density in densities for enrichment in enrichments
+    ]
+
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for index, (enrichment, density) in enumerate(parameter_points):
+        task_queue.put((index, enrichment, density))
+    # one None for each worker tells the workers to stop when the queue is empty
+    for _ in range(n_workers):
+        task_queue.put(None)
+
+    workers = [
+        multiprocessing.Process(target=worker, args=(worker_id, task_queue, result_queue))
+        for worker_id in range(n_workers)
+    ]
+    for process in workers:
+        process.start()
+
+    # collects the results as they are finished, they can arrive in any order
+    tbr_mean = np.zeros(len(parameter_points))
+    tbr_std_dev = np.zeros(len(parameter_points))
+    for _ in parameter_points:
+        while True:
+            try:
+                result = result_queue.get(timeout=1)
+                break
+            except queue.Empty:
+                # a worker that crashed without sending an error (for example a
+                # segmentation fault) would otherwise leave this waiting forever
+                exit_codes = [process.exitcode for process in workers]
+                if any(code not in (None, 0) for code in exit_codes):
+                    result = (None, f'a worker process stopped, the exit codes are {exit_codes}')
+                    break
+        if result[0] is None:
+            for process in workers:
+                process.terminate()
+            raise RuntimeError(result[1])
+        index, mean, std_dev = result
+        tbr_mean[index] = mean
+        tbr_std_dev[index] = std_dev
+        print(f'enrichment {parameter_points[index][0]:.3f} density {parameter_points[index][1]:.2f} TBR {mean:.4f} +/- {std_dev:.4f}')
+
+    for process in workers:
+        process.join()
+
+    # plotting results
+    import plotly.graph_objects as go
+
+    fig = go.Figure(
+        data=go.Contour(
+            z=tbr_mean.reshape(len(densities), len(enrichments)),
+            x=enrichments * 100,
+            y=densities,
+            colorbar={'title': 'TBR'},
+        )
+    )
+
+    fig.update_layout(
+        title="TBR as a function of Li6 enrichment and breeder density",
+        xaxis_title="Li6 enrichment (%)",
+        yaxis_title="Breeder density (g/cm3)"
+    )
+
+    fig.show()
@@ -0,0 +1,193 @@
+"""
+This script finds Tritium Breeding Ratio (TBR) as a function of lithium 6
+enrichment and gives each enrichment only the number of batches it needs to
+reach a target precision.
+
+3_example_tritium_production_study_with_openmc_lib.py uses triggers with the
+same maximum number of batches for every enrichment. However the relative
+error of the TBR is different at each enrichment so some points get more
+batches than they need and others don't get enough.
+
+Here every point starts with a small number of pilot batches. The relative
+error is measured for each point and used to estimate the number of extra
+batches each point needs to reach the target relative error. Points get more
+batches in rounds until they reach the target and points that have reached the
+target are not simulated again. This keeps the total CPU time to a minimum for
+a given precision on the whole TBR curve.
+
+Each round is a new simulation with a different random number seed so the
+results from each round are independent and can be combined by adding the
+tally sums and the number of realizations together.
+"""
+
+import time
+
+import numpy as np
+import openmc
+import openmc.lib
+
+# a few user settings
+target_relative_error = 0.002  # the target relative error (std_dev / mean) for every point
+pilot_batches = 10  # the number of batches every point runs first
+max_batches_per_round = 50  # the most batches a point can run in a single round
+max_batches_per_point = 500  # points stop at this number of batches even if they are not converged
+
+# make some python materials
+breeder_material = openmc.Material(material_id=12)  # Pb84.2Li15.8
+breeder_material.add_element('Pb', 84.2)
+breeder_material.add_element('Li', 15.8)
+breeder_material.set_density('g/cm3', 11.)
+
+steel = openmc.Material(material_id=6)
+steel.set_density('g/cm3', 7.75)
+steel.add_element('Fe', 0.95)
+steel.add_element('C', 0.05)
+
+my_materials = openmc.Materials([breeder_material, steel])
+
+# surfaces
+vessel_inner = openmc.Sphere(r=500)
+first_wall_outer_surface = openmc.Sphere(r=510)
+breeder_blanket_outer_surface = openmc.Sphere(r=610, boundary_type='vacuum')
+
+# cells
+inner_vessel_region = -vessel_inner
+inner_vessel_cell = openmc.Cell(region=inner_vessel_region)
+
+first_wall_region = -first_wall_outer_surface & +vessel_inner
+first_wall_cell = openmc.Cell(region=first_wall_region)
+first_wall_cell.fill = steel
+
+breeder_blanket_region = +first_wall_outer_surface & -breeder_blanket_outer_surface
+breeder_blanket_cell = openmc.Cell(region=breeder_blanket_region)
+breeder_blanket_cell.fill = breeder_material
+
+my_geometry = openmc.Geometry([inner_vessel_cell, first_wall_cell, breeder_blanket_cell])
+
+# SIMULATION SETTINGS
+my_settings = openmc.Settings()
+my_settings.batches = pilot_batches  # the number of batches is changed for each round
+my_settings.inactive = 0
+my_settings.particles = 1000
+my_settings.run_mode = 'fixed source'
+
+source = openmc.IndependentSource()
+source.space = openmc.stats.Point((0, 0, 0))
+source.angle = openmc.stats.Isotropic()
+source.energy = openmc.stats.Discrete([14e6], [1])
+my_settings.source = source
+
+# TALLIES
+
+cell_filter = openmc.CellFilter(breeder_blanket_cell)
+tbr_tally = openmc.Tally(name='TBR', tally_id=42)
+tbr_tally.filters = [cell_filter]
+tbr_tally.scores = ['(n,Xt)']  # Where X is a wildcard character, this catches any tritium production
+my_tallies = openmc.Tallies([tbr_tally])
+
+model = openmc.model.Model(my_geometry, my_materials, my_settings, my_tallies)
+
+model.export_to_model_xml()
+
+openmc.lib.init()
+
+enrichments = [0.0001, 0.25, 0.50, 0.75, 0.9999]
+
+# the running totals for each point, these are combined over all the rounds
+tally_sums = np.zeros(len(enrichments))
+tally_sums_sq = np.zeros(len(enrichments))
+realizations = np.zeros(len(enrichments), dtype=int)
+simulation_time = np.zeros(len(enrichments))
+batches_to_run = np.full(len(enrichments), pilot_batches)
+seed = 1
+
+
+def run_point(enrichment, n_batches, seed):
+    """Runs a simulation for one enrichment and returns the tally sum, sum
+    of squares, number of realizations and the wall time"""
+
+    # resets the tally to 0 so we don't combine result with previous simulation
+    openmc.lib.hard_reset()
+    # each round uses a new seed so the results of each round are independent
+    openmc.lib.settings.seed = seed
+    openmc.lib.settings.set_batches(n_batches)
+
+    # we modify the python material object here,
+    # this helps get the new densities when updating the openmc.lib material
+    breeder_material.remove_element('Li')
+    breeder_material.add_nuclide('Li6', 15.8 * enrichment)
+    breeder_material.add_nuclide('Li7', 15.8 * (1.-enrichment))
+
+    # get the breeder material nuclides and densities in atom/b-cm
+    new_composition = breeder_material.get_nuclide_atom_densities()
+    openmc.lib.materials[breeder_material.id].set_densities(
+        nuclides=list(new_composition.keys()),
+        densities=list(new_composition.values()),
+    )
+
+    start = time.perf_counter()
+    openmc.lib.run(output=False)
+    wall_time = time.perf_counter() - start
+
+    tally = openmc.lib.tallies[42]
+    # results has the sum in index 1 and the sum of squares in index 2
+    results = tally.results.flatten()
+    return results[1], results[2], tally.num_realizations, wall_time
+
+
+round_number = 0
+while np.any(batches_to_run > 0):
+    round_number += 1
+    print(f'round {round_number}, batches to run for each point {batches_to_run}')
+
+    for i_point, enrichment in enumerate(enrichments):
+        if batches_to_run[i_point] == 0:
+            continue
+        tally_sum, tally_sum_sq, n_realizations, wall_time = run_point(enrichment, batches_to_run[i_point], seed)
+        seed += 1
+        tally_sums[i_point] += tally_sum
+        tally_sums_sq[i_point] += tally_sum_sq
+        realizations[i_point] += n_realizations
+        simulation_time[i_point] += wall_time
+
+    # works out the mean and relative error of each point from all the rounds so far
+    mean = tally_sums / realizations
+    std_dev = np.sqrt(np.clip((tally_sums_sq / realizations - mean**2) / (realizations - 1), 0., None))
+    relative_error = std_dev / mean
+
+    # the relative error falls with 1/sqrt(batches) so the total batches each
+    # point needs to reach the target can be estimated from its current error
+    batches_needed = np.ceil(realizations * (relative_error / target_relative_error) ** 2).astype(int)
+    batches_needed = np.minimum(batches_needed, max_batches_per_point)
+    batches_to_run = np.clip(batches_needed - realizations, 0, max_batches_per_round)
+
+# close down openmc lib interface
+openmc.lib.finalize()
+
+particles_per_second = realizations * my_settings.particles / simulation_time
+for enrichment, m, s, n, rate in zip(enrichments, mean, std_dev, realizations, particles_per_second):
+    print(f'enrichment {enrichment:.4f} TBR {m:.4f} +/- {s:.4f} from {n} batches at {rate:.0f} particles per second')
+# the particle rate shows which points are the most expensive to converge
+print(f'total simulation time {simulation_time.sum():.1f} seconds')
+
+# plotting results
+import plotly.graph_objects as go
+
+fig = go.Figure()
+
+fig.add_trace(
+    go.Scatter(
+        x=enrichments,
+        y=mean,
+        error_y={'type': 'data', 'array': std_dev},
+        mode='lines',
+    )
+)
+
+fig.update_layout(
+    title="TBR as a function of Li6 enrichment",
+    xaxis_title="Li6 enrichment (%)",
+    yaxis_title="TBR"
+)
+
+fig.show()
@@ -0,0 +1,241 @@
+"""
+This script finds Tritium Breeding Ratio (TBR) as a function of lithium 6
+enrichment and breeder blanket thickness using adaptive sampling instead of a
+fixed grid of simulations.
+
+2_example_tritium_production_study.ipynb simulates every point on a fixed grid.
+For a 2D study a fine grid needs hundreds of simulations, many of which are
+in regions where the TBR changes slowly and could be predicted from the
+neighbouring points.
+
+Here a Gaussian process surrogate model is fitted to the TBR tally results
+(the mean and the std_dev) simulated so far. The surrogate gives a prediction
+of the TBR and its uncertainty everywhere in the parameter space. The next
+simulation is done where the surrogate is most uncertain (to learn the whole
+TBR surface) or where the surrogate expects the highest TBR (to find the best
+design). The study stops when the surrogate uncertainty is below a threshold,
+which usually takes far fewer simulations than a grid.
+
+The Gaussian process is written with numpy so no extra packages are needed.
+"""
+
+import numpy as np
+import openmc
+
+# a few user settings
+objective = 'explore'  # 'explore' to learn the TBR everywhere or 'maximise' to find the highest TBR
+uncertainty_threshold = 0.005  # stops when the surrogate TBR std_dev is below this everywhere
+max_simulations = 40
+
+# the parameter ranges, these are scaled to 0 to 1 inside the surrogate
+enrichment_range = (0.0001, 0.9999)  # fraction of lithium that is Li6
+thickness_range = (20., 150.)  # breeder blanket thickness in cm
+
+
+def simulate_tbr(enrichment, thickness):
+    """Runs a simulation of the sphere model and returns the TBR
+
+    Args:
+        enrichment (float): the fraction of the lithium that is Li6
+        thickness (float): the breeder blanket thickness in cm
+
+    Returns:
+        tuple: the TBR mean and std_dev
+    """
+    breeder_material = openmc.Material()  # Pb84.2Li15.8
+    breeder_material.add_element('Pb', 84.2)
+    breeder_material.add_element('Li', 15.8, enrichment=enrichment * 100, enrichment_target='Li6', enrichment_type='ao')
+    breeder_material.set_density('g/cm3', 11.)
+
+    steel = openmc.Material()
+    steel.set_density('g/cm3', 7.75)
+    steel.add_element('Fe', 0.95)
+    steel.add_element('C', 0.05)
+
+    my_materials = openmc.Materials([breeder_material, steel])
+
+    vessel_inner = openmc.Sphere(r=500)
+    first_wall_outer_surface = openmc.Sphere(r=510)
+    breeder_blanket_outer_surface = openmc.Sphere(r=510 + thickness, boundary_type='vacuum')
+
+    inner_vessel_cell = openmc.Cell(region=-vessel_inner)
+
+    first_wall_cell = openmc.Cell(region=-first_wall_outer_surface & +vessel_inner)
+    first_wall_cell.fill = steel
+
+    breeder_blanket_cell = openmc.Cell(region=+first_wall_outer_surface & -breeder_blanket_outer_surface)
+    breeder_blanket_cell.fill = breeder_material
+
+    my_geometry = openmc.Geometry([inner_vessel_cell, first_wall_cell, breeder_blanket_cell])
+
+    my_settings = openmc.Settings()
+    my_settings.batches = 10
+    my_settings.inactive = 0
+    my_settings.particles = 1000
+    my_settings.run_mode = 'fixed source'
+
+    source = openmc.IndependentSource()
+    source.space = openmc.stats.Point((0, 0, 0))
+    source.angle = openmc.stats.Isotropic()
+    source.energy = openmc.stats.Discrete([14e6], [1])
+    my_settings.source = source
+
+    cell_filter = openmc.CellFilter(breeder_blanket_cell)
+    tbr_tally = openmc.Tally(name='TBR')
+    tbr_tally.filters = [cell_filter]
+    tbr_tally.scores = ['(n,Xt)']  # Where X is a wildcard character, this catches any tritium production
+    my_tallies = openmc.Tallies([tbr_tally])
+
+    model = openmc.model.Model(my_geometry, my_materials, my_settings, my_tallies)
+    statepoint_filename = model.run(output=False)
+
+    with openmc.StatePoint(statepoint_filename) as statepoint:
+        tally = statepoint.get_tally(name='TBR')
+        return tally.mean.flatten()[0], tally.std_dev.flatten()[0]
+
+
+def rbf_kernel(a, b, length_scale):
+    """Squared exponential covariance between two sets of points"""
+    squared_distance = np.sum((a[:, np.newaxis, :] - b[np.newaxis, :, :]) ** 2, axis=-1)
+    return np.exp(-0.5 * squared_distance / length_scale**2)
+
+
+def fit_gaussian_process(x, y, y_std, length_scales=(0.1, 0.2, 0.3, 0.5, 1.0)):
+    """Fits a Gaussian process to the simulation results. The tally std_dev
+    of each point is used as the noise on that point. The length scale with
+    the highest log marginal likelihood is used.
+
+    Args:
+        x (numpy.ndarray): the scaled parameters of the simulated points
+        y (numpy.ndarray): the tally mean of each point
+        y_std (numpy.ndarray): the tally std_dev of each point
+        length_scales (tuple): the length scales to try
+
+    Returns:
+        dict: everything needed to make predictions with predict_gaussian_process
+    """
+    # the results are normalised so the kernel variance can be 1
+    y_mean = y.mean()
+    y_scale = y.std() if y.std() > 0 else 1.
+    y_normalised = (y - y_mean) / y_scale
+    noise = (y_std / y_scale) ** 2 + 1e-8
+
+    best = None
+    for length_scale in length_scales:
+        K = rbf_kernel(x, x, length_scale) + np.diag(noise)
+        L = np.linalg.cholesky(K)
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, y_normalised))
+        log_likelihood = -0.5 * y_normalised @ alpha - np.sum(np.log(np.diag(L)))
+        if best is None or log_likelihood > best['log_likelihood']:
+            best = {
+                'log_likelihood': log_likelihood,
+                'length_scale': length_scale,
+                'L': L,
+                'alpha': alpha,
+            }
+    best.update({'x': x, 'y_mean': y_mean, 'y_scale': y_scale})
+    return best
+
+
+def predict_gaussian_process(gp, x_new):
+    """Predicts the mean and std_dev of the TBR at new points"""
+    K_star = rbf_kernel(x_new, gp['x'], gp['length_scale'])
+    mean = K_star @ gp['alpha']
+    v = np.linalg.solve(gp['L'], K_star.T)
+    variance = np.clip(1. - np.sum(v**2, axis=0), 0., None)
+    return mean * gp['y_scale'] + gp['y_mean'], np.sqrt(variance) * gp['y_scale']
+
+
+def unscale(x):
+    """Converts scaled 0 to 1 parameters to enrichment and thickness"""
+    enrichment = enrichment_range[0] + x[0] * (enrichment_range[1] - enrichment_range[0])
+    thickness = thickness_range[0] + x[1] * (thickness_range[1] - thickness_range[0])
+    return enrichment, thickness
+
+
+# the surrogate is evaluated on a fine grid of candidate points, this is cheap
+# compared to a simulation so the grid can be much finer than a simulation grid
+grid_points = np.linspace(0, 1, 41)
+candidates = np.array([[a, b] for b in grid_points for a in grid_points])
+candidate_tolerance = 0.5 * (grid_points[1] - grid_points[0])
+
+# starts with the corners and the centre of the parameter space
+sampled_x = [np.array(x) for x in [[0, 0], [1, 0], [0, 1], [1, 1], [0.5, 0.5]]]
+sampled_mean = []
+sampled_std_dev = []
+for x in sampled_x:
+    mean, std_dev = simulate_tbr(*unscale(x))
+    sampled_mean.append(mean)
+    sampled_std_dev.append(std_dev)
+
+while True:
+    gp = fit_gaussian_process(np.array(sampled_x), np.array(sampled_mean), np.array(sampled_std_dev))
+    predicted_mean, predicted_std_dev = predict_gaussian_process(gp, candidates)
+
+    print(f'{len(sampled_x)} simulations, largest surrogate uncertainty {predicted_std_dev.max():.4f}')
+    if predicted_std_dev.max() < uncertainty_threshold or len(sampled_x) >= max_simulations:
+        break
+
+    # the tally noise keeps the surrogate uncertainty above 0 at the simulated
+    # points, so candidates within half a grid spacing of a simulated point
+    # are left out to avoid simulating the same point again
+    distance_to_sampled = np.min(
+        np.linalg.norm(candidates[:, np.newaxis, :] - np.array(sampled_x)[np.newaxis, :, :], axis=-1),
+        axis=1,
+    )
+    not_sampled = distance_to_sampled > candidate_tolerance
+    if not not_sampled.any():
+        print('every candidate point has been simulated')
+        break
+
+    if objective == 'explore':
+        # the most uncertain point gives the most information about the TBR surface
+        acquisition = predicted_std_dev
+    else:
+        # an upper confidence bound balances simulating near the best TBR
+        # found so far with reducing the uncertainty elsewhere
+        acquisition = predicted_mean + 2 * predicted_std_dev
+    next_x = candidates[np.argmax(np.where(not_sampled, acquisition, -np.inf))]
+
+    enrichment, thickness = unscale(next_x)
+    print(f'simulating enrichment {enrichment:.3f} and thickness {thickness:.1f}cm')
+    mean, std_dev = simulate_tbr(enrichment, thickness)
+    sampled_x.append(next_x)
+    sampled_mean.append(mean)
+    sampled_std_dev.append(std_dev)
+
+best_index = np.argmax(predicted_mean)
+best_enrichment, best_thickness = unscale(candidates[best_index])
+print(f'highest predicted TBR {predicted_mean[best_index]:.4f} at enrichment {best_enrichment:.3f} and thickness {best_thickness:.1f}cm')
+print(f'{len(sampled_x)} simulations used instead of {len(candidates)} for the same grid')
+
+# plotting results
+import plotly.graph_objects as go
+
+enrichments = enrichment_range[0] + grid_points * (enrichment_range[1] - enrichment_range[0])
+thicknesses = thickness_range[0] + grid_points * (thickness_range[1] - thickness_range[0])
+sampled_parameters = np.array([unscale(x) for x in sampled_x])
+
+fig = go.Figure()
+fig.add_trace(
+    go.Contour(
+        z=predicted_mean.reshape(len(grid_points), len(grid_points)),
+        x=enrichments * 100,
+        y=thicknesses,
+        colorbar={'title': 'TBR'},
+    )
+)
+fig.add_trace(
+    go.Scatter(
+        x=sampled_parameters[:, 0] * 100,
+        y=sampled_parameters[:, 1],
+        mode='markers',
+        name='simulations',
+    )
+)
+fig.update_layout(
+    title="Surrogate model of TBR as a function of Li6 enrichment and blanket thickness",
+    xaxis_title="Li6 enrichment (%)",
+    yaxis_title="Breeder blanket thickness (cm)"
+)
+fig.show()
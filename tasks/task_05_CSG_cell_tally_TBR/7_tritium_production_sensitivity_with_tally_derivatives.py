@@ -0,0 +1,218 @@
+"""
+This script finds Tritium Breeding Ratio (TBR) as a function of lithium 6
+enrichment from a single simulation by using differential tallies.
+
+The other TBR studies in this task need one simulation for each enrichment.
+OpenMC can also tally the derivative of a tally with respect to the density
+of a nuclide in a material. Derivatives are only available for a few scores
+(flux, total, scatter, absorption, fission and nu-fission), not for the
+(n,Xt) tritium production score, so the TBR is split into its Li6 and Li7
+parts:
+
+- Almost every neutron absorbed by Li6 makes a triton through Li6(n,t)He4, so
+  the Li6 absorption rate is used for the Li6 part. The derivatives of this
+  with respect to the Li6 and the Li7 atom densities in the breeder material
+  are found in the same simulation as the TBR.
+- Li7 only makes tritium through Li7(n,n'a)t which has a threshold of about
+  2.8 MeV. The fast flux hardly changes with the amount of Li6, so the Li7
+  part is taken to be proportional to the Li7 atom density.
+
+Changing the enrichment moves lithium atoms from Li7 to Li6 so the derivative
+of TBR with respect to enrichment is
+
+dTBR/de = N_Li * (dR6/dN_Li6 - dR6/dN_Li7) - R7 / (1 - e)
+
+where N_Li is the total lithium atom density, R6 and R7 are the Li6 and Li7
+parts of the TBR and e is the enrichment. The TBR curve around the simulated
+enrichment is then found with a Taylor expansion. OpenMC only provides first
+order derivatives so this is a linear expansion and the accuracy falls
+further away from the simulated enrichment. Simulations at the lowest and
+highest enrichment are run at the end to check the expansion.
+"""
+
+import numpy as np
+import openmc
+
+nominal_enrichment = 0.5  # the fraction of lithium that is Li6 in the simulated material
+validation_enrichments = [0.0001, 0.9999]
+
+
+def make_breeder_material(enrichment):
+    """Makes the breeder material with the same lithium atom density for any
+    enrichment, so the only change is the fraction of Li6 and Li7 atoms"""
+    breeder_material = openmc.Material(material_id=12)  # Pb84.2Li15.8
+    breeder_material.add_element('Pb', 84.2, percent_type='ao')
+    breeder_material.add_nuclide('Li6', 15.8 * enrichment, percent_type='ao')
+    breeder_material.add_nuclide('Li7', 15.8 * (1. - enrichment), percent_type='ao')
+    # atom/b-cm is used for the density so that the lithium atom density does not change with enrichment
+    breeder_material.set_density('atom/b-cm', 0.0377)  # about 11 g/cm3
+    return breeder_material
+
+
+def make_model(breeder_material, with_derivatives):
+    """Makes the sphere model with a TBR tally and optionally the derivative tallies"""
+
+    steel = openmc.Material(material_id=6)
+    steel.set_density('g/cm3', 7.75)
+    steel.add_element('Fe', 0.95)
+    steel.add_element('C', 0.05)
+
+    my_materials = openmc.Materials([breeder_material, steel])
+
+    # surfaces
+    vessel_inner = openmc.Sphere(r=500)
+    first_wall_outer_surface = openmc.Sphere(r=510)
+    breeder_blanket_outer_surface = openmc.Sphere(r=610, boundary_type='vacuum')
+
+    # cells
+    inner_vessel_cell = openmc.Cell(region=-vessel_inner)
+
+    first_wall_cell = openmc.Cell(region=-first_wall_outer_surface & +vessel_inner)
+    first_wall_cell.fill = steel
+
+    breeder_blanket_cell = openmc.Cell(region=+first_wall_outer_surface & -breeder_blanket_outer_surface)
+    breeder_blanket_cell.fill = breeder_material
+
+    my_geometry = openmc.Geometry([inner_vessel_cell, first_wall_cell, breeder_blanket_cell])
+
+    # SIMULATION SETTINGS
+    my_settings = openmc.Settings()
+    my_settings.batches = 10
+    my_settings.inactive = 0
+    my_settings.particles = 10000
+    my_settings.run_mode = 'fixed source'
+
+    source = openmc.IndependentSource()
+    source.space = openmc.stats.Point((0, 0, 0))
+    source.angle = openmc.stats.Isotropic()
+    source.energy = openmc.stats.Discrete([14e6], [1])
+    my_settings.source = source
+
+    # TALLIES
+    cell_filter = openmc.CellFilter(breeder_blanket_cell)
+    tbr_tally = openmc.Tally(name='TBR')
+    tbr_tally.filters = [cell_filter]
+    tbr_tally.scores = ['(n,Xt)']  # Where X is a wildcard character, this catches any tritium production
+    # the tritium production of each lithium isotope is tallied separately
+    tbr_tally.nuclides = ['Li6', 'Li7']
+    # (n,Xt) is a redundant reaction that is never sampled so it needs a tracklength (or collision) estimator
+    tbr_tally.estimator = 'tracklength'
+    my_tallies = openmc.Tallies([tbr_tally])
+
+    if with_derivatives:
+        # the Li6 absorption rate is the Li6 part of the TBR and it supports derivatives
+        li6_absorption_tally = openmc.Tally(name='Li6_absorption')
+        li6_absorption_tally.filters = [cell_filter]
+        li6_absorption_tally.scores = ['absorption']
+        li6_absorption_tally.nuclides = ['Li6']
+        li6_absorption_tally.estimator = 'tracklength'
+        my_tallies.append(li6_absorption_tally)
+
+        for nuclide in ['Li6', 'Li7']:
+            derivative_tally = openmc.Tally(name=f'dR6_dN_{nuclide}')
+            derivative_tally.filters = [cell_filter]
+            derivative_tally.scores = ['absorption']
+            derivative_tally.nuclides = ['Li6']
+            derivative_tally.estimator = 'tracklength'
+            # the derivative is with respect to the atom density in atom/b-cm
+            derivative_tally.derivative = openmc.TallyDerivative(
+                variable='nuclide_density',
+                material=breeder_material.id,
+                nuclide=nuclide,
+            )
+            my_tallies.append(derivative_tally)
+
+    return openmc.model.Model(my_geometry, my_materials, my_settings, my_tallies)
+
+
+# runs the single simulation with the derivative tallies
+breeder_material = make_breeder_material(nominal_enrichment)
+model = make_model(breeder_material, with_derivatives=True)
+statepoint_filename = model.run()
+
+with openmc.StatePoint(statepoint_filename) as statepoint:
+    tbr_tally = statepoint.get_tally(name='TBR')
+    tbr = tbr_tally.mean.sum()
+    tbr_std_dev = np.sqrt(np.sum(np.square(tbr_tally.std_dev)))
+    li7_tbr = tbr_tally.get_values(nuclides=['Li7']).flatten()[0]
+    li7_tbr_std_dev = tbr_tally.get_values(nuclides=['Li7'], value='std_dev').flatten()[0]
+    li6_tbr = tbr_tally.get_values(nuclides=['Li6']).flatten()[0]
+
+    li6_absorption = statepoint.get_tally(name='Li6_absorption').mean.flatten()[0]
+
+    derivative_li6 = statepoint.get_tally(name='dR6_dN_Li6')
+    derivative_li7 = statepoint.get_tally(name='dR6_dN_Li7')
+    dr6_dli6 = derivative_li6.mean.flatten()[0]
+    dr6_dli7 = derivative_li7.mean.flatten()[0]
+    dr6_dli6_std_dev = derivative_li6.std_dev.flatten()[0]
+    dr6_dli7_std_dev = derivative_li7.std_dev.flatten()[0]
+
+print(f'Li6 tritium production {li6_tbr:.4f} and Li6 absorption {li6_absorption:.4f} should be about the same')
+
+# the total lithium atom density in atom/b-cm
+atom_densities = breeder_material.get_nuclide_atom_densities()
+lithium_atom_density = atom_densities['Li6'] + atom_densities['Li7']
+
+# the derivative of TBR with respect to enrichment (fraction of lithium that is Li6)
+dtbr_de = lithium_atom_density * (dr6_dli6 - dr6_dli7) - li7_tbr / (1. - nominal_enrichment)
+# the derivatives come from the same particles so they are correlated, this
+# uncertainty ignores the correlation and is an approximation
+dtbr_de_std_dev = np.sqrt(
+    (lithium_atom_density * dr6_dli6_std_dev)**2
+    + (lithium_atom_density * dr6_dli7_std_dev)**2
+    + (li7_tbr_std_dev / (1. - nominal_enrichment))**2
+)
+
+print(f'TBR at {nominal_enrichment} enrichment {tbr:.4f} +/- {tbr_std_dev:.4f}')
+print(f'dTBR/d(enrichment) {dtbr_de:.4f} +/- {dtbr_de_std_dev:.4f}')
+
+# first order Taylor expansion of the TBR curve around the nominal enrichment
+enrichments = np.linspace(0.0001, 0.9999, 50)
+predicted_tbr = tbr + dtbr_de * (enrichments - nominal_enrichment)
+predicted_tbr_std_dev = np.sqrt(tbr_std_dev**2 + (dtbr_de_std_dev * (enrichments - nominal_enrichment))**2)
+
+# runs full simulations at the extremes to check the expansion
+validation_tbr = []
+validation_tbr_std_dev = []
+for enrichment in validation_enrichments:
+    model = make_model(make_breeder_material(enrichment), with_derivatives=False)
+    statepoint_filename = model.run()
+    with openmc.StatePoint(statepoint_filename) as statepoint:
+        tally = statepoint.get_tally(name='TBR')
+        validation_tbr.append(tally.mean.sum())
+        validation_tbr_std_dev.append(np.sqrt(np.sum(np.square(tally.std_dev))))
+    predicted = tbr + dtbr_de * (enrichment - nominal_enrichment)
+    print(f'enrichment {enrichment} simulated TBR {validation_tbr[-1]:.4f} predicted TBR {predicted:.4f}')
+
+# plotting results
+import plotly.graph_objects as go
+
+fig = go.Figure()
+
+fig.add_trace(
+    go.Scatter(
+        x=enrichments * 100,
+        y=predicted_tbr,
+        error_y={'type': 'data', 'array': predicted_tbr_std_dev},
+        mode='lines',
+        name='Taylor expansion',
+    )
+)
+
+fig.add_trace(
+    go.Scatter(
+        x=np.array(validation_enrichments + [nominal_enrichment]) * 100,
+        y=validation_tbr + [tbr],
+        error_y={'type': 'data', 'array': validation_tbr_std_dev + [tbr_std_dev]},
+        mode='markers',
+        name='simulations',
+    )
+)
+
+fig.update_layout(
+    title="TBR as a function of Li6 enrichment from a single simulation",
+    xaxis_title="Li6 enrichment (%)",
+    yaxis_title="TBR"
+)
+
+fig.show()
@@ -0,0 +1,179 @@
+"""
+This script finds Tritium Breeding Ratio (TBR) as a function of lithium 6
+enrichment, first wall thickness and breeder blanket thickness while only
+loading the nuclear data once.
+
+3_example_tritium_production_study_with_openmc_lib.py changes the breeder
+material between simulations but the geometry stays the same. openmc.lib
+can't change the radius of a surface, so normally a thickness study needs a
+new openmc.lib.init() (and a new load of the nuclear data) for each thickness.
+
+openmc.lib can change the fill of a cell. So the model here is made of thin
+spherical shells, with a shell boundary at every radius the study needs. Each
+thickness is then made by filling the shells with steel (first wall), the
+breeder material or nothing (void). Particles in the void shells travel
+straight to the vacuum boundary, which is the same as the blanket ending at
+that radius. The whole enrichment x first wall x blanket grid then runs in
+one process and only the transport is repeated for each point.
+"""
+
+import itertools
+
+import numpy as np
+import openmc
+
+vessel_inner_radius = 500
+first_wall_thicknesses = [2, 5, 10]  # cm
+blanket_thicknesses = list(range(20, 160, 10))  # cm
+enrichments = [0.0001, 0.25, 0.50, 0.75, 0.9999]  # fraction of lithium that is Li6
+
+# a shell boundary is needed at every radius where a material can start or stop
+shell_radii = sorted(
+    {vessel_inner_radius + t for t in first_wall_thicknesses}
+    | {vessel_inner_radius + fw + b for fw in first_wall_thicknesses for b in blanket_thicknesses}
+)
+
+# make some python materials
+breeder_material = openmc.Material(material_id=12)  # Pb84.2Li15.8
+breeder_material.add_element('Pb', 84.2)
+breeder_material.add_element('Li', 15.8)
+breeder_material.set_density('g/cm3', 11.)
+
+steel = openmc.Material(material_id=6)
+steel.set_density('g/cm3', 7.75)
+steel.add_element('Fe', 0.95)
+steel.add_element('C', 0.05)
+
+my_materials = openmc.Materials([breeder_material, steel])
+
+# surfaces
+vessel_inner = openmc.Sphere(r=vessel_inner_radius)
+shell_surfaces = [openmc.Sphere(r=radius) for radius in shell_radii]
+shell_surfaces[-1].boundary_type = 'vacuum'
+
+# cells, the fill of each shell is changed for each thickness later on. The
+# nuclear data for both materials is loaded as they are in the materials.xml
+inner_vessel_cell = openmc.Cell(region=-vessel_inner)
+shell_cells = []
+inner_surface = vessel_inner
+for outer_surface in shell_surfaces:
+    shell_cells.append(openmc.Cell(region=+inner_surface & -outer_surface, fill=breeder_material))
+    inner_surface = outer_surface
+
+my_geometry = openmc.Geometry([inner_vessel_cell] + shell_cells)
+
+# SIMULATION SETTINGS
+my_settings = openmc.Settings()
+my_settings.batches = 10
+my_settings.inactive = 0
+my_settings.particles = 1000
+my_settings.run_mode = 'fixed source'
+
+source = openmc.IndependentSource()
+source.space = openmc.stats.Point((0, 0, 0))
+source.angle = openmc.stats.Isotropic()
+source.energy = openmc.stats.Discrete([14e6], [1])
+my_settings.source = source
+
+# TALLIES
+# the tally covers every shell, only the shells filled with breeder make tritium
+cell_filter = openmc.CellFilter(shell_cells)
+tbr_tally = openmc.Tally(name='TBR', tally_id=42)
+tbr_tally.filters = [cell_filter]
+tbr_tally.scores = ['(n,Xt)']  # Where X is a wildcard character, this catches any tritium production
+my_tallies = openmc.Tallies([tbr_tally])
+
+model = openmc.model.Model(my_geometry, my_materials, my_settings, my_tallies)
+
+model.export_to_model_xml()
+
+import openmc.lib
+openmc.lib.init(output=False)
+
+lib_breeder_material = openmc.lib.materials[breeder_material.id]
+lib_steel = openmc.lib.materials[steel.id]
+lib_shell_cells = [openmc.lib.cells[cell.id] for cell in shell_cells]
+
+
+def set_thicknesses(first_wall_thickness, blanket_thickness):
+    """Fills the shells so that the model has the requested first wall and
+    blanket thickness, the shells outside the blanket are void"""
+    first_wall_outer_radius = vessel_inner_radius + first_wall_thickness
+    blanket_outer_radius = first_wall_outer_radius + blanket_thickness
+    # checks the geometry can represent these thicknesses before changing it
+    for radius in [first_wall_outer_radius, blanket_outer_radius]:
+        if radius not in shell_radii:
+            raise ValueError(f'radius {radius} is not a shell radius, add it to the shell_radii')
+
+    for radius, lib_cell in zip(shell_radii, lib_shell_cells):
+        # each shell is identified by its outer radius
+        if radius <= first_wall_outer_radius:
+            lib_cell.fill = lib_steel
+        elif radius <= blanket_outer_radius:
+            lib_cell.fill = lib_breeder_material
+        else:
+            lib_cell.fill = None
+
+
+def set_enrichment(enrichment):
+    """Changes the Li6 enrichment of the breeder material"""
+    # we modify the python material object here,
+    # this helps get the new densities when updating the openmc.lib material
+    breeder_material.remove_element('Li')
+    breeder_material.add_nuclide('Li6', 15.8 * enrichment)
+    breeder_material.add_nuclide('Li7', 15.8 * (1. - enrichment))
+
+    new_composition = breeder_material.get_nuclide_atom_densities()
+    lib_breeder_material.set_densities(
+        nuclides=list(new_composition.keys()),
+        densities=list(new_composition.values()),
+    )
+
+
+tbr_mean = np.zeros((len(enrichments), len(first_wall_thicknesses), len(blanket_thicknesses)))
+tbr_std_dev = np.zeros_like(tbr_mean)
+
+for i, enrichment in enumerate(enrichments):
+    set_enrichment(enrichment)
+    for j, k in itertools.product(range(len(first_wall_thicknesses)), range(len(blanket_thicknesses))):
+        set_thicknesses(first_wall_thicknesses[j], blanket_thicknesses[k])
+
+        # resets the tally to 0 so we don't combine result with previous simulation
+        openmc.lib.hard_reset()
+        openmc.lib.run(output=False)
+
+        tally = openmc.lib.tallies[42]
+        # the tritium production in every shell is added together
+        tbr_mean[i, j, k] = tally.mean.sum()
+        tbr_std_dev[i, j, k] = np.sqrt(np.sum(tally.std_dev**2))
+        print(
+            f'enrichment {enrichment:.3f} first wall {first_wall_thicknesses[j]}cm '
+            f'blanket {blanket_thicknesses[k]}cm TBR {tbr_mean[i, j, k]:.4f} +/- {tbr_std_dev[i, j, k]:.4f}'
+        )
+
+# close down openmc lib interface
+openmc.lib.finalize()
+
+# plotting results
+import plotly.graph_objects as go
+
+fig = go.Figure()
+for i, enrichment in enumerate(enrichments):
+    for j, first_wall_thickness in enumerate(first_wall_thicknesses):
+        fig.add_trace(
+            go.Scatter(
+                x=blanket_thicknesses,
+                y=tbr_mean[i, j],
+                error_y={'type': 'data', 'array': tbr_std_dev[i, j]},
+                mode='lines',
+                name=f'{enrichment * 100:.0f}% Li6, {first_wall_thickness}cm first wall',
+            )
+        )
+
+fig.update_layout(
+    title="TBR as a function of breeder blanket thickness",
+    xaxis_title="Breeder blanket thickness (cm)",
+    yaxis_title="TBR"
+)
+
+fig.show()
@@ -0,0 +1,303 @@
+"""
+This script performs a parameter sweep to find Tritium Breeding Ratio (TBR)
+as a function of lithium 6 enrichment and breeder density and saves every
+result to a results store file.
+
+The other TBR studies keep the results in Python lists that are lost when the
+script finishes, so running the study again (or a study with some of the same
+points) simulates every point again.
+
+Here the results are saved to an HDF5 file with a column for each parameter,
+the TBR mean and std_dev and the run details (particles, batches, seed and
+wall time). An index on the parameters and the particles, batches and seed
+finds the points that are already in the store so only new points (or points
+simulated with different statistics) are simulated. The points are simulated in
+several processes at once and each process appends its result to the store.
+A lock file makes sure only one process writes to the store at a time.
+"""
+
+import fcntl
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import h5py
+import numpy as np
+import openmc
+
+results_filename = 'tbr_results_store.h5'
+n_workers = 4
+
+enrichments = np.linspace(0.0001, 0.9999, 10)  # fraction of lithium that is Li6
+densities = np.linspace(9., 11.5, 6)  # breeder density in g/cm3
+
+# the simulation settings are part of the store index so changing them
+# simulates the points again instead of reusing the old results
+particles = 1000
+batches = 10
+seed = 1
+
+
+class ResultsStore:
+    """A table of simulation results in an HDF5 file with one row per
+    parameter point. Each column is a resizable dataset so rows can be
+    appended without rewriting the file.
+
+    Args:
+        filename (str): the HDF5 file, it is made if it doesn't exist
+        parameter_names (list): the names of the parameters of each point
+        result_names (list): the names of the results, each has a mean and std_dev column
+        decimals (int): parameters are rounded to this many decimals in the
+            index so that points that differ by rounding errors are matched
+        key_metadata (tuple): the metadata columns that are part of the index
+            along with the parameters, so a point simulated with different
+            settings is not matched
+    """
+
+    metadata_columns = {
+        'particles': 'i8',
+        'batches': 'i8',
+        'seed': 'i8',
+        'wall_time': 'f8',
+        'timestamp': 'f8',
+    }
+
+    def __init__(self, filename, parameter_names, result_names, decimals=6,
+                 key_metadata=('particles', 'batches', 'seed')):
+        self.filename = Path(filename)
+        self.lock_filename = self.filename.with_suffix(self.filename.suffix + '.lock')
+        self.parameter_names = list(parameter_names)
+        self.result_names = list(result_names)
+        self.decimals = decimals
+        self.key_names = self.parameter_names + list(key_metadata)
+        self._index = {}  # parameter key: row number
+        self._rows_indexed = 0
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """Holds a lock on the store, shared for reading and exclusive for writing"""
+        with open(self.lock_filename, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _columns(self):
+        columns = {name: 'f8' for name in self.parameter_names}
+        for name in self.result_names:
+            columns[f'{name}_mean'] = 'f8'
+            columns[f'{name}_std_dev'] = 'f8'
+        columns.update(self.metadata_columns)
+        return columns
+
+    def _key(self, parameters):
+        return tuple(round(float(parameters[name]), self.decimals) for name in self.key_names)
+
+    def _update_index(self, f):
+        """Adds the rows appended since the index was last updated, these
+        may have been written by another process"""
+        # the shortest column is used in case an append was stopped part way through
+        n_rows = min(f[name].shape[0] for name in self._columns())
+        if n_rows == self._rows_indexed:
+            return
+        new_keys = [f[name][self._rows_indexed:n_rows] for name in self.key_names]
+        for offset, values in enumerate(zip(*new_keys)):
+            self._index[self._key(dict(zip(self.key_names, values)))] = self._rows_indexed + offset
+        self._rows_indexed = n_rows
+
+    def get(self, parameters):
+        """Gets the stored row for a parameter point
+
+        Args:
+            parameters (dict): the value of each parameter and key_metadata column
+
+        Returns:
+            dict or None: the value of each column, or None if the point is not stored
+        """
+        if not self.filename.exists():
+            return None
+        with self._locked(exclusive=False), h5py.File(self.filename, 'r') as f:
+            self._update_index(f)
+            row = self._index.get(self._key(parameters))
+            if row is None:
+                return None
+            return {name: f[name][row].item() for name in self._columns()}
+
+    def missing(self, points):
+        """Finds the points that are not in the store
+
+        Args:
+            points (list): a dict of parameter and key_metadata values for each point
+
+        Returns:
+            list: the points that need simulating
+        """
+        if not self.filename.exists():
+            return list(points)
+        with self._locked(exclusive=False), h5py.File(self.filename, 'r') as f:
+            self._update_index(f)
+        return [point for point in points if self._key(point) not in self._index]
+
+    def append(self, parameters, results, **metadata):
+        """Adds a row to the store
+
+        Args:
+            parameters (dict): the value of each parameter
+            results (dict): a (mean, std_dev) tuple for each result
+            metadata: the particles, batches, seed and wall_time of the simulation
+        """
+        row = dict(parameters)
+        for name, (mean, std_dev) in results.items():
+            row[f'{name}_mean'] = mean
+            row[f'{name}_std_dev'] = std_dev
+        row.update(metadata)
+        row['timestamp'] = time.time()
+
+        with self._locked(exclusive=True), h5py.File(self.filename, 'a') as f:
+            for name, dtype in self._columns().items():
+                if name not in f:
+                    f.create_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(1024,))
+            # the shortest column is used in case an append was stopped part way through
+            n_rows = min(f[name].shape[0] for name in self._columns())
+            for name, dtype in self._columns().items():
+                f[name].resize((n_rows + 1,))
+                f[name][n_rows] = row.get(name, np.nan if dtype == 'f8' else -1)
+
+    def to_arrays(self):
+        """Reads every column of the store into numpy arrays"""
+        with self._locked(exclusive=False), h5py.File(self.filename, 'r') as f:
+            return {name: f[name][()] for name in self._columns()}
+
+
+def make_model(enrichment, density, particles, batches, seed):
+    """Makes the sphere model used in the other TBR examples"""
+
+    breeder_material = openmc.Material()  # Pb84.2Li15.8
+    breeder_material.add_element('Pb', 84.2)
+    breeder_material.add_nuclide('Li6', 15.8 * enrichment)
+    breeder_material.add_nuclide('Li7', 15.8 * (1. - enrichment))
+    breeder_material.set_density('g/cm3', density)
+
+    steel = openmc.Material()
+    steel.set_density('g/cm3', 7.75)
+    steel.add_element('Fe', 0.95)
+    steel.add_element('C', 0.05)
+
+    my_materials = openmc.Materials([breeder_material, steel])
+
+    # surfaces
+    vessel_inner = openmc.Sphere(r=500)
+    first_wall_outer_surface = openmc.Sphere(r=510)
+    breeder_blanket_outer_surface = openmc.Sphere(r=610, boundary_type='vacuum')
+
+    # cells
+    inner_vessel_cell = openmc.Cell(region=-vessel_inner)
+
+    first_wall_cell = openmc.Cell(region=-first_wall_outer_surface & +vessel_inner)
+    first_wall_cell.fill = steel
+
+    breeder_blanket_cell = openmc.Cell(region=+first_wall_outer_surface & -breeder_blanket_outer_surface)
+    breeder_blanket_cell.fill = breeder_material
+
+    my_geometry = openmc.Geometry([inner_vessel_cell, first_wall_cell, breeder_blanket_cell])
+
+    # SIMULATION SETTINGS
+    my_settings = openmc.Settings()
+    my_settings.batches = batches
+    my_settings.inactive = 0
+    my_settings.particles = particles
+    my_settings.run_mode = 'fixed source'
+    my_settings.seed = seed
+
+    source = openmc.IndependentSource()
+    source.space = openmc.stats.Point((0, 0, 0))
+    source.angle = openmc.stats.Isotropic()
+    source.energy = openmc.stats.Discrete([14e6], [1])
+    my_settings.source = source
+
+    # TALLIES
+    cell_filter = openmc.CellFilter(breeder_blanket_cell)
+    tbr_tally = openmc.Tally(name='TBR')
+    tbr_tally.filters = [cell_filter]
+    tbr_tally.scores = ['(n,Xt)']  # Where X is a wildcard character, this catches any tritium production
+    my_tallies = openmc.Tallies([tbr_tally])
+
+    return openmc.model.Model(my_geometry, my_materials, my_settings, my_tallies)
+
+
+def simulate_and_store(point, threads):
+    """Simulates one parameter point and appends the result to the store"""
+    model = make_model(**point)
+
+    start = time.perf_counter()
+    statepoint_filename = model.run(
+        cwd=f"point_{point['enrichment']:.6f}_{point['density']:.6f}",
+        threads=threads,
+        output=False,
+    )
+    wall_time = time.perf_counter() - start
+
+    with openmc.StatePoint(statepoint_filename) as statepoint:
+        tally = statepoint.get_tally(name='TBR')
+        tbr = (tally.mean.flatten()[0], tally.std_dev.flatten()[0])
+
+    store = ResultsStore(results_filename, ['enrichment', 'density'], ['TBR'])
+    store.append(
+        {'enrichment': point['enrichment'], 'density': point['density']},
+        {'TBR': tbr},
+        particles=model.settings.particles,
+        batches=model.settings.batches,
+        seed=model.settings.seed,
+        wall_time=wall_time,
+    )
+    return point, tbr
+
+
+# the if __name__ == "__main__" is needed as each point is run in a separate process
+if __name__ == "__main__":
+
+    store = ResultsStore(results_filename, ['enrichment', 'density'], ['TBR'])
+
+    points = [
+        {'enrichment': enrichment, 'density': density, 'particles': particles, 'batches': batches, 'seed': seed}
+        for density in densities for enrichment in enrichments
+    ]
+    points_to_simulate = store.missing(points)
+    print(f'{len(points)} points in the sweep, {len(points) - len(points_to_simulate)} found in {results_filename}')
+
+    threads = max(1, os.cpu_count() // n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for point, (mean, std_dev) in executor.map(simulate_and_store, points_to_simulate, [threads] * len(points_to_simulate)):
+            print(f"enrichment {point['enrichment']:.3f} density {point['density']:.2f} TBR {mean:.4f} +/- {std_dev:.4f}")
+
+    # the sweep results are read back from the store, including the points
+    # simulated before. A point that failed is not in the store and is left
+    # as NaN, which shows as a gap in the plot
+    stored_rows = [store.get(point) for point in points]
+    tbr_mean = np.array([np.nan if row is None else row['TBR_mean'] for row in stored_rows])
+    n_missing = sum(row is None for row in stored_rows)
+    if n_missing:
+        print(f'{n_missing} points are missing from {results_filename}, run the script again to simulate them')
+
+    # plotting results
+    import plotly.graph_objects as go
+
+    fig = go.Figure(
+        data=go.Contour(
+            z=tbr_mean.reshape(len(densities), len(enrichments)),
+            x=enrichments * 100,
+            y=densities,
+            colorbar={'title': 'TBR'},
+        )
+    )
+
+    fig.update_layout(
+        title="TBR as a function of Li6 enrichment and breeder density",
+        xaxis_title="Li6 enrichment (%)",
+        yaxis_title="Breeder density (g/cm3)"
+    )
+
+    fig.show()
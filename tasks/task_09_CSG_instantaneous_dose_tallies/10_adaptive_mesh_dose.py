@@ -0,0 +1,251 @@
+# This simulation makes a dose map with fine mesh voxels only where they are
+# needed, and exports it as a hierarchical HDF5 file and a set of VTK files
+
+# 5_mesh_dose_from_neutrons.py uses the same voxel size everywhere. Small
+# voxels are wasted where the dose changes slowly, and large voxels miss the
+# detail where the dose changes quickly (for example around the edge of a
+# shield). A fine mesh over the whole model uses a lot of memory and slows
+# down the tally scoring.
+
+# Here a coarse mesh tally is run first. Voxels are picked for refinement when
+# the dose changes by a lot between a voxel and its neighbours, or when the
+# relative error of the voxel is high. The picked voxels are grouped into
+# boxes and a fine mesh tally is made for each box. A second simulation
+# tallies the fine meshes (and the coarse mesh again, with more particles).
+
+# scipy is used to group the picked voxels into boxes
+
+import h5py
+import numpy as np
+import openmc
+from scipy import ndimage
+
+# a few user settings
+coarse_dimension = (10, 10, 10)
+refinement_factor = 4  # each refined coarse voxel is split into 4 x 4 x 4 fine voxels
+gradient_threshold = 0.5  # refine where the dose changes by more than this many orders of magnitude between neighbours
+relative_error_threshold = 0.2  # refine where the relative error is more than this
+coarse_particles = 100000
+fine_particles = 500000
+output_filename = 'adaptive_dose.h5'
+
+# tally.mean is in units of pSv-cm3/source neutron
+# multiplication by neutrons_per_second changes units to neutron to pSv-cm3/second
+neutrons_per_second = 1e8  # units of neutrons per second
+# multiplication by pico_to_milli converts from (pico) pSv/second to (milli) mSv/second
+pico_to_milli = 1e-9
+
+
+mat = openmc.Material()
+mat.add_element("Al", 1)
+mat.set_density("g/cm3", 2.7)
+my_materials = openmc.Materials([mat])
+
+cylinder_surface = openmc.ZCylinder(r=10)
+cylinder_upper_surface = openmc.ZPlane(z0=100)
+cylinder_lower_surface = openmc.ZPlane(z0=0)
+
+outer_surface = openmc.Sphere(r=200, boundary_type="vacuum")
+
+cylinder_region = -cylinder_surface & -cylinder_upper_surface & +cylinder_lower_surface
+
+# void region is below the outer surface and not the cylinder region
+void_region = -outer_surface & ~cylinder_region
+
+void_cell = openmc.Cell(region=void_region)
+cylinder_cell = openmc.Cell(region=cylinder_region)
+cylinder_cell.fill = mat
+
+my_geometry = openmc.Geometry([cylinder_cell, void_cell])
+
+# 14MeV point source
+source = openmc.IndependentSource()
+source.angle = openmc.stats.Isotropic()
+source.energy = openmc.stats.Discrete([14e6], [1])
+source.space = openmc.stats.Point((0.0, 50.0, 50.0))
+
+my_settings = openmc.Settings()
+my_settings.output = {"tallies": False}
+my_settings.batches = 2
+my_settings.run_mode = "fixed source"
+my_settings.source = source
+
+# these are the dose coefficients coded into openmc
+# originally from ICRP https://journals.sagepub.com/doi/10.1016/j.icrp.2011.10.001
+energy_bins_n, dose_coeffs_n = openmc.data.dose_coefficients(
+    particle="neutron",
+    geometry="ISO",  # we are using the ISO direction as this is a dose field with dose
+)
+
+
+def make_dose_tally(mesh, name):
+    """Makes a neutron dose tally on a mesh"""
+    energy_function_filter_n = openmc.EnergyFunctionFilter(energy_bins_n, dose_coeffs_n)
+    energy_function_filter_n.interpolation = "cubic"  # cubic interpolation is recommended by ICRP
+    dose_tally = openmc.Tally(name=name)
+    dose_tally.filters = [
+        openmc.MeshFilter(mesh),
+        openmc.ParticleFilter("neutron"),
+        energy_function_filter_n,
+    ]
+    dose_tally.scores = ["flux"]
+    return dose_tally
+
+
+def get_dose(statepoint, name, mesh):
+    """Gets the dose in mSv per second and its std_dev from a mesh tally
+    as arrays with the mesh shape (x, y, z)"""
+    tally = statepoint.get_tally(name=name)
+    voxel_volume = np.prod(mesh.width)
+    # this converts from dose-cm3/second to dose/second and from pSv to mSv
+    factor = neutrons_per_second * pico_to_milli / voxel_volume
+    # mesh tally values are ordered with the x index changing fastest
+    mean = tally.mean.reshape(mesh.dimension, order='F') * factor
+    std_dev = tally.std_dev.reshape(mesh.dimension, order='F') * factor
+    return mean, std_dev
+
+
+def find_voxels_to_refine(mean, std_dev):
+    """Picks the coarse voxels with a large change in dose to a neighbour or a
+    large relative error
+
+    Returns:
+        numpy.ndarray: True for each voxel to refine
+    """
+    # voxels with no score are set to a small dose so the log can be taken
+    smallest_dose = mean[mean > 0].min() if np.any(mean > 0) else 1.
+    log_dose = np.log10(np.where(mean > 0, mean, smallest_dose))
+
+    to_refine = np.zeros(mean.shape, dtype=bool)
+    for axis in range(3):
+        # the change in dose between each voxel and the next one along this axis
+        change = np.abs(np.diff(log_dose, axis=axis)) > gradient_threshold
+        # both voxels either side of a large change are refined
+        before = [slice(None)] * 3
+        after = [slice(None)] * 3
+        before[axis] = slice(None, -1)
+        after[axis] = slice(1, None)
+        to_refine[tuple(before)] |= change
+        to_refine[tuple(after)] |= change
+
+    relative_error = np.divide(std_dev, mean, out=np.zeros_like(mean), where=mean > 0)
+    to_refine |= relative_error > relative_error_threshold
+    return to_refine
+
+
+def make_refined_meshes(coarse_mesh, to_refine):
+    """Groups the voxels to refine into boxes and makes a fine mesh for each box
+
+    Returns:
+        list: a (fine mesh, coarse voxel slices) tuple for each box
+    """
+    labels, _ = ndimage.label(to_refine)
+    lower_left = np.asarray(coarse_mesh.lower_left)
+    width = np.asarray(coarse_mesh.width)
+    refined_meshes = []
+    for box in ndimage.find_objects(labels):
+        start = np.array([s.start for s in box])
+        stop = np.array([s.stop for s in box])
+        fine_mesh = openmc.RegularMesh()
+        fine_mesh.lower_left = lower_left + start * width
+        fine_mesh.upper_right = lower_left + stop * width
+        fine_mesh.dimension = [int(n) for n in (stop - start) * refinement_factor]
+        refined_meshes.append((fine_mesh, box))
+    return refined_meshes
+
+
+def write_vti(filename, mesh, datasets):
+    """Writes a regular mesh and its cell data to a VTK XML image data file"""
+    nx, ny, nz = mesh.dimension
+    with open(filename, 'w') as vti_file:
+        vti_file.write('<?xml version="1.0"?>\n')
+        vti_file.write('<VTKFile type="ImageData" version="0.1" byte_order="LittleEndian">\n')
+        vti_file.write(
+            f'<ImageData WholeExtent="0 {nx} 0 {ny} 0 {nz}" '
+            f'Origin="{" ".join(map(str, mesh.lower_left))}" Spacing="{" ".join(map(str, mesh.width))}">\n'
+        )
+        vti_file.write(f'<Piece Extent="0 {nx} 0 {ny} 0 {nz}">\n<CellData>\n')
+        for name, values in datasets.items():
+            vti_file.write(f'<DataArray type="Float64" Name="{name}" format="ascii">\n')
+            # VTK cell data is ordered with x changing fastest
+            np.savetxt(vti_file, np.asarray(values, dtype=float).ravel(order='F')[np.newaxis], fmt='%.6e')
+            vti_file.write('</DataArray>\n')
+        vti_file.write('</CellData>\n</Piece>\n</ImageData>\n</VTKFile>\n')
+
+
+# first pass, a coarse mesh over the whole geometry
+coarse_mesh = openmc.RegularMesh().from_domain(my_geometry, dimension=coarse_dimension)
+my_settings.particles = coarse_particles
+model = openmc.Model(my_geometry, my_materials, my_settings, openmc.Tallies([make_dose_tally(coarse_mesh, 'coarse_dose')]))
+statepoint_filename = model.run(cwd='coarse_pass')
+with openmc.StatePoint(statepoint_filename) as statepoint:
+    coarse_mean, coarse_std_dev = get_dose(statepoint, 'coarse_dose', coarse_mesh)
+
+to_refine = find_voxels_to_refine(coarse_mean, coarse_std_dev)
+refined_meshes = make_refined_meshes(coarse_mesh, to_refine)
+
+n_fine_voxels = sum(np.prod(mesh.dimension) for mesh, _ in refined_meshes)
+n_uniform_fine_voxels = np.prod(coarse_mesh.dimension) * refinement_factor**3
+print(f'{to_refine.sum()} of {to_refine.size} coarse voxels refined in {len(refined_meshes)} boxes')
+print(f'{n_fine_voxels} fine voxels instead of {n_uniform_fine_voxels} for a uniform fine mesh')
+
+# second pass, the coarse mesh and a fine mesh for each box
+tallies = openmc.Tallies([make_dose_tally(coarse_mesh, 'coarse_dose')])
+for i, (fine_mesh, _) in enumerate(refined_meshes):
+    tallies.append(make_dose_tally(fine_mesh, f'fine_dose_{i}'))
+my_settings.particles = fine_particles
+model = openmc.Model(my_geometry, my_materials, my_settings, tallies)
+statepoint_filename = model.run(cwd='fine_pass')
+
+# saves the levels to a hierarchical HDF5 file, level_0 is the coarse mesh and
+# level_1 has a group for each fine box with the coarse voxels it covers
+with openmc.StatePoint(statepoint_filename) as statepoint, h5py.File(output_filename, 'w') as f:
+    f.attrs['refinement_factor'] = refinement_factor
+    f.attrs['units'] = 'mSv per second'
+
+    coarse_mean, coarse_std_dev = get_dose(statepoint, 'coarse_dose', coarse_mesh)
+    level_0 = f.create_group('level_0')
+    level_0.attrs['lower_left'] = coarse_mesh.lower_left
+    level_0.attrs['upper_right'] = coarse_mesh.upper_right
+    level_0.attrs['dimension'] = coarse_mesh.dimension
+    level_0.create_dataset('mean', data=coarse_mean, compression='gzip')
+    level_0.create_dataset('std_dev', data=coarse_std_dev, compression='gzip')
+    level_0.create_dataset('refined', data=to_refine, compression='gzip')
+
+    level_1 = f.create_group('level_1')
+    fine_results = []
+    for i, (fine_mesh, box) in enumerate(refined_meshes):
+        fine_mean, fine_std_dev = get_dose(statepoint, f'fine_dose_{i}', fine_mesh)
+        fine_results.append((fine_mesh, fine_mean, fine_std_dev))
+        group = level_1.create_group(f'box_{i}')
+        group.attrs['lower_left'] = fine_mesh.lower_left
+        group.attrs['upper_right'] = fine_mesh.upper_right
+        group.attrs['dimension'] = fine_mesh.dimension
+        group.attrs['coarse_start'] = [s.start for s in box]
+        group.attrs['coarse_stop'] = [s.stop for s in box]
+        group.create_dataset('mean', data=fine_mean, compression='gzip')
+        group.create_dataset('std_dev', data=fine_std_dev, compression='gzip')
+
+# exports each mesh to a VTK image data file and a multiblock file that
+# opens them all together in ParaView
+write_vti('adaptive_dose_level_0.vti', coarse_mesh, {
+    "Dose [milli Sv per second]": coarse_mean,
+    "Dose std_dev": coarse_std_dev,
+    "Refined": to_refine,
+})
+blocks = ['adaptive_dose_level_0.vti']
+for i, (fine_mesh, fine_mean, fine_std_dev) in enumerate(fine_results):
+    write_vti(f'adaptive_dose_level_1_box_{i}.vti', fine_mesh, {
+        "Dose [milli Sv per second]": fine_mean,
+        "Dose std_dev": fine_std_dev,
+    })
+    blocks.append(f'adaptive_dose_level_1_box_{i}.vti')
+
+with open('adaptive_dose.vtm', 'w') as vtm_file:
+    vtm_file.write('<?xml version="1.0"?>\n')
+    vtm_file.write('<VTKFile type="vtkMultiBlockDataSet" version="1.0">\n<vtkMultiBlockDataSet>\n')
+    for index, block in enumerate(blocks):
+        vtm_file.write(f'<DataSet index="{index}" name="{block[:-4]}" file="{block}"/>\n')
+    vtm_file.write('</vtkMultiBlockDataSet>\n</VTKFile>\n')
+
+print(f'written {output_filename} and adaptive_dose.vtm')
@@ -0,0 +1,195 @@
+# This script splits a dose simulation into several independent runs with
+# different random number seeds and merges their statepoint files into one.
+
+# compare_dose_simulation_with_back_of_envelope.py runs 6 million particles for
+# 30 batches at each distance in a single openmc run. Without MPI a single run
+# can only use the cores of one computer. The batches can be shared between
+# several runs (on the same computer or on different computers) as long as
+# each run uses a different seed, so that the batches of every run are
+# independent.
+
+# Each batch is one realization of the tally. The merged tally sum and sum of
+# squares are the sums over all the runs, and the number of realizations is the
+# total number of batches. This gives the same mean and standard deviation as
+# a single run with all the batches. The merged statepoint is a copy of the
+# first statepoint with the tally results replaced, so it can be opened with
+# openmc.StatePoint as usual. The tally results are merged a block of rows at a
+# time so that large mesh tallies don't have to fit in memory.
+
+# To run on several computers, run this script with --run 0, --run 1, ... on
+# each computer (with a shared folder) and then once with --merge.
+# Running without arguments runs all the parts here one after another.
+
+import argparse
+import math
+import shutil
+from pathlib import Path
+
+import h5py
+import numpy as np
+import openmc
+
+# a few user settings
+n_runs = 3
+batches_per_run = 10  # 30 batches in total, the same as compare_dose_simulation_with_back_of_envelope.py
+particles_per_batch = 6000000  # the same as compare_dose_simulation_with_back_of_envelope.py
+distance_from_source = 1000
+merged_filename = 'merged_statepoint.h5'
+max_values_per_chunk = 10_000_000
+
+
+def make_model(seed):
+    """Makes the neutron dose model from compare_dose_simulation_with_back_of_envelope.py"""
+    mat_tissue = openmc.Material()
+    mat_tissue.add_element("O", 76.2)
+    mat_tissue.add_element("C", 11.1)
+    mat_tissue.add_element("H", 10.1)
+    mat_tissue.add_element("N", 2.6)
+    mat_tissue.set_density("g/cm3", 1.0)
+
+    my_materials = openmc.Materials([mat_tissue])
+
+    phantom_surface = openmc.Sphere(r=15, x0=distance_from_source - 15.1)
+    outer_surface = openmc.Sphere(r=distance_from_source, boundary_type="vacuum")
+
+    phantom_cell = openmc.Cell(region=-phantom_surface, fill=mat_tissue)
+    void_cell = openmc.Cell(region=-outer_surface & +phantom_surface)
+
+    my_geometry = openmc.Geometry([phantom_cell, void_cell])
+
+    my_settings = openmc.Settings()
+    my_settings.output = {"tallies": False}
+    my_settings.batches = batches_per_run
+    my_settings.inactive = 0
+    my_settings.particles = particles_per_batch
+    my_settings.run_mode = "fixed source"
+    # every run must have a different seed so that the runs are independent
+    my_settings.seed = seed
+
+    source = openmc.IndependentSource()
+    source.particle = "neutron"
+    source.angle = openmc.stats.Isotropic()
+    source.energy = openmc.stats.Discrete([14e6], [1])
+    source.space = openmc.stats.Point((0.0, 0.0, 0.0))
+    my_settings.source = source
+
+    energy_bins, dose_coeffs = openmc.data.dose_coefficients(particle="neutron", geometry="AP")
+    energy_function_filter = openmc.EnergyFunctionFilter(energy_bins, dose_coeffs)
+    energy_function_filter.interpolation = "cubic"
+
+    dose_cell_tally = openmc.Tally(name="dose_on_cell")
+    dose_cell_tally.filters = [
+        openmc.CellFilter(phantom_cell),
+        energy_function_filter,
+        openmc.ParticleFilter("neutron"),
+    ]
+    dose_cell_tally.scores = ["flux"]
+    my_tallies = openmc.Tallies([dose_cell_tally])
+
+    return openmc.Model(my_geometry, my_materials, my_settings, my_tallies)
+
+
+def run_part(run_index):
+    """Runs one of the independent runs in its own folder"""
+    model = make_model(seed=run_index + 1)
+    return model.run(cwd=f'run_{run_index}')
+
+
+def merge_statepoints(statepoint_filenames, merged_filename, max_values_per_chunk=10_000_000):
+    """Merges statepoints from independent fixed source runs of the same model
+
+    Args:
+        statepoint_filenames (list): the statepoint files to merge
+        merged_filename (str): the merged statepoint file to write
+        max_values_per_chunk (int): the most tally values read from each file at once
+    """
+    files = [h5py.File(filename, 'r') for filename in statepoint_filenames]
+    try:
+        # checks the runs can be merged
+        seeds = [f['seed'][()] for f in files]
+        if len(set(seeds)) != len(seeds):
+            raise ValueError(f'the runs must have different seeds to be independent, the seeds are {seeds}')
+        n_particles = {f['n_particles'][()] for f in files}
+        if len(n_particles) != 1:
+            raise ValueError('the runs must have the same number of particles per batch')
+        tally_ids = [sorted(f['tallies'].attrs['ids']) for f in files]
+        if any(ids != tally_ids[0] for ids in tally_ids):
+            raise ValueError('the runs must have the same tallies')
+
+        # the merged file starts as a copy of the first statepoint so that the
+        # model summary, filters and meshes are all kept
+        shutil.copyfile(statepoint_filenames[0], merged_filename)
+        with h5py.File(merged_filename, 'r+') as merged:
+            n_batches = sum(f['n_batches'][()] for f in files)
+            for name in ['n_batches', 'current_batch']:
+                merged[name][()] = n_batches
+            if 'n_realizations' in merged:
+                merged['n_realizations'][()] = sum(f['n_realizations'][()] for f in files)
+            if 'global_tallies' in merged:
+                # the global tallies have the sum in index 1 and the sum of squares in index 2
+                merged['global_tallies'][:, 1:3] = sum(f['global_tallies'][:, 1:3] for f in files)
+            merged.attrs['merged_from'] = [str(filename) for filename in statepoint_filenames]
+
+            for tally_id in tally_ids[0]:
+                group_name = f'tallies/tally {tally_id}'
+                merged_results = merged[f'{group_name}/results']
+                shape = merged_results.shape
+                for f in files:
+                    if f[f'{group_name}/results'].shape != shape:
+                        raise ValueError(f'tally {tally_id} has a different shape in {f.filename}')
+
+                merged[f'{group_name}/n_realizations'][()] = sum(
+                    f[f'{group_name}/n_realizations'][()] for f in files
+                )
+
+                # the statepoint tally results have the sum in index 0 and the
+                # sum of squares in index 1
+                rows_per_chunk = max(1, max_values_per_chunk // (shape[1] * shape[2]))
+                for first_row in range(0, shape[0], rows_per_chunk):
+                    rows = slice(first_row, min(shape[0], first_row + rows_per_chunk))
+                    merged_sums = files[0][f'{group_name}/results'][rows, :, 0:2]
+                    for f in files[1:]:
+                        merged_sums += f[f'{group_name}/results'][rows, :, 0:2]
+                    merged_results[rows, :, 0:2] = merged_sums
+    finally:
+        for f in files:
+            f.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    # a run and the merge are done separately, the merge needs every run to have finished
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--run', type=int, help='the index of the run to do')
+    group.add_argument('--merge', action='store_true', help='merges the statepoints from all the runs')
+    args = parser.parse_args()
+
+    statepoint_filenames = [Path(f'run_{i}') / f'statepoint.{batches_per_run}.h5' for i in range(n_runs)]
+
+    if args.run is not None:
+        run_part(args.run)
+    if args.run is None and not args.merge:
+        for run_index in range(n_runs):
+            run_part(run_index)
+    if args.run is None:
+        merge_statepoints(statepoint_filenames, merged_filename, max_values_per_chunk)
+
+        with openmc.StatePoint(merged_filename) as statepoint:
+            tally = statepoint.get_tally(name="dose_on_cell")
+            print(f'merged {statepoint.n_realizations} batches from {n_runs} runs')
+            print(f'tally mean {tally.mean.flatten()[0]:.4e} std_dev {tally.std_dev.flatten()[0]:.4e} pSv-cm3 per source neutron')
+
+        # converts the merged tally to dose per shot in the same way as
+        # compare_dose_simulation_with_back_of_envelope.py
+        particles_per_shot = 1e18
+        phantom_volume = (4 / 3) * math.pi * math.pow(15, 3)
+        total_dose = tally.mean.flatten()[0] * particles_per_shot / phantom_volume * 1e-12
+        print(f"dose on phantom is {total_dose}Sv per shot")
+
+        # the individual runs have a larger std_dev than the merged result
+        for filename in statepoint_filenames:
+            with openmc.StatePoint(filename) as statepoint:
+                run_tally = statepoint.get_tally(name="dose_on_cell")
+                print(f'{filename} mean {run_tally.mean.flatten()[0]:.4e} std_dev {run_tally.std_dev.flatten()[0]:.4e}')
+        print(f'the relative error falls by about {np.sqrt(n_runs):.2f} times when {n_runs} runs are merged')
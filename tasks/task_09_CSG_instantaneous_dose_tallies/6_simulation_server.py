@@ -0,0 +1,373 @@
+# This script runs a local simulation server that keeps the nuclear data loaded
+# between simulations, and shows a dose study that sends its simulations to it.
+
+# Each model.run() starts a new openmc executable which reads the
+# cross_sections.xml and loads the nuclear data for every nuclide again. For a
+# study made of many small simulations loading the nuclear data can take
+# longer than the transport.
+
+# The server keeps openmc.lib sessions running in separate processes. Each
+# session is for one geometry, set of tallies and set of nuclides in each
+# material. openmc.lib can change the material densities, the number of
+# particles, the number of batches and the seed without loading the nuclear
+# data again, so a simulation that only changes these runs in an existing
+# session. A simulation with a new geometry (or new nuclides) starts a new
+# session. The least recently used session is closed when there are too many.
+
+# The client run_model function takes an openmc.Model, like model.run(), and
+# returns the path of the statepoint file written by the session.
+
+# Start the server with
+#   python 6_simulation_server.py --serve
+# or run this script without arguments to start a server and run the example.
+
+import argparse
+import hashlib
+import math
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from multiprocessing import get_context
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+import openmc
+
+server_address = 'openmc_server.sock'  # a Unix socket, use a tuple such as ('localhost', 6000) for a port
+authkey = b'openmc'
+sessions_folder = Path('server_sessions')
+max_sessions = 2  # each session holds the nuclear data in memory
+threads_per_session = None  # None uses all the threads
+
+
+def session_worker(session_folder, xml_files, connection):
+    """Loads the model and nuclear data once with openmc.lib then runs the
+    jobs sent through the connection until it receives None
+
+    Args:
+        session_folder (Path): the folder the session runs in
+        xml_files (dict): the contents of each XML file keyed by file name
+        connection (multiprocessing.connection.Connection): jobs are received
+            and statepoint filenames (or errors) are sent back on this
+    """
+    import os
+
+    import openmc.lib
+
+    session_folder.mkdir(parents=True, exist_ok=True)
+    os.chdir(session_folder)
+    for filename, contents in xml_files.items():
+        Path(filename).write_text(contents)
+
+    args = ['-s', str(threads_per_session)] if threads_per_session else None
+    openmc.lib.init(args=args, output=False)
+
+    job_number = 0
+    while True:
+        job = connection.recv()
+        if job is None:
+            break
+        job_number += 1
+        try:
+            # resets the tallies to 0 so we don't combine result with previous simulation
+            openmc.lib.hard_reset()
+            for material_id, nuclide_densities in job['materials'].items():
+                openmc.lib.materials[material_id].set_densities(
+                    nuclides=list(nuclide_densities.keys()),
+                    densities=list(nuclide_densities.values()),
+                )
+            openmc.lib.settings.particles = job['particles']
+            openmc.lib.settings.set_batches(job['batches'])
+            openmc.lib.settings.seed = job['seed']
+
+            openmc.lib.run(output=False)
+
+            statepoint_filename = session_folder / f'statepoint_{job_number}.h5'
+            openmc.lib.statepoint_write(filename=str(statepoint_filename), write_source=False)
+            connection.send({'statepoint': str(statepoint_filename)})
+        except Exception as error:
+            connection.send({'error': f'{type(error).__name__}: {error}'})
+
+    # close down openmc lib interface
+    openmc.lib.finalize()
+
+
+class SimulationServer:
+    """Accepts jobs from clients and sends each one to an openmc.lib session
+    for its model, starting a new session if there isn't one"""
+
+    def __init__(self, address, max_sessions):
+        self.address = address
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # session key: (process, connection, lock)
+        self.sessions_lock = threading.Lock()
+        self.context = get_context('spawn')  # a clean process for each openmc.lib session
+
+    def get_session(self, key, xml_files):
+        with self.sessions_lock:
+            if key in self.sessions:
+                self.sessions.move_to_end(key)
+                return self.sessions[key]
+
+            # closes the least recently used session to free its memory
+            while len(self.sessions) >= self.max_sessions:
+                _, (process, connection, lock) = self.sessions.popitem(last=False)
+                with lock:
+                    connection.send(None)
+                process.join()
+
+            print(f'starting openmc.lib session {key}')
+            server_end, session_end = self.context.Pipe()
+            process = self.context.Process(
+                target=session_worker,
+                args=((sessions_folder / key).resolve(), xml_files, session_end),
+                daemon=True,
+            )
+            process.start()
+            self.sessions[key] = (process, server_end, threading.Lock())
+            return self.sessions[key]
+
+    def run_job(self, request):
+        process, connection, lock = self.get_session(request['key'], request['xml_files'])
+        # one job at a time for each session, jobs for different sessions run at the same time
+        with lock:
+            try:
+                connection.send(request['job'])
+                return connection.recv()
+            except (EOFError, OSError):
+                # the session process has stopped, so it is removed and the next job starts a new one
+                with self.sessions_lock:
+                    self.sessions.pop(request['key'], None)
+                process.join()
+                raise RuntimeError('the openmc.lib session stopped, check the model runs with model.run()')
+
+    def handle_client(self, connection):
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except EOFError:
+                    return
+                if request == 'shutdown':
+                    self.running = False
+                    connection.send({'shutdown': True})
+                    # a connection wakes up the accept in serve_forever so it sees the shutdown
+                    Client(self.address, authkey=authkey).close()
+                    return
+                try:
+                    connection.send(self.run_job(request))
+                except Exception as error:
+                    connection.send({'error': f'{type(error).__name__}: {error}'})
+
+    def serve_forever(self):
+        if isinstance(self.address, str):
+            Path(self.address).unlink(missing_ok=True)
+        self.running = True
+        with Listener(self.address, authkey=authkey) as listener:
+            print(f'openmc server listening on {self.address}')
+            while True:
+                connection = listener.accept()
+                if not self.running:
+                    connection.close()
+                    break
+                threading.Thread(target=self.handle_client, args=(connection,), daemon=True).start()
+
+        for process, connection, lock in self.sessions.values():
+            with lock:
+                connection.send(None)
+            process.join()
+
+
+def get_session_key(xml_files, materials):
+    """Finds the key of the session that can run a model. Everything except
+    the material densities, particles, batches and seed has to match."""
+    settings = ET.fromstring(xml_files['settings.xml'])
+    for name in ['particles', 'batches', 'seed']:
+        for element in settings.findall(name):
+            settings.remove(element)
+    nuclides = {material_id: sorted(densities) for material_id, densities in materials.items()}
+    key_contents = repr((
+        xml_files['geometry.xml'],
+        ET.tostring(settings),
+        xml_files.get('tallies.xml'),
+        sorted(nuclides.items()),
+        openmc.config.get('cross_sections'),
+    ))
+    return hashlib.sha256(key_contents.encode()).hexdigest()[:16]
+
+
+def run_model(model, address=server_address, seed=1):
+    """Runs a model on the simulation server, this is used in place of
+    model.run()
+
+    Args:
+        model (openmc.Model): the model to run
+        address (str or tuple): the address of the server
+        seed (int): the random number seed
+
+    Returns:
+        Path: the statepoint file, this can be opened with openmc.StatePoint
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model.export_to_xml(directory=tmpdir)
+        xml_files = {path.name: path.read_text() for path in Path(tmpdir).glob('*.xml')}
+
+    # the atom densities are sent so that the session can use set_densities
+    materials = {
+        material.id: material.get_nuclide_atom_densities()
+        for material in model.materials
+    }
+
+    request = {
+        'key': get_session_key(xml_files, materials),
+        'xml_files': xml_files,
+        'job': {
+            'materials': materials,
+            'particles': model.settings.particles,
+            'batches': model.settings.batches,
+            'seed': seed,
+        },
+    }
+    with Client(address, authkey=authkey) as connection:
+        connection.send(request)
+        reply = connection.recv()
+    if 'error' in reply:
+        raise RuntimeError(f'simulation server error: {reply["error"]}')
+    return Path(reply['statepoint'])
+
+
+def shutdown_server(address=server_address):
+    with Client(address, authkey=authkey) as connection:
+        connection.send('shutdown')
+        connection.recv()
+
+
+def make_shielded_phantom_model(shield_density):
+    """Makes a model of a phantom behind a concrete shield, the shield
+    density is the only thing that changes between simulations so every
+    simulation uses the same session"""
+
+    # the surfaces, cells, filters and tallies get the same ids on every call
+    # so the geometry.xml and tallies.xml (and so the session key) match
+    openmc.reset_auto_ids()
+
+    mat_tissue = openmc.Material(material_id=1)
+    mat_tissue.add_element("O", 0.079013)
+    mat_tissue.add_element("C", 0.32948)
+    mat_tissue.add_element("H", 0.546359)
+    mat_tissue.add_element("N", 0.008619)
+    mat_tissue.add_element("Mg", 0.036358)
+    mat_tissue.add_element("Cl", 0.000172)
+    mat_tissue.set_density("g/cm3", 1.0)
+
+    mat_concrete = openmc.Material(material_id=2)
+    mat_concrete.add_element("H", 0.168759)
+    mat_concrete.add_element("C", 0.001416)
+    mat_concrete.add_element("O", 0.562524)
+    mat_concrete.add_element("Na", 0.011838)
+    mat_concrete.add_element("Mg", 0.0014)
+    mat_concrete.add_element("Al", 0.021354)
+    mat_concrete.add_element("Si", 0.204115)
+    mat_concrete.add_element("K", 0.005656)
+    mat_concrete.add_element("Ca", 0.018674)
+    mat_concrete.add_element("Fe", 0.004264)
+    mat_concrete.set_density("g/cm3", shield_density)
+
+    my_materials = openmc.Materials([mat_tissue, mat_concrete])
+
+    cylinder_surface = openmc.ZCylinder(r=10.782, x0=300)
+    phantom_upper_surface = openmc.ZPlane(z0=169.75)
+    phantom_lower_surface = openmc.ZPlane(z0=0)
+    shield_front_surface = openmc.XPlane(x0=150)
+    shield_back_surface = openmc.XPlane(x0=200)
+    outer_surface = openmc.Sphere(r=10000, boundary_type="vacuum")
+
+    phantom_region = -cylinder_surface & -phantom_upper_surface & +phantom_lower_surface
+    shield_region = +shield_front_surface & -shield_back_surface & -outer_surface
+    void_region = -outer_surface & ~phantom_region & ~shield_region
+
+    phantom_cell = openmc.Cell(region=phantom_region, fill=mat_tissue)
+    shield_cell = openmc.Cell(region=shield_region, fill=mat_concrete)
+    void_cell = openmc.Cell(region=void_region)
+
+    my_geometry = openmc.Geometry([phantom_cell, shield_cell, void_cell])
+
+    my_settings = openmc.Settings()
+    my_settings.batches = 2
+    my_settings.inactive = 0
+    my_settings.particles = 100000
+    my_settings.run_mode = "fixed source"
+
+    source = openmc.IndependentSource()
+    source.angle = openmc.stats.Isotropic()
+    source.energy = openmc.stats.Discrete([14e6], [1])
+    source.space = openmc.stats.Point((0.0, 0.0, 0.0))
+    my_settings.source = source
+
+    energy_bins_n, dose_coeffs_n = openmc.data.dose_coefficients(particle="neutron", geometry="AP")
+    energy_function_filter_n = openmc.EnergyFunctionFilter(energy_bins_n, dose_coeffs_n)
+    energy_function_filter_n.interpolation = "cubic"  # cubic interpolation is recommended by ICRP
+
+    dose_cell_tally = openmc.Tally(name="neutron_dose_on_cell")
+    dose_cell_tally.filters = [
+        openmc.CellFilter(phantom_cell),
+        openmc.ParticleFilter("neutron"),
+        energy_function_filter_n,
+    ]
+    dose_cell_tally.scores = ["flux"]
+    my_tallies = openmc.Tallies([dose_cell_tally])
+
+    return openmc.Model(my_geometry, my_materials, my_settings, my_tallies)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', action='store_true', help='run the server instead of the example')
+    if parser.parse_args().serve:
+        SimulationServer(server_address, max_sessions).serve_forever()
+        sys.exit()
+
+    # starts a server in the background for this example
+    server_process = subprocess.Popen([sys.executable, __file__, '--serve'])
+    server_start_timeout = time.perf_counter() + 60
+    while not Path(server_address).exists():
+        if server_process.poll() is not None:
+            raise RuntimeError(f'the server stopped with exit code {server_process.returncode}')
+        if time.perf_counter() > server_start_timeout:
+            server_process.kill()
+            raise RuntimeError('the server did not start within 60 seconds')
+        time.sleep(0.1)
+
+    phantom_volume = math.pi * math.pow(10.782, 2) * 169.75
+    neutrons_per_second = 1e8
+
+    shield_densities = [1.6, 1.8, 2.0, 2.2, 2.4, 2.6]
+    yearly_dose = []
+    for shield_density in shield_densities:
+        start = time.perf_counter()
+        statepoint_filename = run_model(make_shielded_phantom_model(shield_density))
+        # the first simulation includes loading the nuclear data, the others are just transport
+        print(f'shield density {shield_density} g/cm3 simulated in {time.perf_counter() - start:.2f} seconds')
+
+        with openmc.StatePoint(statepoint_filename) as statepoint:
+            tally_result = statepoint.get_tally(name="neutron_dose_on_cell").mean.flatten()[0]
+
+        # converts from pSv-cm3 per source neutron to mSv per year
+        yearly_dose.append(tally_result * neutrons_per_second / phantom_volume * 1e-9 * 60 * 60 * 24 * 365)
+
+    shutdown_server()
+    server_process.wait()
+
+    import matplotlib.pyplot as plt
+
+    plt.plot(shield_densities, yearly_dose, label="dose on phantom")
+    plt.xlabel("Concrete shield density [g/cm3]")
+    plt.ylabel("Dose [mSv per year]")
+    plt.title("Dose on a phantom behind a 50cm concrete shield\n")
+    plt.legend()
+    plt.show()
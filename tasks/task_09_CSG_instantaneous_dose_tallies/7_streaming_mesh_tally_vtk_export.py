@@ -0,0 +1,161 @@
+# This script exports the dose mesh tally from 5_mesh_dose_from_neutrons.py to a
+# VTKHDF file that can be opened in ParaView, without loading the whole tally
+# into memory.
+
+# mesh.write_data_to_vtk needs the whole mean array, and the unit conversion
+# makes more arrays of the same size. A VTK object holding all of them is then
+# made before anything is written. For large meshes (10^8 voxels) with a few
+# datasets (mean, std_dev and relative error) this runs out of memory.
+
+# Here the statepoint is opened with h5py and the tally results are read a few
+# layers of the mesh at a time. The unit conversion and volume normalisation
+# are applied to each chunk, and the chunk is written to the VTKHDF file
+# before the next one is read. So memory use depends on the chunk size, not
+# on the mesh size.
+
+# 5_mesh_dose_from_neutrons.py must be run first to make the statepoint file.
+
+import h5py
+import numpy as np
+
+# a few user settings
+statepoint_filename = 'statepoint.2.h5'
+tally_name = 'neutron_dose_on_mesh'
+output_filename = 'dose_on_mesh.vtkhdf'
+max_voxels_per_chunk = 10_000_000  # memory use is roughly 40 bytes per voxel in a chunk
+
+# tally.mean is in units of pSv-cm3/source neutron
+# multiplication by neutrons_per_second changes units to neutron to pSv-cm3/second
+neutrons_per_second = 1e8  # units of neutrons per second
+# multiplication by pico_to_milli converts from (pico) pSv/second to (milli) mSv/second
+pico_to_milli = 1e-9
+scaling_factor = neutrons_per_second * pico_to_milli
+
+
+def get_tally_group(statepoint_file, tally_name):
+    """Finds the HDF5 group of a tally using the tally name"""
+    for tally_id in statepoint_file['tallies'].attrs['ids']:
+        group = statepoint_file[f'tallies/tally {tally_id}']
+        if 'name' in group and group['name'][()].decode() == tally_name:
+            return group
+    raise ValueError(f'tally with name {tally_name} not found in {statepoint_file.filename}')
+
+
+def get_regular_mesh(statepoint_file, tally_group):
+    """Finds the regular mesh used by the MeshFilter of a tally
+
+    Returns:
+        tuple: the mesh dimension, lower_left and upper_right arrays
+    """
+    mesh_group = None
+    n_filter_bins = []
+    for filter_id in tally_group['filters'][()]:
+        filter_group = statepoint_file[f'tallies/filters/filter {filter_id}']
+        n_filter_bins.append(filter_group['n_bins'][()])
+        if filter_group['type'][()].decode() == 'mesh':
+            mesh_id = np.atleast_1d(filter_group['bins'][()])[0]
+            mesh_group = statepoint_file[f'tallies/meshes/mesh {mesh_id}']
+    if mesh_group is None or mesh_group['type'][()].decode() != 'regular':
+        raise ValueError('tally must have a MeshFilter on a RegularMesh')
+    if int(np.prod(n_filter_bins)) != int(np.prod(mesh_group['dimension'][()])):
+        raise ValueError('all the tally filters other than the MeshFilter must have a single bin')
+    return mesh_group['dimension'][()], mesh_group['lower_left'][()], mesh_group['upper_right'][()]
+
+
+def export_mesh_tally_to_vtkhdf(
+    statepoint_filename,
+    tally_name,
+    output_filename,
+    scaling_factor=1.,
+    volume_normalization=True,
+    score_index=0,
+    max_voxels_per_chunk=10_000_000,
+):
+    """Writes the mean, std_dev and relative error of a regular mesh tally to
+    a VTKHDF image data file, reading and writing a few mesh layers at a time
+
+    Args:
+        statepoint_filename (str): the statepoint file
+        tally_name (str): the name of the mesh tally
+        output_filename (str): the VTKHDF file to write
+        scaling_factor (float): the tally values are multiplied by this
+        volume_normalization (bool): divides the tally values by the voxel volume
+        score_index (int): the index of the score (and nuclide) to export
+        max_voxels_per_chunk (int): the most voxels read into memory at once
+    """
+    with h5py.File(statepoint_filename, 'r') as statepoint_file, h5py.File(output_filename, 'w') as vtk_file:
+        tally_group = get_tally_group(statepoint_file, tally_name)
+        n_realizations = tally_group['n_realizations'][()]
+        results = tally_group['results']
+        dimension, lower_left, upper_right = get_regular_mesh(statepoint_file, tally_group)
+
+        spacing = (upper_right - lower_left) / dimension
+        factor = scaling_factor
+        if volume_normalization:
+            factor = factor / np.prod(spacing)
+
+        # the VTKHDF image data layout, see https://docs.vtk.org/en/latest/design_documents/VTKFileFormats.html
+        root = vtk_file.create_group('VTKHDF')
+        root.attrs['Version'] = [1, 0]
+        root.attrs['Type'] = np.bytes_('ImageData')
+        # the extent is the number of points (voxel corners) along each axis
+        root.attrs['WholeExtent'] = [0, dimension[0], 0, dimension[1], 0, dimension[2]]
+        root.attrs['Origin'] = lower_left
+        root.attrs['Spacing'] = spacing
+        root.attrs['Direction'] = [1., 0., 0., 0., 1., 0., 0., 0., 1.]
+        cell_data = root.create_group('CellData')
+
+        # the cell data is ordered with x changing fastest, the same order as
+        # the mesh tally results, so each chunk of z layers is a continuous
+        # block of rows in the tally results
+        nx, ny, nz = dimension
+        voxels_per_layer = nx * ny
+        layers_per_chunk = max(1, max_voxels_per_chunk // voxels_per_layer)
+        dataset_chunks = (1, ny, nx)
+        names = ['mean', 'std_dev', 'relative_error']
+        datasets = {
+            name: cell_data.create_dataset(
+                name, shape=(nz, ny, nx), dtype='f8', chunks=dataset_chunks, compression='gzip'
+            )
+            for name in names
+        }
+
+        for first_layer in range(0, nz, layers_per_chunk):
+            last_layer = min(nz, first_layer + layers_per_chunk)
+            rows = slice(first_layer * voxels_per_layer, last_layer * voxels_per_layer)
+            shape = (last_layer - first_layer, ny, nx)
+
+            # results has the sum in index 0 and the sum of squares in index 1
+            tally_sum = results[rows, score_index, 0]
+            tally_sum_sq = results[rows, score_index, 1]
+
+            # the chunk arrays are changed in place to avoid making more copies
+            mean = tally_sum
+            mean /= n_realizations
+            std_dev = tally_sum_sq
+            std_dev /= n_realizations
+            std_dev -= np.square(mean)
+            std_dev /= n_realizations - 1
+            np.clip(std_dev, 0., None, out=std_dev)
+            np.sqrt(std_dev, out=std_dev)
+
+            relative_error = np.divide(std_dev, mean, out=np.zeros_like(mean), where=mean > 0)
+
+            mean *= factor
+            std_dev *= factor
+            datasets['mean'][first_layer:last_layer] = mean.reshape(shape)
+            datasets['std_dev'][first_layer:last_layer] = std_dev.reshape(shape)
+            datasets['relative_error'][first_layer:last_layer] = relative_error.reshape(shape)
+
+            print(f'written mesh layers {first_layer} to {last_layer - 1} of {nz}')
+
+
+export_mesh_tally_to_vtkhdf(
+    statepoint_filename=statepoint_filename,
+    tally_name=tally_name,
+    output_filename=output_filename,
+    scaling_factor=scaling_factor,
+    volume_normalization=True,  # this converts from dose-cm3/second to dose/second
+    max_voxels_per_chunk=max_voxels_per_chunk,
+)
+print(f'written {output_filename}, open it with ParaView 5.11 or newer')
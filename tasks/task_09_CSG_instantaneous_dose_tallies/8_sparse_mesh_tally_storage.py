@@ -0,0 +1,232 @@
+# This script converts the mesh tallies in a statepoint file to a sparse and
+# compressed HDF5 file for keeping, and reads slices back from it.
+
+# Mesh tallies behind thick shielding or in void are mostly zeros, but the
+# statepoint saves the sum and sum of squares of every voxel. Keeping the
+# statepoint from every run of a large mesh takes a lot of disk space, and
+# loading it reads all the zeros as well.
+
+# Here only the voxels with a non zero tally are saved. Their flat mesh index
+# (x changing fastest) and their sum and sum of squares are saved to gzip
+# compressed HDF5 datasets, sorted by index. This is coordinate (COO) storage.
+# The position of the first saved voxel in each z layer is saved too, like the
+# row pointer of compressed sparse row (CSR) storage. A reader can then load a
+# single layer, or the box around the non zero voxels, without reading the
+# rest of the file.
+
+# 5_mesh_dose_from_neutrons.py must be run first to make the statepoint file.
+
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+# a few user settings
+statepoint_filename = 'statepoint.2.h5'
+sparse_filename = 'sparse_mesh_tallies.h5'
+max_voxels_per_chunk = 10_000_000
+
+
+def get_regular_mesh(statepoint_file, tally_group):
+    """Finds the regular mesh used by the MeshFilter of a tally
+
+    Returns:
+        tuple: the mesh dimension, lower_left and upper_right arrays, or None
+            if the tally is not a regular mesh tally with single bin filters
+    """
+    mesh_group = None
+    n_filter_bins = []
+    for filter_id in tally_group['filters'][()]:
+        filter_group = statepoint_file[f'tallies/filters/filter {filter_id}']
+        n_filter_bins.append(filter_group['n_bins'][()])
+        if filter_group['type'][()].decode() == 'mesh':
+            mesh_id = np.atleast_1d(filter_group['bins'][()])[0]
+            mesh_group = statepoint_file[f'tallies/meshes/mesh {mesh_id}']
+    if mesh_group is None or mesh_group['type'][()].decode() != 'regular':
+        return None
+    if int(np.prod(n_filter_bins)) != int(np.prod(mesh_group['dimension'][()])):
+        return None
+    return mesh_group['dimension'][()], mesh_group['lower_left'][()], mesh_group['upper_right'][()]
+
+
+def convert_to_sparse(statepoint_filename, sparse_filename, max_voxels_per_chunk=10_000_000):
+    """Saves the non zero voxels of every regular mesh tally in a statepoint.
+    The tally results are read a few z layers at a time so the whole tally is
+    never in memory.
+
+    Args:
+        statepoint_filename (str): the statepoint file
+        sparse_filename (str): the sparse HDF5 file to write, with a group for each tally
+        max_voxels_per_chunk (int): the most voxels read into memory at once
+    """
+    with h5py.File(statepoint_filename, 'r') as statepoint_file, h5py.File(sparse_filename, 'w') as sparse_file:
+        for tally_id in statepoint_file['tallies'].attrs['ids']:
+            tally_group = statepoint_file[f'tallies/tally {tally_id}']
+            mesh = get_regular_mesh(statepoint_file, tally_group)
+            if mesh is None:
+                continue
+            dimension, lower_left, upper_right = mesh
+            results = tally_group['results']
+            n_scores = results.shape[1]
+
+            name = tally_group['name'][()].decode() if 'name' in tally_group else f'tally {tally_id}'
+            group = sparse_file.create_group(name)
+            group.attrs['dimension'] = dimension
+            group.attrs['lower_left'] = lower_left
+            group.attrs['upper_right'] = upper_right
+            group.attrs['n_realizations'] = tally_group['n_realizations'][()]
+            group.attrs['scores'] = tally_group['score_bins'][()] if 'score_bins' in tally_group else []
+
+            compression = {'chunks': True, 'compression': 'gzip', 'shuffle': True}
+            indices = group.create_dataset('indices', shape=(0,), maxshape=(None,), dtype='i8', **compression)
+            sums = group.create_dataset('sum', shape=(0, n_scores), maxshape=(None, n_scores), dtype='f8', **compression)
+            sums_sq = group.create_dataset('sum_sq', shape=(0, n_scores), maxshape=(None, n_scores), dtype='f8', **compression)
+
+            nx, ny, nz = dimension
+            voxels_per_layer = nx * ny
+            layers_per_chunk = max(1, max_voxels_per_chunk // voxels_per_layer)
+            layer_offsets = np.zeros(nz + 1, dtype='i8')
+
+            for first_layer in range(0, nz, layers_per_chunk):
+                last_layer = min(nz, first_layer + layers_per_chunk)
+                first_row = first_layer * voxels_per_layer
+                # results has the sum in index 0 and the sum of squares in index 1
+                chunk = results[first_row:last_layer * voxels_per_layer, :, 0:2]
+                non_zero = np.flatnonzero(np.any(chunk[:, :, 0] != 0., axis=1))
+
+                n_saved = indices.shape[0]
+                for dataset in [indices, sums, sums_sq]:
+                    dataset.resize(n_saved + non_zero.size, axis=0)
+                indices[n_saved:] = non_zero + first_row
+                sums[n_saved:] = chunk[non_zero, :, 0]
+                sums_sq[n_saved:] = chunk[non_zero, :, 1]
+
+                # the number of saved voxels before the end of each layer in this chunk
+                layer_of_each_voxel = non_zero // voxels_per_layer
+                counts = np.bincount(layer_of_each_voxel, minlength=last_layer - first_layer)
+                layer_offsets[first_layer + 1:last_layer + 1] = n_saved + np.cumsum(counts)
+
+            group.create_dataset('layer_offsets', data=layer_offsets)
+            print(f'{name}: {indices.shape[0]} of {nx * ny * nz} voxels are non zero')
+
+
+class SparseMeshTally:
+    """Reads a mesh tally saved by convert_to_sparse. The file is only read
+    when a layer or region is requested.
+
+    Args:
+        sparse_filename (str): the sparse HDF5 file
+        tally_name (str): the name of the tally
+    """
+
+    def __init__(self, sparse_filename, tally_name):
+        self.file = h5py.File(sparse_filename, 'r')
+        self.group = self.file[tally_name]
+        self.dimension = self.group.attrs['dimension']
+        self.lower_left = self.group.attrs['lower_left']
+        self.upper_right = self.group.attrs['upper_right']
+        self.n_realizations = self.group.attrs['n_realizations']
+        self.voxel_volume = np.prod((self.upper_right - self.lower_left) / self.dimension)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+    def _mean_and_std_dev(self, tally_sum, tally_sum_sq):
+        """Converts the sum and sum of squares to the mean and standard
+        deviation, in the same way as openmc.Tally does"""
+        n = self.n_realizations
+        mean = tally_sum / n
+        variance = (tally_sum_sq / n - np.square(mean)) / (n - 1)
+        return mean, np.sqrt(np.clip(variance, 0., None))
+
+    def _read_voxels(self, first, last, score_index):
+        """Reads the saved voxels between two positions in the sorted index"""
+        indices = self.group['indices'][first:last]
+        tally_sum = self.group['sum'][first:last, score_index]
+        tally_sum_sq = self.group['sum_sq'][first:last, score_index]
+        mean, std_dev = self._mean_and_std_dev(tally_sum, tally_sum_sq)
+        return indices, mean, std_dev
+
+    def get_layer(self, z_index, score_index=0):
+        """Gets one z layer as dense 2D arrays, only the saved voxels in the
+        layer are read from the file
+
+        Returns:
+            tuple: the mean and std_dev arrays with shape (ny, nx)
+        """
+        nx, ny, _ = self.dimension
+        first, last = self.group['layer_offsets'][z_index:z_index + 2]
+        indices, mean, std_dev = self._read_voxels(first, last, score_index)
+        dense_mean = np.zeros(nx * ny)
+        dense_std_dev = np.zeros(nx * ny)
+        dense_mean[indices - z_index * nx * ny] = mean
+        dense_std_dev[indices - z_index * nx * ny] = std_dev
+        return dense_mean.reshape(ny, nx), dense_std_dev.reshape(ny, nx)
+
+    def get_non_zero_region(self, score_index=0):
+        """Gets the smallest box of voxels that contains all the non zero
+        voxels as dense 3D arrays. Only the layers inside the box are read.
+
+        Returns:
+            tuple: the mean and std_dev arrays with shape (nz, ny, nx) of the
+                box and the (x, y, z) index of the first voxel in the box
+        """
+        nx, ny, _ = self.dimension
+        layer_offsets = self.group['layer_offsets'][()]
+        layers_with_voxels = np.flatnonzero(np.diff(layer_offsets))
+        if layers_with_voxels.size == 0:
+            return np.zeros((0, 0, 0)), np.zeros((0, 0, 0)), (0, 0, 0)
+        z_first, z_last = layers_with_voxels[0], layers_with_voxels[-1] + 1
+
+        indices, mean, std_dev = self._read_voxels(layer_offsets[z_first], layer_offsets[z_last], score_index)
+        x, y, z = indices % nx, (indices // nx) % ny, indices // (nx * ny)
+        start = (x.min(), y.min(), z_first)
+        shape = (z_last - z_first, y.max() - y.min() + 1, x.max() - x.min() + 1)
+
+        dense_mean = np.zeros(shape)
+        dense_std_dev = np.zeros(shape)
+        position = (z - start[2], y - start[1], x - start[0])
+        dense_mean[position] = mean
+        dense_std_dev[position] = std_dev
+        return dense_mean, dense_std_dev, start
+
+
+convert_to_sparse(statepoint_filename, sparse_filename, max_voxels_per_chunk)
+
+statepoint_size = Path(statepoint_filename).stat().st_size
+sparse_size = Path(sparse_filename).stat().st_size
+print(f'statepoint {statepoint_size / 1e6:.2f} MB, sparse file {sparse_size / 1e6:.2f} MB')
+
+# plots the middle z layer of the dose mesh
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+
+# tally.mean is in units of pSv-cm3/source neutron
+neutrons_per_second = 1e8  # units of neutrons per second
+pico_to_milli = 1e-9
+
+with SparseMeshTally(sparse_filename, 'neutron_dose_on_mesh') as sparse_tally:
+    z_index = sparse_tally.dimension[2] // 2
+    mean, std_dev = sparse_tally.get_layer(z_index)
+    # converts from pSv-cm3/source neutron to mSv/second
+    dose = mean * neutrons_per_second * pico_to_milli / sparse_tally.voxel_volume
+    extent = (
+        sparse_tally.lower_left[0], sparse_tally.upper_right[0],
+        sparse_tally.lower_left[1], sparse_tally.upper_right[1],
+    )
+
+plot_1 = plt.imshow(
+    np.ma.masked_equal(dose, 0.),
+    origin='lower',
+    extent=extent,
+    norm=LogNorm(),
+)
+cbar = plt.colorbar(plot_1)
+cbar.set_label("Dose [milli Sv per second]")
+plt.xlabel('x [cm]')
+plt.ylabel('y [cm]')
+plt.title(f'Dose map of mesh layer {z_index} read from the sparse file')
+plt.show()
@@ -0,0 +1,174 @@
+# This script plots slices of the dose map from 5_mesh_dose_from_neutrons.py
+# with the material outlines on top, and saves the material outlines so they
+# are only worked out once.
+
+# 5_mesh_dose_from_neutrons.py finds the material at every pixel of the slice
+# (get_slice_of_material_ids) each time it plots. The geometry doesn't change
+# between plots, so plotting several dose maps (for example a dose map for each
+# cooling timestep) works out the same outlines again and again.
+
+# Here the cell and material ids of each slice are found with openmc.lib
+# (model.id_map) and saved to a cache. The cache key is made from the geometry
+# XML, the basis, the slice position, the width and the number of pixels, so a
+# change to any of these makes a new slice. Slices that are not in the cache
+# are found at the same time in a pool of processes, as each openmc.lib
+# session is separate.
+
+# 5_mesh_dose_from_neutrons.py must be run first to make the statepoint file.
+
+import hashlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import openmc
+from matplotlib.colors import LogNorm
+
+# a few user settings
+statepoint_filename = 'statepoint.2.h5'
+cache_folder = Path('geometry_slice_cache')
+pixels = (400, 400)
+
+# tally.mean is in units of pSv-cm3/source neutron
+neutrons_per_second = 1e8  # units of neutrons per second
+pico_to_milli = 1e-9
+
+# slices that have been loaded already in this python session
+_slices_in_memory = {}
+
+
+def make_geometry():
+    """Makes the same geometry as 5_mesh_dose_from_neutrons.py"""
+    mat = openmc.Material()
+    mat.add_element("Al", 1)
+    mat.set_density("g/cm3", 2.7)
+
+    cylinder_surface = openmc.ZCylinder(r=10)
+    cylinder_upper_surface = openmc.ZPlane(z0=100)
+    cylinder_lower_surface = openmc.ZPlane(z0=0)
+
+    outer_surface = openmc.Sphere(r=200, boundary_type="vacuum")
+
+    cylinder_region = -cylinder_surface & -cylinder_upper_surface & +cylinder_lower_surface
+
+    # void region is below the outer surface and not the cylinder region
+    void_region = -outer_surface & ~cylinder_region
+
+    void_cell = openmc.Cell(region=void_region)
+    cylinder_cell = openmc.Cell(region=cylinder_region)
+    cylinder_cell.fill = mat
+
+    return openmc.Geometry([cylinder_cell, void_cell])
+
+
+def get_slice_key(geometry, basis, origin, width, pixels):
+    """Makes the cache key for a slice, any change to the geometry or the slice makes a new key"""
+    geometry_xml = ET.tostring(geometry.to_xml_element())
+    slice_details = repr((basis, tuple(np.round(origin, 6)), tuple(np.round(width, 6)), tuple(pixels)))
+    return hashlib.sha256(geometry_xml + slice_details.encode()).hexdigest()[:16]
+
+
+def find_slice_ids(geometry, basis, origin, width, pixels):
+    """Finds the cell and material id at every pixel of a slice with openmc.lib
+
+    Returns:
+        tuple: the cell ids and material ids as 2D arrays, -1 where there is no cell or material
+    """
+    model = openmc.Model(geometry=geometry, materials=openmc.Materials(geometry.get_all_materials().values()))
+    ids = model.id_map(origin=origin, width=width, pixels=pixels, basis=basis)
+    # the last axis is the cell id, the cell instance and the material id
+    return ids[:, :, 0], ids[:, :, -1]
+
+
+def get_slices(geometry, slices, pixels):
+    """Gets the cell and material ids of several slices, the slices not in the
+    cache are found at the same time in a pool of processes
+
+    Args:
+        geometry (openmc.Geometry): the geometry to slice
+        slices (list): a (basis, origin, width) tuple for each slice
+        pixels (tuple): the number of pixels across and up each slice
+
+    Returns:
+        list: a (cell_ids, material_ids) tuple for each slice
+    """
+    cache_folder.mkdir(exist_ok=True)
+    keys = [get_slice_key(geometry, basis, origin, width, pixels) for basis, origin, width in slices]
+
+    for key in keys:
+        cache_file = cache_folder / f'{key}.npz'
+        if key not in _slices_in_memory and cache_file.exists():
+            with np.load(cache_file) as saved:
+                _slices_in_memory[key] = (saved['cell_ids'], saved['material_ids'])
+
+    missing = {key: details for key, details in zip(keys, slices) if key not in _slices_in_memory}
+    if missing:
+        print(f'finding {len(missing)} geometry slices, {len(slices) - len(missing)} found in the cache')
+        with ProcessPoolExecutor() as executor:
+            futures = {
+                key: executor.submit(find_slice_ids, geometry, basis, origin, width, pixels)
+                for key, (basis, origin, width) in missing.items()
+            }
+            for key, future in futures.items():
+                cell_ids, material_ids = future.result()
+                np.savez_compressed(cache_folder / f'{key}.npz', cell_ids=cell_ids, material_ids=material_ids)
+                _slices_in_memory[key] = (cell_ids, material_ids)
+
+    return [_slices_in_memory[key] for key in keys]
+
+
+# the if __name__ == "__main__" is needed as the slices are found in separate processes
+if __name__ == "__main__":
+
+    my_geometry = make_geometry()
+
+    with openmc.StatePoint(statepoint_filename) as statepoint:
+        my_mesh_tally_result = statepoint.get_tally(name="neutron_dose_on_mesh")
+        mesh = my_mesh_tally_result.find_filter(openmc.MeshFilter).mesh
+
+    # converts from pSv-cm3/source neutron to mSv/second per voxel
+    voxel_volume = np.prod(mesh.width)
+    dose = my_mesh_tally_result.mean.reshape(mesh.dimension, order='F') * neutrons_per_second * pico_to_milli / voxel_volume
+
+    # the slices go through the middle of several mesh voxels along x
+    x_indices = [mesh.dimension[0] // 4, mesh.dimension[0] // 2, 3 * mesh.dimension[0] // 4]
+    x_centres = mesh.lower_left[0] + (np.array(x_indices) + 0.5) * mesh.width[0]
+    slice_width = (mesh.upper_right[1] - mesh.lower_left[1], mesh.upper_right[2] - mesh.lower_left[2])
+    slice_centre = 0.5 * (mesh.lower_left + mesh.upper_right)
+    slices = [
+        ('yz', (x, slice_centre[1], slice_centre[2]), slice_width)
+        for x in x_centres
+    ]
+
+    # the first time this script runs the slices are found, after that they come from the cache
+    geometry_slices = get_slices(my_geometry, slices, pixels)
+
+    extent = (mesh.lower_left[1], mesh.upper_right[1], mesh.lower_left[2], mesh.upper_right[2])
+    fig, axes = plt.subplots(1, len(slices), figsize=(6 * len(slices), 5))
+    for ax, x_index, x, (cell_ids, material_ids) in zip(axes, x_indices, x_centres, geometry_slices):
+        data_slice = dose[x_index].T  # (y, z) to (z, y) so that z is up the plot
+        image = ax.imshow(
+            data_slice,
+            origin="lower",
+            extent=extent,
+            norm=LogNorm(vmin=1e-12, vmax=dose.max()),
+        )
+        # the id map has the first row at the top of the slice
+        levels = np.unique(material_ids)
+        ax.contour(
+            material_ids,
+            origin="upper",
+            colors="k",
+            linestyles="solid",
+            levels=levels,
+            linewidths=2.0,
+            extent=extent,
+        )
+        ax.set_xlabel('y [cm]')
+        ax.set_ylabel('z [cm]')
+        ax.set_title(f'Dose map at x={x:.1f}cm')
+    cbar = fig.colorbar(image, ax=axes)
+    cbar.set_label("Dose [milli Sv per second]")
+    plt.show()
@@ -0,0 +1,187 @@
+# This example depletes a material with a long pulse schedule made of many
+# repeated pulses and reuses the matrix exponential work for repeated steps.
+
+# Each depletion timestep solves a matrix exponential with the CRAM method.
+# With the IndependentOperator the flux and micro xs are fixed, so the
+# depletion matrix mostly depends on the source rate and timesteps with the
+# same (timestep, source rate) pair have almost the same matrix. The matrix is
+# rebuilt every step from reaction rates that are divided by the nuclide
+# densities, so repeated steps differ in the last few bits of each value and
+# reaction rates are zero for nuclides that are not present yet.
+# CRAM works by solving a sparse linear system for each of its poles, and
+# factorising these matrices is the expensive part. Here the factorisations
+# are cached using the matrix values rounded to about 12 significant figures,
+# so repeated pulses reuse the factorisations and only need the cheap
+# triangular solves.
+
+import hashlib
+import math
+import matplotlib.pyplot as plt
+import numpy as np
+import openmc
+import openmc.deplete
+import scipy.sparse as sp
+import scipy.sparse.linalg as sla
+from openmc.deplete.cram import CRAM48
+
+# chain and cross section paths have been set on the docker image but you may want to change them
+# openmc.config['chain_file'] = path to chain file
+# openmc.config['cross_sections'] = path to cross_sections.xml
+
+
+class CachedCRAMSolver:
+    """CRAM48 depletion solver that caches the sparse LU factorisations used
+    for each unique depletion matrix and timestep. This gives the same results
+    as the default openmc.deplete.cram.CRAM48 solver and can be passed to any
+    openmc.deplete integrator with the solver argument.
+
+    Args:
+        max_cache_size (int): the maximum number of unique (matrix, timestep)
+            pairs to keep the factorisations for
+    """
+
+    def __init__(self, max_cache_size=64):
+        self.max_cache_size = max_cache_size
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, A, dt):
+        # the matrix is hashed using its sparse structure and its values
+        # rounded to 40 bits of mantissa (about 12 significant figures), so
+        # matrices that only differ by floating point rounding share the same
+        # factorisations
+        A = sp.csr_matrix(A)
+        A.eliminate_zeros()
+        mantissa, exponent = np.frexp(A.data)
+        hash_of_matrix = hashlib.sha256()
+        hash_of_matrix.update(A.indptr.tobytes())
+        hash_of_matrix.update(A.indices.tobytes())
+        hash_of_matrix.update(np.round(mantissa * 2**40).astype(np.int64).tobytes())
+        hash_of_matrix.update(exponent.tobytes())
+        hash_of_matrix.update(repr(float(dt)).encode())
+        return hash_of_matrix.hexdigest()
+
+    def _factorise(self, A, dt):
+        A = dt * sp.csc_matrix(A, dtype=np.float64)
+        ident = sp.eye(A.shape[0], format='csc')
+        return [sla.splu(sp.csc_matrix(A - theta * ident)) for theta in CRAM48.theta]
+
+    def __call__(self, A, n0, dt):
+        """Solves the depletion equations for one timestep
+
+        Args:
+            A (scipy.sparse.csr_matrix): the depletion matrix
+            n0 (numpy.ndarray): the nuclide concentrations at the start of the step
+            dt (float): the timestep in seconds
+
+        Returns:
+            numpy.ndarray: the nuclide concentrations at the end of the step
+        """
+        key = self._key(A, dt)
+        if key in self.cache:
+            self.hits += 1
+            factorisations = self.cache[key]
+        else:
+            self.misses += 1
+            factorisations = self._factorise(A, dt)
+            if len(self.cache) >= self.max_cache_size:
+                # removes the oldest entry
+                self.cache.pop(next(iter(self.cache)))
+            self.cache[key] = factorisations
+
+        # the incomplete partial fraction form of CRAM, as used by openmc
+        y = np.array(n0, dtype=np.float64)
+        for alpha, lu in zip(CRAM48.alpha, factorisations):
+            y += 2 * np.real(alpha * lu.solve(y.astype(np.complex128)))
+        return y * CRAM48.alpha0
+
+
+# Creates a simple material which we will deplete
+my_material = openmc.Material(material_id=1)
+my_material.add_element('Ag', 1, percent_type='ao')
+my_material.set_density('g/cm3', 10.49)
+
+sphere_radius = 100
+volume_of_sphere = (4/3) * math.pi * math.pow(sphere_radius, 3)
+my_material.volume = volume_of_sphere  # a volume is needed so openmc can find the number of atoms in the cell/material
+my_material.depletable = True  # depletable = True is needed to tell openmc to update the material with each time step
+materials = openmc.Materials([my_material])
+
+sph1 = openmc.Sphere(r=sphere_radius, boundary_type='vacuum')
+shield_cell = openmc.Cell(region=-sph1)
+shield_cell.fill = my_material
+geometry = openmc.Geometry([shield_cell])
+
+source = openmc.IndependentSource()
+source.space = openmc.stats.Point((0, 0, 0))
+source.angle = openmc.stats.Isotropic()
+source.energy = openmc.stats.Discrete([14e6], [1])
+source.particle = 'neutron'
+
+settings = openmc.Settings()
+settings.batches = 10
+settings.inactive = 0
+settings.particles = 1000
+settings.source = source
+settings.run_mode = 'fixed source'
+
+model = openmc.model.Model(geometry, materials, settings)
+
+# this does perform particle transport but just to get the flux and micro xs
+flux_in_each_group, micro_xs = openmc.deplete.get_microxs_and_flux(
+    model=model,
+    domains=[shield_cell],
+    energies=[0, 30e6],  # one energy bin from 0 to 30MeV
+    chain_file=openmc.config['chain_file'],
+)
+
+operator = openmc.deplete.IndependentOperator(
+    materials=materials,
+    fluxes=[i[0] for i in flux_in_each_group],
+    micros=micro_xs,
+    reduce_chain=True,  # reduced to only the isotopes present in depletable materials and their possible progeny
+    reduce_chain_level=5,
+    normalization_mode="source-rate"
+)
+
+# a tokamak like duty cycle of 400 second pulses with 1200 seconds between
+# pulses repeated 1000 times followed by a week of cooling in one day steps
+day_in_seconds = 60 * 60 * 24
+timesteps_and_source_rates = [(400, 1e18), (1200, 0)] * 1000 + [(day_in_seconds, 0)] * 7
+
+unique_steps = set(timesteps_and_source_rates)
+print(f"{len(timesteps_and_source_rates)} timesteps with {len(unique_steps)} unique (timestep, source rate) pairs")
+
+# Uses list Python comprehension to get the timesteps and source_rates separately
+timesteps = [item[0] for item in timesteps_and_source_rates]
+source_rates = [item[1] for item in timesteps_and_source_rates]
+
+cached_solver = CachedCRAMSolver()
+
+# by default openmc sends the depletion of each material to a pool of
+# processes, each process would get its own copy of the solver and the cache
+# would be lost after every timestep so multiprocessing is turned off here
+openmc.deplete.pool.USE_MULTIPROCESSING = False
+
+integrator = openmc.deplete.PredictorIntegrator(
+    operator=operator,
+    timesteps=timesteps,
+    source_rates=source_rates,
+    timestep_units='s',
+    solver=cached_solver,  # replaces the default cram48 solver
+)
+
+integrator.integrate()
+
+print(f"factorisations reused {cached_solver.hits} times and computed {cached_solver.misses} times")
+
+results = openmc.deplete.Results("depletion_results.h5")
+
+times, number_of_Ag110_atoms = results.get_atoms(my_material, 'Ag110')
+
+# plots the number of atoms as a function of time
+plt.plot(times, number_of_Ag110_atoms)
+plt.xlabel('Time [s]')
+plt.ylabel('Number of Ag110 atoms')
+plt.show()
@@ -0,0 +1,182 @@
+# This example runs a study of several irradiation schedules on the same model
+# and only does the neutron transport for the flux and micro xs once.
+
+# openmc.deplete.get_microxs_and_flux performs a transport simulation. When
+# only the irradiation schedule changes the flux and micro xs are the same so
+# the transport can be skipped. Here get_microxs_and_flux is wrapped in a
+# function that saves the results to a cache folder using a hash of the model,
+# the domains, the energy groups and the chain file as the name. Later calls
+# with the same inputs (in this script or in later runs of it) load the saved
+# flux and micro xs instead of running the transport again.
+
+import hashlib
+import math
+import tempfile
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import openmc
+import openmc.deplete
+
+# chain and cross section paths have been set on the docker image but you may want to change them
+# openmc.config['chain_file'] = path to chain file
+# openmc.config['cross_sections'] = path to cross_sections.xml
+
+cache_folder = Path('microxs_and_flux_cache')
+
+
+# the task scripts are standalone, so these three helpers are copied from
+# task_11 7_cached_stages_shut_down_dose_rate_example.py where they are documented
+def fingerprint(*inputs):
+    hash_of_inputs = hashlib.sha256()
+    for item in inputs:
+        if isinstance(item, openmc.Model):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                model_xml = Path(tmp_dir) / 'model.xml'
+                item.export_to_model_xml(model_xml)
+                hash_of_inputs.update(model_xml.read_bytes())
+        elif isinstance(item, Path):
+            hash_of_inputs.update(item.read_bytes())
+        else:
+            hash_of_inputs.update(repr(item).encode())
+    return hash_of_inputs.hexdigest()
+
+
+def stage_is_up_to_date(stage_folder, stage_fingerprint, output_files):
+    fingerprint_file = stage_folder / 'fingerprint.txt'
+    if not fingerprint_file.exists() or fingerprint_file.read_text() != stage_fingerprint:
+        return False
+    return all((stage_folder / filename).exists() for filename in output_files)
+
+
+def save_fingerprint(stage_folder, stage_fingerprint):
+    (stage_folder / 'fingerprint.txt').write_text(stage_fingerprint)
+
+
+def cached_get_microxs_and_flux(model, domains, energies, chain_file):
+    """Cached version of openmc.deplete.get_microxs_and_flux
+
+    Args:
+        model (openmc.Model): the model to run the transport simulation with
+        domains (list): the cells or materials to find the flux and micro xs in
+        energies (list): the energy group boundaries in eV
+        chain_file (str or pathlib.Path): the depletion chain file
+
+    Returns:
+        tuple: the flux in each group for each domain and a list of
+            openmc.deplete.MicroXS, one for each domain
+    """
+    chain_file = Path(chain_file)
+    # the same inputs as the neutron stage of 7_cached_stages_shut_down_dose_rate_example.py
+    neutron_fingerprint = fingerprint(
+        model,
+        [d.id for d in domains],
+        list(energies),
+        chain_file,
+    )
+    neutron_folder = cache_folder / neutron_fingerprint
+    micro_xs_filenames = [f"micro_xs_{d.id}.csv" for d in domains]
+
+    if stage_is_up_to_date(neutron_folder, neutron_fingerprint, micro_xs_filenames + ["flux.npy"]):
+        print(f"reusing saved flux and micro xs from {neutron_folder}")
+        flux_in_each_group = np.load(neutron_folder / "flux.npy")
+        micro_xs = [openmc.deplete.MicroXS.from_csv(neutron_folder / f) for f in micro_xs_filenames]
+        return flux_in_each_group, micro_xs
+
+    print("running neutron transport to get flux and micro xs")
+    neutron_folder.mkdir(parents=True, exist_ok=True)
+    flux_in_each_group, micro_xs = openmc.deplete.get_microxs_and_flux(
+        model=model,
+        domains=domains,
+        energies=energies,
+        chain_file=chain_file,
+    )
+    np.save(neutron_folder / "flux.npy", np.array(flux_in_each_group))
+    for micro_xs_for_domain, filename in zip(micro_xs, micro_xs_filenames):
+        micro_xs_for_domain.to_csv(neutron_folder / filename)
+    # the fingerprint is saved last so a partly written cache entry is never used
+    save_fingerprint(neutron_folder, neutron_fingerprint)
+
+    return flux_in_each_group, micro_xs
+
+
+# Creates a simple material which we will deplete
+my_material = openmc.Material(material_id=1)
+my_material.add_element('Ag', 1, percent_type='ao')
+my_material.set_density('g/cm3', 10.49)
+
+sphere_radius = 100
+volume_of_sphere = (4/3) * math.pi * math.pow(sphere_radius, 3)
+my_material.volume = volume_of_sphere  # a volume is needed so openmc can find the number of atoms in the cell/material
+my_material.depletable = True  # depletable = True is needed to tell openmc to update the material with each time step
+materials = openmc.Materials([my_material])
+
+sph1 = openmc.Sphere(r=sphere_radius, boundary_type='vacuum')
+shield_cell = openmc.Cell(region=-sph1)
+shield_cell.fill = my_material
+geometry = openmc.Geometry([shield_cell])
+
+source = openmc.IndependentSource()
+source.space = openmc.stats.Point((0, 0, 0))
+source.angle = openmc.stats.Isotropic()
+source.energy = openmc.stats.Discrete([14e6], [1])
+source.particle = 'neutron'
+
+settings = openmc.Settings()
+settings.batches = 10
+settings.inactive = 0
+settings.particles = 1000
+settings.source = source
+settings.run_mode = 'fixed source'
+
+model = openmc.model.Model(geometry, materials, settings)
+
+# the same total neutron fluence delivered with different irradiation times
+irradiation_schedules = {
+    '1 day': [(24 * 60 * 60, 1e20)],
+    '10 days': [(24 * 60 * 60, 1e19)] * 10,
+    '100 days': [(24 * 60 * 60, 1e18)] * 100,
+}
+
+for label, timesteps_and_source_rates in irradiation_schedules.items():
+
+    # the transport simulation is only run for the first schedule
+    flux_in_each_group, micro_xs = cached_get_microxs_and_flux(
+        model=model,
+        domains=[shield_cell],
+        energies=[0, 30e6],  # one energy bin from 0 to 30MeV
+        chain_file=openmc.config['chain_file'],
+    )
+
+    operator = openmc.deplete.IndependentOperator(
+        materials=materials,
+        fluxes=[i[0] for i in flux_in_each_group],
+        micros=micro_xs,
+        reduce_chain=True,  # reduced to only the isotopes present in depletable materials and their possible progeny
+        reduce_chain_level=5,
+        normalization_mode="source-rate"
+    )
+
+    timesteps = [item[0] for item in timesteps_and_source_rates]
+    source_rates = [item[1] for item in timesteps_and_source_rates]
+
+    integrator = openmc.deplete.PredictorIntegrator(
+        operator=operator,
+        timesteps=timesteps,
+        source_rates=source_rates,
+        timestep_units='s'
+    )
+
+    results_filename = f"depletion_results_{label.replace(' ', '_')}.h5"
+    integrator.integrate(path=results_filename)
+
+    results = openmc.deplete.Results(results_filename)
+    times, number_of_Ag110_atoms = results.get_atoms(my_material, 'Ag110')
+    plt.plot(times, number_of_Ag110_atoms, label=label)
+
+plt.xlabel('Time [s]')
+plt.ylabel('Number of Ag110 atoms')
+plt.xscale('log')
+plt.legend()
+plt.show()
@@ -0,0 +1,310 @@
+# This script benchmarks the two R2S shut down dose rate methods in this task
+# 1_cell_based_shut_down_dose_rate_example.py uses model.deplete which runs a
+# neutron transport simulation for every timestep (CoupledOperator)
+# 2_faster_mulitiple_puse_shut_down_dose_rate_example.py runs one neutron
+# transport simulation to get the flux and micro xs (IndependentOperator)
+
+# Both methods are run on the same sphere model for several neutron particle
+# counts and pulse schedule lengths. The wall time of each stage (neutron
+# transport, depletion, photon source building, photon transport and post
+# processing), the peak memory use and the particles per second are saved to a
+# JSON file so that the slowest stage can be found and so that changes in
+# performance can be spotted when OpenMC is upgraded. Each case runs in a new
+# spawned process so the peak memory of a case is just for that method, while
+# the memory recorded after each stage is the peak so far in the case.
+
+# model.deplete changes the python material objects to the depleted
+# compositions, so the photon simulations use clones of the materials made
+# before depletion (as 1_cell_based_shut_down_dose_rate_example.py does) and
+# both methods run the same photon problem.
+
+import datetime
+import json
+import math
+import os
+import platform
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from pathlib import Path
+
+import openmc
+import openmc.deplete
+
+# users might want to change these to use specific xml files to use particular decay data or transport cross sections
+# openmc.config['chain_file'] = '/nuclear_data/chain-endf-b8.0.xml'
+# openmc.config['cross_sections'] = 'cross_sections.xml'
+
+# the benchmark cases, every method is run for every combination
+methods = ["cell_based", "faster"]
+neutron_particle_counts = [10_000, 100_000]
+numbers_of_pulses = [1, 4]
+p_particles = 1_000
+neutron_batches = 10
+photon_batches = 100
+benchmark_folder = Path('benchmark_folder')
+output_filename = 'benchmark_results.json'
+
+hour_in_seconds = 60*60
+
+
+def peak_rss_in_mb():
+    """Gets the peak memory use of this process and of the openmc processes it
+    has started. On Linux ru_maxrss is in kilobytes"""
+    self_usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": self_usage / 1024, "openmc_processes": children_usage / 1024}
+
+
+@contextmanager
+def time_stage(stages, name, particles=None):
+    """Records the wall time of a stage of the workflow and the peak memory
+    of the case so far
+
+    Args:
+        stages (dict): the dictionary to add the stage results to
+        name (str): the name of the stage
+        particles (int): the number of particles simulated in the stage, used
+            to find the particles per second
+    """
+    start = time.perf_counter()
+    yield
+    wall_time = time.perf_counter() - start
+    # ru_maxrss only ever goes up, so this is the peak of the case up to the
+    # end of this stage rather than the peak of this stage on its own
+    stages[name] = {"wall_time_s": wall_time, "peak_rss_so_far_mb": peak_rss_in_mb()}
+    if particles is not None:
+        stages[name]["particles_per_second"] = particles / wall_time
+
+
+def make_neutron_model(n_particles):
+    """Makes the sphere model used in the R2S examples"""
+
+    sphere_surf_1 = openmc.Sphere(r=20, boundary_type="vacuum")
+    sphere_surf_2 = openmc.Sphere(r=1, y0=10)
+    sphere_surf_3 = openmc.Sphere(r=5, z0=10)
+
+    sphere_cell_1 = openmc.Cell(region=-sphere_surf_1 & +sphere_surf_2 & +sphere_surf_3)
+    sphere_cell_2 = openmc.Cell(region=-sphere_surf_2)
+    sphere_cell_3 = openmc.Cell(region=-sphere_surf_3)
+
+    mat_iron = openmc.Material(material_id=1)
+    mat_iron.add_element("Fe", 1.0)
+    mat_iron.set_density("g/cm3", 7.7)
+    mat_iron.depletable = True
+    mat_iron.volume = (4 / 3) * math.pi * math.pow(sphere_surf_2.r, 3)
+    sphere_cell_2.fill = mat_iron
+
+    mat_aluminum = openmc.Material(material_id=2)
+    mat_aluminum.add_element("Al", 1.0)
+    mat_aluminum.set_density("g/cm3", 2.7)
+    mat_aluminum.depletable = True
+    mat_aluminum.volume = (4 / 3) * math.pi * math.pow(sphere_surf_3.r, 3)
+    sphere_cell_3.fill = mat_aluminum
+
+    my_geometry = openmc.Geometry([sphere_cell_1, sphere_cell_2, sphere_cell_3])
+    my_materials = openmc.Materials([mat_iron, mat_aluminum])
+
+    my_source = openmc.IndependentSource()
+    my_source.space = openmc.stats.Point((0, 0, 0))
+    my_source.angle = openmc.stats.Isotropic()
+    my_source.energy = openmc.stats.Discrete([14.06e6], [1])
+    my_source.particle = "neutron"
+
+    my_neutron_settings = openmc.Settings()
+    my_neutron_settings.run_mode = "fixed source"
+    my_neutron_settings.particles = n_particles
+    my_neutron_settings.batches = neutron_batches
+    my_neutron_settings.source = my_source
+    my_neutron_settings.photon_transport = False
+
+    return openmc.Model(my_geometry, my_materials, my_neutron_settings)
+
+
+def run_benchmark_case(method, n_particles, n_pulses):
+    """Runs one R2S workflow and times each stage. This is run in a new
+    process for each case so the peak memory use is just for that case.
+
+    Args:
+        method (str): "cell_based" or "faster"
+        n_particles (int): the number of neutron particles per batch
+        n_pulses (int): the number of 1 second pulses, each followed by an hour of cooling
+
+    Returns:
+        dict: the case settings and the results for each stage
+    """
+    case_folder = benchmark_folder / f"{method}_{n_particles}_particles_{n_pulses}_pulses"
+    neutron_folder = case_folder / "neutrons"
+    neutron_folder.mkdir(parents=True, exist_ok=True)
+    depletion_results_filename = neutron_folder / "depletion_results.h5"
+
+    model_neutron = make_neutron_model(n_particles)
+    my_geometry = model_neutron.geometry
+    activated_cells = [c for c in my_geometry.get_all_material_cells().values() if c.fill.depletable]
+
+    timesteps_and_source_rates = [(1, 1e18), (hour_in_seconds, 0)] * n_pulses
+    timesteps = [item[0] for item in timesteps_and_source_rates]
+    source_rates = [item[1] for item in timesteps_and_source_rates]
+
+    # pristine copies of the materials for the photon simulations, the clones
+    # get new ids so the ids are set back to match the geometry
+    photon_materials = []
+    for material in model_neutron.materials:
+        pristine_material = material.clone()
+        pristine_material.id = material.id
+        photon_materials.append(pristine_material)
+    my_materials = openmc.Materials(photon_materials)
+
+    stages = {}
+    start_of_case = time.perf_counter()
+
+    if method == "cell_based":
+        # the coupled operator runs a neutron transport simulation for each
+        # timestep as part of the depletion so these two stages are timed together.
+        # There is one more transport simulation at the end of the last timestep
+        n_transport_runs = len(timesteps) + 1
+        with time_stage(stages, "neutron_transport_and_depletion", particles=n_particles * neutron_batches * n_transport_runs):
+            model_neutron.deplete(
+                timesteps,
+                source_rates=source_rates,
+                directory=neutron_folder,
+                method="predictor",
+                operator_kwargs={
+                    "normalization_mode": "source-rate",
+                    "chain_file": openmc.config['chain_file'],
+                    "reduce_chain_level": 5,
+                    "reduce_chain": True
+                },
+            )
+    else:
+        with time_stage(stages, "neutron_transport", particles=n_particles * neutron_batches):
+            flux_in_each_group, micro_xs = openmc.deplete.get_microxs_and_flux(
+                model=model_neutron,
+                domains=activated_cells,
+                energies=[0, 30e6],
+                chain_file=openmc.config['chain_file'],
+            )
+
+        with time_stage(stages, "depletion"):
+            operator = openmc.deplete.IndependentOperator(
+                materials=openmc.Materials([c.fill for c in activated_cells]),
+                fluxes=[i[0] for i in flux_in_each_group],
+                micros=micro_xs,
+                reduce_chain=True,
+                reduce_chain_level=5,
+                normalization_mode="source-rate"
+            )
+            integrator = openmc.deplete.PredictorIntegrator(
+                operator=operator,
+                timesteps=timesteps,
+                source_rates=source_rates,
+                timestep_units='s'
+            )
+            integrator.integrate(path=depletion_results_filename)
+
+    my_gamma_settings = openmc.Settings()
+    my_gamma_settings.run_mode = "fixed source"
+    my_gamma_settings.batches = photon_batches
+    my_gamma_settings.particles = p_particles
+
+    mesh = openmc.RegularMesh().from_domain(my_geometry, dimension=[10, 10, 10])
+    energies, pSv_cm2 = openmc.data.dose_coefficients(particle="photon", geometry="AP")
+    dose_filter = openmc.EnergyFunctionFilter(energies, pSv_cm2, interpolation="cubic")
+    flux_tally = openmc.Tally(name="photon_dose_on_mesh")
+    flux_tally.filters = [openmc.MeshFilter(mesh), dose_filter, openmc.ParticleFilter(["photon"])]
+    flux_tally.scores = ["flux"]
+    tallies = openmc.Tallies([flux_tally])
+
+    # the photon stages are summed over all the cooling timesteps
+    source_building_time = 0.
+    photon_transport_time = 0.
+    post_processing_time = 0.
+    cooling_steps = range(1, len(timesteps))
+
+    with time_stage(stages, "loading_depletion_results"):
+        results = openmc.deplete.Results(depletion_results_filename)
+
+    for i_cool in cooling_steps:
+        start = time.perf_counter()
+        photon_sources_for_timestep = []
+        for activated_cell in activated_cells:
+            activated_mat = results[i_cool].get_material(str(activated_cell.fill.id))
+            energy = activated_mat.get_decay_photon_energy(clip_tolerance=1e-6, units='Bq')
+            if energy is None or energy.integral() <= 0.:
+                continue
+            photon_sources_for_timestep.append(
+                openmc.IndependentSource(
+                    space=openmc.stats.Box(*activated_cell.bounding_box),
+                    energy=energy,
+                    particle="photon",
+                    strength=energy.integral(),
+                    domains=[activated_cell],
+                )
+            )
+        my_gamma_settings.source = photon_sources_for_timestep
+        source_building_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        model_gamma = openmc.Model(my_geometry, my_materials, my_gamma_settings, tallies)
+        statepoint_filename = model_gamma.run(
+            cwd=case_folder / "photons" / f"photon_at_time_{i_cool}",
+            output=False,
+        )
+        photon_transport_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with openmc.StatePoint(statepoint_filename) as statepoint:
+            photon_tally = statepoint.get_tally(name="photon_dose_on_mesh")
+            # accessing the mean reads the tally results from the file
+            photon_tally.mean
+        post_processing_time += time.perf_counter() - start
+
+    stages["photon_source_building"] = {"wall_time_s": source_building_time}
+    stages["photon_transport"] = {
+        "wall_time_s": photon_transport_time,
+        "particles_per_second": p_particles * photon_batches * len(cooling_steps) / photon_transport_time,
+    }
+    stages["post_processing"] = {"wall_time_s": post_processing_time}
+
+    return {
+        "method": method,
+        "neutron_particles": n_particles,
+        "pulses": n_pulses,
+        "timesteps": len(timesteps),
+        "total_wall_time_s": time.perf_counter() - start_of_case,
+        "peak_rss_mb": peak_rss_in_mb(),
+        "stages": stages,
+    }
+
+
+# the if __name__ == "__main__" is needed as each case is run in a new process
+if __name__ == "__main__":
+
+    benchmark = {
+        "date": datetime.datetime.now().isoformat(),
+        "openmc_version": openmc.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "cases": [],
+    }
+
+    for method in methods:
+        for n_particles in neutron_particle_counts:
+            for n_pulses in numbers_of_pulses:
+                print(f"running {method} with {n_particles} particles and {n_pulses} pulses")
+                # a new spawned process for each case so that memory use does
+                # not carry over, a forked process would start with the peak
+                # memory of this process
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                    case = executor.submit(run_benchmark_case, method, n_particles, n_pulses).result()
+                benchmark["cases"].append(case)
+
+                slowest_stage = max(case["stages"], key=lambda name: case["stages"][name]["wall_time_s"])
+                print(f"took {case['total_wall_time_s']:.1f} seconds, slowest stage was {slowest_stage}")
+
+                # saves after each case so results are kept if a later case fails
+                with open(output_filename, "w") as output_file:
+                    json.dump(benchmark, output_file, indent=2)
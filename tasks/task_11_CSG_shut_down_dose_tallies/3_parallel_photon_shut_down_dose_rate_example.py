@@ -0,0 +1,186 @@
+# This script runs the decay photon part of the R2S shut down dose rate method
+# for all the cooling timesteps at the same time using a pool of processes.
+
+# The photon simulations for each cooling timestep are independent of each
+# other once the depletion_results.h5 file exists. So instead of running them
+# one after another (as in 2_faster_mulitiple_puse_shut_down_dose_rate_example.py)
+# we can run several of them at the same time. The available CPU cores are
+# split between the number of simulations running at once and the number of
+# OpenMP threads used by each simulation.
+
+# This script reuses the neutron model xml files and the depletion results
+# made by 2_faster_mulitiple_puse_shut_down_dose_rate_example.py so that
+# script must be run first.
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import openmc
+import openmc.deplete
+from matplotlib.colors import LogNorm
+
+# users might want to change these to use specific xml files to use particular decay data or transport cross sections
+# openmc.config['chain_file'] = '/nuclear_data/chain-endf-b8.0.xml'
+# openmc.config['cross_sections'] = 'cross_sections.xml'
+
+# a few user settings
+p_particles = 1_000
+statepoints_folder = Path('statepoints_folder')
+neutron_folder = statepoints_folder / "neutrons"
+
+# the maximum number of photon simulations to run at the same time. The cores
+# are shared out between these simulations so each one gets
+# total_cores // max_concurrent_runs OpenMP threads
+max_concurrent_runs = 4
+
+
+def build_photon_model(i_cool):
+    """Makes the decay photon model for a single cooling timestep
+
+    Args:
+        i_cool (int): the index of the timestep in the depletion results
+
+    Returns:
+        openmc.Model: the photon model with a source for each activated cell
+    """
+
+    # the materials and geometry are read from the xml files written by the
+    # neutron simulation so each process has its own copy of the model
+    my_materials = openmc.Materials.from_xml(neutron_folder / "materials.xml")
+    my_geometry = openmc.Geometry.from_xml(neutron_folder / "geometry.xml", materials=my_materials)
+
+    results = openmc.deplete.Results(neutron_folder / "depletion_results.h5")
+
+    activated_cells = [c for c in my_geometry.get_all_material_cells().values() if c.fill.depletable]
+
+    photon_sources_for_timestep = []
+    for activated_cell in activated_cells:
+        # gets the activated material using the material id
+        activated_mat = results[i_cool].get_material(str(activated_cell.fill.id))
+        energy = activated_mat.get_decay_photon_energy(
+            clip_tolerance=1e-6,  # cuts out a small fraction of the very low energy (and hence negligible dose contribution) photons
+            units='Bq',
+        )
+        # materials with no unstable nuclides have no decay photon source
+        if energy is None:
+            continue
+        strength = energy.integral()
+
+        if strength > 0.:
+            source = openmc.IndependentSource(
+                space=openmc.stats.Box(*activated_cell.bounding_box),
+                energy=energy,
+                particle="photon",
+                strength=strength,
+                domains=[activated_cell],
+            )
+            photon_sources_for_timestep.append(source)
+
+    my_gamma_settings = openmc.Settings()
+    my_gamma_settings.run_mode = "fixed source"
+    my_gamma_settings.batches = 100
+    my_gamma_settings.particles = p_particles
+    my_gamma_settings.source = photon_sources_for_timestep
+
+    # creates a regular mesh that surrounds the geometry
+    mesh = openmc.RegularMesh().from_domain(my_geometry, dimension=[10, 10, 10])
+
+    # AP, PA, LLAT, RLAT, ROT, ISO are ICRP incident dose field directions, AP is front facing
+    energies, pSv_cm2 = openmc.data.dose_coefficients(particle="photon", geometry="AP")
+    dose_filter = openmc.EnergyFunctionFilter(
+        energies, pSv_cm2, interpolation="cubic"  # interpolation method recommended by ICRP
+    )
+    particle_filter = openmc.ParticleFilter(["photon"])
+    mesh_filter = openmc.MeshFilter(mesh)
+    flux_tally = openmc.Tally()
+    flux_tally.filters = [mesh_filter, dose_filter, particle_filter]
+    flux_tally.scores = ["flux"]
+    flux_tally.name = "photon_dose_on_mesh"
+
+    tallies = openmc.Tallies([flux_tally])
+
+    return openmc.Model(my_geometry, my_materials, my_gamma_settings, tallies)
+
+
+def run_photon_simulation(i_cool, threads):
+    """Builds and runs the decay photon model for a single cooling timestep.
+    This is called in a separate process for each timestep.
+
+    Args:
+        i_cool (int): the index of the timestep in the depletion results
+        threads (int): the number of OpenMP threads the simulation can use
+
+    Returns:
+        tuple: the timestep index and the path to the statepoint file
+    """
+    model_gamma = build_photon_model(i_cool)
+
+    statepoint_filename = model_gamma.run(
+        cwd=statepoints_folder / "photons" / f"photon_at_time_{i_cool}",
+        threads=threads,
+        output=False,  # stops the terminal output of the runs being mixed together
+    )
+    return i_cool, statepoint_filename
+
+
+# the if __name__ == "__main__" is needed as each process in the pool imports
+# this script and we don't want each process to start its own pool
+if __name__ == "__main__":
+
+    results = openmc.deplete.Results(neutron_folder / "depletion_results.h5")
+
+    # the depletion results contain the initial state plus one state for each
+    # timestep. The range starts at 1 to skip the first step as that is the
+    # state before irradiation and there is no decay gamma source from the
+    # stable material at that time
+    cooling_steps = list(range(1, len(results) - 1))
+
+    # shares the cores out between the simulations, each simulation gets at
+    # least one thread
+    total_cores = os.cpu_count()
+    n_workers = max(1, min(max_concurrent_runs, len(cooling_steps), total_cores))
+    threads_per_run = max(1, total_cores // n_workers)
+    print(f"running {n_workers} photon simulations at once with {threads_per_run} threads each")
+
+    statepoint_filenames = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(run_photon_simulation, i_cool, threads_per_run)
+            for i_cool in cooling_steps
+        ]
+        # as_completed returns the simulations in the order that they finish
+        # so the statepoints are collected as soon as each one is available
+        for future in as_completed(futures):
+            i_cool, statepoint_filename = future.result()
+            print(f"finished photon simulation for timestep {i_cool}")
+            statepoint_filenames[i_cool] = statepoint_filename
+
+    pico_to_micro = 1e-6
+    seconds_to_hours = 60*60
+
+    # You may wish to plot the dose tally on a mesh, this package makes it easy to include the geometry with the mesh tally
+    from openmc_regular_mesh_plotter import plot_mesh_tally
+    for i_cool in cooling_steps:
+        with openmc.StatePoint(statepoint_filenames[i_cool]) as statepoint:
+            photon_tally = statepoint.get_tally(name="photon_dose_on_mesh")
+
+            # the mesh is read from the statepoint so the voxel volume is available
+            mesh = photon_tally.find_filter(openmc.MeshFilter).mesh
+
+            # multiplication by pico_to_micro converts from (pico) pSv/s to (micro) uSv/s
+            # dividing by mesh voxel volume cancels out the cm3 units
+            scaling_factor = (seconds_to_hours * pico_to_micro) / mesh.volumes[0][0][0]
+
+            plot = plot_mesh_tally(
+                tally=photon_tally,
+                basis="xz",
+                value="mean",
+                colorbar_kwargs={
+                    'label': "Decay photon dose [µSv/h]",
+                },
+                norm=LogNorm(),
+                volume_normalization=False,  # this is done in the scaling_factor
+                scaling_factor=scaling_factor,
+            )
+            plot.figure.savefig(f'shut_down_dose_map_timestep_{i_cool}')
@@ -0,0 +1,212 @@
+# This script finds the shut down dose rate using a nuclide superposition
+# method instead of running a photon simulation for every cooling timestep.
+
+# The decay photon dose is linear in the photon source. The photon source of an
+# activated cell is the sum of the decay photon sources of each radionuclide in
+# the cell, and the decay photon source of each radionuclide is just its number
+# of atoms multiplied by a fixed photons per second per atom spectrum.
+# So we can run one photon simulation per radionuclide per activated cell and
+# save the dose on the mesh per atom of that radionuclide as a response matrix.
+# The dose map at any cooling time is then a matrix product of the number of
+# atoms of each radionuclide at that time with the response matrix.
+
+# This changes the number of photon simulations from the number of cooling
+# timesteps to the number of contributing radionuclides. This is worthwhile
+# when there are many cooling times or when different pulse schedules are
+# studied on the same model as the response matrix can be reused.
+
+# This script reuses the neutron model xml files and the depletion results
+# made by 2_faster_mulitiple_puse_shut_down_dose_rate_example.py so that
+# script must be run first.
+
+import hashlib
+import tempfile
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import openmc
+import openmc.deplete
+from matplotlib.colors import LogNorm
+
+# users might want to change these to use specific xml files to use particular decay data or transport cross sections
+# openmc.config['chain_file'] = '/nuclear_data/chain-endf-b8.0.xml'
+# openmc.config['cross_sections'] = 'cross_sections.xml'
+
+# a few user settings
+p_particles = 1_000
+statepoints_folder = Path('statepoints_folder')
+neutron_folder = statepoints_folder / "neutrons"
+response_folder = statepoints_folder / "photon_responses"
+response_matrix_filename = response_folder / "response_matrix.npz"
+
+my_materials = openmc.Materials.from_xml(neutron_folder / "materials.xml")
+my_geometry = openmc.Geometry.from_xml(neutron_folder / "geometry.xml", materials=my_materials)
+
+results = openmc.deplete.Results(neutron_folder / "depletion_results.h5")
+
+activated_cells = [c for c in my_geometry.get_all_material_cells().values() if c.fill.depletable]
+
+# finds the radionuclides that emit decay photons in each activated cell at
+# any of the timesteps. Each (cell, nuclide) pair is one column of the response
+# matrix and needs one photon simulation
+cell_nuclide_pairs = []
+for activated_cell in activated_cells:
+    material_id = str(activated_cell.fill.id)
+    nuclides_in_cell = set()
+    for result in results:
+        activated_mat = result.get_material(material_id)
+        for nuclide, atoms_per_bcm in activated_mat.get_nuclide_atom_densities().items():
+            if atoms_per_bcm > 0. and openmc.data.decay_photon_energy(nuclide) is not None:
+                nuclides_in_cell.add(nuclide)
+    for nuclide in sorted(nuclides_in_cell):
+        cell_nuclide_pairs.append((activated_cell, nuclide))
+
+print(f"{len(cell_nuclide_pairs)} photon simulations needed instead of {len(results) - 2}")
+
+# creates a regular mesh that surrounds the geometry
+mesh = openmc.RegularMesh().from_domain(
+    my_geometry,
+    dimension=[10, 10, 10],  # 10 voxels in each axis direction (x, y, z)
+)
+
+# AP, PA, LLAT, RLAT, ROT, ISO are ICRP incident dose field directions, AP is front facing
+energies, pSv_cm2 = openmc.data.dose_coefficients(particle="photon", geometry="AP")
+dose_filter = openmc.EnergyFunctionFilter(
+    energies, pSv_cm2, interpolation="cubic"  # interpolation method recommended by ICRP
+)
+particle_filter = openmc.ParticleFilter(["photon"])
+mesh_filter = openmc.MeshFilter(mesh)
+flux_tally = openmc.Tally()
+flux_tally.filters = [mesh_filter, dose_filter, particle_filter]
+flux_tally.scores = ["flux"]
+flux_tally.name = "photon_dose_on_mesh"
+
+tallies = openmc.Tallies([flux_tally])
+
+my_gamma_settings = openmc.Settings()
+my_gamma_settings.run_mode = "fixed source"
+my_gamma_settings.batches = 100
+my_gamma_settings.particles = p_particles
+
+# the response matrix has units of pSv-cm3 per second per atom. One row for
+# each (cell, nuclide) pair and one column for each mesh voxel
+pair_labels = [f"{activated_cell.id}_{nuclide}" for activated_cell, nuclide in cell_nuclide_pairs]
+
+# the response matrix only depends on the photon model (geometry, materials,
+# settings and the mesh tally), the decay data and the (cell, nuclide) pairs
+# so it can be reused for other depletion results on the same model. These
+# are all hashed into a key that is saved with the response matrix
+hash_of_inputs = hashlib.sha256()
+with tempfile.TemporaryDirectory() as tmp_dir:
+    model_xml = Path(tmp_dir) / 'model.xml'
+    openmc.Model(my_geometry, my_materials, my_gamma_settings, tallies).export_to_model_xml(model_xml)
+    hash_of_inputs.update(model_xml.read_bytes())
+hash_of_inputs.update(repr(pair_labels).encode())
+# the decay photon spectra come from the chain file
+hash_of_inputs.update(Path(openmc.config['chain_file']).read_bytes())
+response_key = hash_of_inputs.hexdigest()
+
+saved_key = None
+if response_matrix_filename.exists():
+    saved = np.load(response_matrix_filename)
+    saved_key = str(saved["key"]) if "key" in saved else None
+
+if saved_key == response_key:
+    print(f"reusing the response matrix saved in {response_matrix_filename}")
+    response_matrix = saved["mean"]
+    response_matrix_std_dev = saved["std_dev"]
+else:
+    response_matrix = np.zeros((len(cell_nuclide_pairs), mesh.num_mesh_cells))
+    response_matrix_std_dev = np.zeros((len(cell_nuclide_pairs), mesh.num_mesh_cells))
+
+    for i_pair, (activated_cell, nuclide) in enumerate(cell_nuclide_pairs):
+        print(f"running photon simulation for {nuclide} in cell {activated_cell.id}")
+
+        # the decay photon spectra per atom, the integral is photons per second per atom
+        energy = openmc.data.decay_photon_energy(nuclide)
+        photons_per_second_per_atom = energy.integral()
+
+        my_gamma_settings.source = openmc.IndependentSource(
+            space=openmc.stats.Box(*activated_cell.bounding_box),
+            energy=energy,
+            particle="photon",
+            domains=[activated_cell],
+        )
+
+        model_gamma = openmc.Model(my_geometry, my_materials, my_gamma_settings, tallies)
+        statepoint_filename = model_gamma.run(
+            cwd=response_folder / f"cell_{activated_cell.id}_{nuclide}"
+        )
+
+        with openmc.StatePoint(statepoint_filename) as statepoint:
+            photon_tally = statepoint.get_tally(name="photon_dose_on_mesh")
+            # tally.mean is in units of pSv-cm3/source photon so multiplying by
+            # the photons emitted per second per atom gives pSv-cm3/second/atom
+            response_matrix[i_pair] = photon_tally.mean.flatten() * photons_per_second_per_atom
+            response_matrix_std_dev[i_pair] = photon_tally.std_dev.flatten() * photons_per_second_per_atom
+
+    np.savez(
+        response_matrix_filename,
+        mean=response_matrix,
+        std_dev=response_matrix_std_dev,
+        pairs=pair_labels,
+        key=response_key,
+    )
+
+# builds a matrix of the number of atoms of each radionuclide in each cell at
+# each timestep. One row for each timestep and one column for each
+# (cell, nuclide) pair
+atoms_matrix = np.zeros((len(results), len(cell_nuclide_pairs)))
+for i_pair, (activated_cell, nuclide) in enumerate(cell_nuclide_pairs):
+    times, atoms = results.get_atoms(
+        mat=str(activated_cell.fill.id),
+        nuc=nuclide,
+        nuc_units="atoms",
+        time_units="s",
+    )
+    atoms_matrix[:, i_pair] = atoms
+
+# one matrix product gives the dose on the mesh for every timestep, units are
+# pSv-cm3/second. The photon simulations are independent so the variances add
+dose_on_mesh = atoms_matrix @ response_matrix
+dose_on_mesh_std_dev = np.sqrt(np.square(atoms_matrix) @ np.square(response_matrix_std_dev))
+
+pico_to_micro = 1e-6
+seconds_to_hours = 60*60
+
+# multiplication by pico_to_micro converts from (pico) pSv/s to (micro) uSv/s
+# dividing by mesh voxel volume cancels out the cm3 units
+scaling_factor = (seconds_to_hours * pico_to_micro) / mesh.volumes[0][0][0]
+
+dose_on_mesh = dose_on_mesh * scaling_factor
+dose_on_mesh_std_dev = dose_on_mesh_std_dev * scaling_factor
+
+# mesh tally values are ordered with the x index changing fastest
+dose_on_mesh = dose_on_mesh.reshape((len(results),) + tuple(mesh.dimension), order="F")
+dose_on_mesh_std_dev = dose_on_mesh_std_dev.reshape((len(results),) + tuple(mesh.dimension), order="F")
+
+for i_cool in range(1, len(results) - 1):
+    # gets a slice through the middle of the mesh in the xz plane
+    data_slice = dose_on_mesh[i_cool, :, mesh.dimension[1] // 2, :]
+
+    plt.cla()
+    plt.clf()
+    plot = plt.imshow(
+        data_slice.T,
+        origin="lower",
+        extent=(mesh.lower_left[0], mesh.upper_right[0], mesh.lower_left[2], mesh.upper_right[2]),
+        norm=LogNorm(),
+    )
+    cbar = plt.colorbar(plot)
+    cbar.set_label("Decay photon dose [µSv/h]")
+    plt.xlabel("X [cm]")
+    plt.ylabel("Z [cm]")
+    plt.title(f"Shut down dose at {times[i_cool]:.0f} seconds")
+
+    # the largest relative error of the voxels with a dose shows if more photon particles are needed
+    has_dose = dose_on_mesh[i_cool] > 0.
+    if has_dose.any():
+        relative_error = dose_on_mesh_std_dev[i_cool][has_dose] / dose_on_mesh[i_cool][has_dose]
+        print(f"timestep {i_cool} largest relative error in the dose map {relative_error.max():.3f}")
+    plt.savefig(f'superposition_shut_down_dose_map_timestep_{i_cool}')
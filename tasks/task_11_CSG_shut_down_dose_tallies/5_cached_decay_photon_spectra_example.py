@@ -0,0 +1,170 @@
+# This script shows how the decay photon spectra of the activated materials can
+# be cached so that they are only worked out once.
+
+# Making the decay photon source with get_decay_photon_energy combines the
+# decay photon spectra of every nuclide in the material which takes time for
+# materials with many nuclides. The R2S scripts do this for every activated
+# cell at every cooling timestep and again every time the script is rerun.
+
+# Here the spectra are saved to a cache folder with a filename made from a hash
+# of the material nuclides, atom densities, volume, clip tolerance and units.
+# Rerunning this script or running a parameter study on the same depletion
+# results reads the spectra from the cache instead of remaking them. Recently
+# used spectra are also kept in memory so repeated materials are not even read
+# from the disk.
+
+# This script reuses the neutron model xml files and the depletion results
+# made by 2_faster_mulitiple_puse_shut_down_dose_rate_example.py so that
+# script must be run first.
+
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from pathlib import Path
+
+import openmc
+import openmc.deplete
+
+# users might want to change these to use specific xml files to use particular decay data or transport cross sections
+# openmc.config['chain_file'] = '/nuclear_data/chain-endf-b8.0.xml'
+# openmc.config['cross_sections'] = 'cross_sections.xml'
+
+# a few user settings
+p_particles = 1_000
+statepoints_folder = Path('statepoints_folder')
+neutron_folder = statepoints_folder / "neutrons"
+cache_folder = Path('decay_photon_cache')
+
+# the number of spectra kept in memory, the least recently used are removed first
+memory_cache_size = 256
+memory_cache = OrderedDict()
+
+
+def decay_photon_cache_key(material, clip_tolerance, units):
+    """Makes a hash of everything that changes the decay photon spectra of a material
+
+    Args:
+        material (openmc.Material): the activated material
+        clip_tolerance (float): the clip tolerance passed to get_decay_photon_energy
+        units (str): the units passed to get_decay_photon_energy
+
+    Returns:
+        str: the hash to use as the cache key
+    """
+    # the nuclides are sorted so the same inventory always gives the same hash
+    inventory = sorted(material.get_nuclide_atom_densities().items())
+    # the volume is only needed when the units are Bq
+    volume = material.volume if units == 'Bq' else None
+    key_contents = repr((inventory, volume, clip_tolerance, units))
+    return hashlib.sha256(key_contents.encode()).hexdigest()
+
+
+def get_decay_photon_energy(material, clip_tolerance=1e-6, units='Bq'):
+    """Cached version of openmc.Material.get_decay_photon_energy
+
+    Args:
+        material (openmc.Material): the activated material
+        clip_tolerance (float): the fraction of the spectra that can be clipped
+        units (str): the units of the spectra intensity
+
+    Returns:
+        openmc.stats.Univariate or None: the decay photon energy distribution
+    """
+    key = decay_photon_cache_key(material, clip_tolerance, units)
+
+    # checks the memory cache first
+    if key in memory_cache:
+        memory_cache.move_to_end(key)
+        return memory_cache[key]
+
+    # then checks the disk cache, an empty file means the material has no decay photons
+    cache_filename = cache_folder / f"{key}.xml"
+    if cache_filename.exists():
+        if cache_filename.stat().st_size == 0:
+            energy = None
+        else:
+            element = ET.parse(cache_filename).getroot()
+            energy = openmc.stats.Univariate.from_xml_element(element)
+    else:
+        energy = material.get_decay_photon_energy(clip_tolerance=clip_tolerance, units=units)
+
+        # writes to a temporary file first and then renames it so that other
+        # scripts reading the cache at the same time never see a partly written file
+        cache_folder.mkdir(parents=True, exist_ok=True)
+        temporary_filename = cache_folder / f"{key}.{os.getpid()}.tmp"
+        if energy is None:
+            temporary_filename.touch()
+        else:
+            ET.ElementTree(energy.to_xml_element('energy')).write(temporary_filename)
+        os.replace(temporary_filename, cache_filename)
+
+    memory_cache[key] = energy
+    if len(memory_cache) > memory_cache_size:
+        memory_cache.popitem(last=False)
+    return energy
+
+
+my_materials = openmc.Materials.from_xml(neutron_folder / "materials.xml")
+my_geometry = openmc.Geometry.from_xml(neutron_folder / "geometry.xml", materials=my_materials)
+
+results = openmc.deplete.Results(neutron_folder / "depletion_results.h5")
+
+activated_cells = [c for c in my_geometry.get_all_material_cells().values() if c.fill.depletable]
+
+my_gamma_settings = openmc.Settings()
+my_gamma_settings.run_mode = "fixed source"
+my_gamma_settings.batches = 100
+my_gamma_settings.particles = p_particles
+
+# creates a regular mesh that surrounds the geometry
+mesh = openmc.RegularMesh().from_domain(
+    my_geometry,
+    dimension=[10, 10, 10],  # 10 voxels in each axis direction (x, y, z)
+)
+
+# AP, PA, LLAT, RLAT, ROT, ISO are ICRP incident dose field directions, AP is front facing
+energies, pSv_cm2 = openmc.data.dose_coefficients(particle="photon", geometry="AP")
+dose_filter = openmc.EnergyFunctionFilter(
+    energies, pSv_cm2, interpolation="cubic"  # interpolation method recommended by ICRP
+)
+particle_filter = openmc.ParticleFilter(["photon"])
+mesh_filter = openmc.MeshFilter(mesh)
+flux_tally = openmc.Tally()
+flux_tally.filters = [mesh_filter, dose_filter, particle_filter]
+flux_tally.scores = ["flux"]
+flux_tally.name = "photon_dose_on_mesh"
+
+tallies = openmc.Tallies([flux_tally])
+
+# range starts at 1 to skip the first step as that is the state before irradiation
+for i_cool in range(1, len(results) - 1):
+
+    photon_sources_for_timestep = []
+    print(f"making photon source for timestep {i_cool}")
+
+    for activated_cell in activated_cells:
+        activated_mat = results[i_cool].get_material(str(activated_cell.fill.id))
+
+        # the only change from the other R2S scripts is that the cached
+        # function is used instead of activated_mat.get_decay_photon_energy
+        energy = get_decay_photon_energy(activated_mat, clip_tolerance=1e-6, units='Bq')
+        if energy is None:
+            continue
+        strength = energy.integral()
+
+        if strength > 0.:
+            source = openmc.IndependentSource(
+                space=openmc.stats.Box(*activated_cell.bounding_box),
+                energy=energy,
+                particle="photon",
+                strength=strength,
+                domains=[activated_cell],
+            )
+            photon_sources_for_timestep.append(source)
+
+    my_gamma_settings.source = photon_sources_for_timestep
+
+    model_gamma = openmc.Model(my_geometry, my_materials, my_gamma_settings, tallies)
+
+    model_gamma.run(cwd=statepoints_folder / "photons" / f"photon_at_time_{i_cool}")
@@ -0,0 +1,180 @@
+# This script makes the decay photon source for the R2S method on a mesh
+# instead of making one source for each activated cell.
+
+# The other R2S scripts make an IndependentSource for each activated cell with
+# a Box around the cell and rejects the sampled positions that are not in the
+# cell. This wastes samples and does not scale well to thousands of activated
+# cells. Here the volume of each material in each mesh element is found once
+# and the photon source strength of every mesh element is found with a single
+# matrix product. A single MeshSource is then made for the photon simulation.
+
+# Mesh elements that contain the same mix of materials have the same decay
+# photon spectra, so each unique spectrum is only worked out once in python.
+# A source is still made for every mesh element and the settings.xml holds
+# the full spectrum of every element, so the file size and the time to make
+# the sources go up with the number of elements times the length of the
+# spectra. For very large meshes the settings.xml can be written from a
+# template for each spectrum, see task_04 8_vectorised_mesh_source.py.
+
+# This script reuses the neutron model xml files and the depletion results
+# made by 2_faster_mulitiple_puse_shut_down_dose_rate_example.py so that
+# script must be run first.
+
+from pathlib import Path
+
+import numpy as np
+import openmc
+import openmc.deplete
+
+# users might want to change these to use specific xml files to use particular decay data or transport cross sections
+# openmc.config['chain_file'] = '/nuclear_data/chain-endf-b8.0.xml'
+# openmc.config['cross_sections'] = 'cross_sections.xml'
+
+# a few user settings
+p_particles = 1_000
+statepoints_folder = Path('statepoints_folder')
+neutron_folder = statepoints_folder / "neutrons"
+
+
+def make_mesh_photon_source(result, activated_materials, material_volumes, mesh):
+    """Makes a decay photon MeshSource from a depletion result
+
+    Args:
+        result (openmc.deplete.StepResult): the depletion result for one timestep
+        activated_materials (list): the depletable openmc.Material objects
+        material_volumes (numpy.ndarray): the volume in cm3 of each material
+            (columns) in each mesh element (rows)
+        mesh (openmc.RegularMesh or openmc.CylindricalMesh): the source mesh
+
+    Returns:
+        openmc.MeshSource: the photon source with one source per mesh element
+    """
+
+    # gets the decay photon spectra per cm3 of each activated material
+    spectra_per_cm3 = []
+    strength_per_cm3 = np.zeros(len(activated_materials))
+    for i_mat, material in enumerate(activated_materials):
+        activated_mat = result.get_material(str(material.id))
+        energy = activated_mat.get_decay_photon_energy(clip_tolerance=1e-6, units='Bq/cm3')
+        spectra_per_cm3.append(energy)
+        if energy is not None:
+            strength_per_cm3[i_mat] = energy.integral()
+
+    # the total photons per second for each mesh element in one matrix product
+    element_strengths = material_volumes @ strength_per_cm3
+
+    # the spectra are in Bq/cm3 so the spectrum of a mesh element is the sum
+    # of the spectra weighted by the volume of each material in the element.
+    # Elements with the same volume fractions have spectra with the same
+    # shape so only the unique rows need an energy distribution making
+    activated_volumes = material_volumes.sum(axis=1)
+    has_volume = activated_volumes > 0.
+    volume_fractions = np.zeros_like(material_volumes)
+    volume_fractions[has_volume] = material_volumes[has_volume] / activated_volumes[has_volume, np.newaxis]
+    # rounding avoids making extra spectra due to tiny floating point differences
+    unique_fractions, element_to_spectra = np.unique(
+        np.round(volume_fractions, decimals=6), axis=0, return_inverse=True
+    )
+    element_to_spectra = element_to_spectra.flatten()
+
+    unique_spectra = []
+    unique_domains = []
+    for material_fractions in unique_fractions:
+        in_mix = [
+            i for i in np.flatnonzero(material_fractions > 0.)
+            if spectra_per_cm3[i] is not None
+        ]
+        if not in_mix:
+            # elements with no activated material have a strength of 0 so
+            # their source is never sampled and does not need a spectra
+            unique_spectra.append(None)
+            unique_domains.append(None)
+            continue
+        energy = openmc.stats.combine_distributions(
+            [spectra_per_cm3[i] for i in in_mix],
+            [material_fractions[i] for i in in_mix],
+        )
+        unique_spectra.append(energy)
+        # photons are only born in the activated materials in the element,
+        # not in the void or other materials that share the element
+        unique_domains.append([activated_materials[i] for i in in_mix])
+
+    print(f"{len(unique_spectra)} unique photon spectra for {mesh.num_mesh_cells} mesh elements")
+
+    # each mesh element gets its own source with its own strength, the
+    # energy distribution is reused in python but is written out in full for
+    # every element in the settings.xml
+    sources = []
+    for element_strength, i_spectra in zip(element_strengths, element_to_spectra):
+        source = openmc.IndependentSource(
+            energy=unique_spectra[i_spectra],
+            particle="photon",
+            strength=element_strength,
+        )
+        if unique_domains[i_spectra] is not None:
+            source.constraints = {'domains': unique_domains[i_spectra]}
+        sources.append(source)
+
+    # the sources are listed in the same order as the mesh elements, with the
+    # x index changing fastest, and the MeshSource needs them in the mesh shape
+    return openmc.MeshSource(mesh=mesh, sources=np.array(sources).reshape(mesh.dimension, order='F'))
+
+
+my_materials = openmc.Materials.from_xml(neutron_folder / "materials.xml")
+my_geometry = openmc.Geometry.from_xml(neutron_folder / "geometry.xml", materials=my_materials)
+
+activated_materials = [m for m in my_materials if m.depletable]
+
+# the source mesh could be a RegularMesh or a CylindricalMesh
+source_mesh = openmc.RegularMesh().from_domain(my_geometry, dimension=[20, 20, 20])
+# source_mesh = openmc.CylindricalMesh.from_domain(my_geometry, dimension=[20, 20, 20])
+
+# settings for the photon simulation(s)
+my_gamma_settings = openmc.Settings()
+my_gamma_settings.run_mode = "fixed source"
+my_gamma_settings.batches = 100
+my_gamma_settings.particles = p_particles
+
+model_gamma = openmc.Model(my_geometry, my_materials, my_gamma_settings)
+
+# finds the volume of each material in each mesh element by ray tracing. This
+# is only done once as the geometry does not change between timesteps
+mesh_material_volumes = source_mesh.material_volumes(model_gamma, n_samples=1_000_000)
+material_volumes = np.column_stack(
+    [mesh_material_volumes[material.id] for material in activated_materials]
+)
+
+# creates a regular mesh that surrounds the geometry for the dose tally
+mesh = openmc.RegularMesh().from_domain(
+    my_geometry,
+    dimension=[10, 10, 10],  # 10 voxels in each axis direction (x, y, z)
+)
+
+# AP, PA, LLAT, RLAT, ROT, ISO are ICRP incident dose field directions, AP is front facing
+energies, pSv_cm2 = openmc.data.dose_coefficients(particle="photon", geometry="AP")
+dose_filter = openmc.EnergyFunctionFilter(
+    energies, pSv_cm2, interpolation="cubic"  # interpolation method recommended by ICRP
+)
+particle_filter = openmc.ParticleFilter(["photon"])
+mesh_filter = openmc.MeshFilter(mesh)
+flux_tally = openmc.Tally()
+flux_tally.filters = [mesh_filter, dose_filter, particle_filter]
+flux_tally.scores = ["flux"]
+flux_tally.name = "photon_dose_on_mesh"
+
+model_gamma.tallies = openmc.Tallies([flux_tally])
+
+results = openmc.deplete.Results(neutron_folder / "depletion_results.h5")
+
+# range starts at 1 to skip the first step as that is the state before irradiation
+for i_cool in range(1, len(results) - 1):
+    print(f"making photon mesh source for timestep {i_cool}")
+
+    model_gamma.settings.source = make_mesh_photon_source(
+        result=results[i_cool],
+        activated_materials=activated_materials,
+        material_volumes=material_volumes,
+        mesh=source_mesh,
+    )
+
+    model_gamma.run(cwd=statepoints_folder / "photons_mesh_source" / f"photon_at_time_{i_cool}")
@@ -0,0 +1,289 @@
+# This script simulates R2S method of shut down dose rate on the same simple
+# sphere model as 2_faster_mulitiple_puse_shut_down_dose_rate_example.py but
+# only reruns the stages of the workflow that have changed.
+
+# The workflow has three stages
+# 1. neutron transport to get the flux and micro cross sections
+# 2. depletion to get the activated materials at each timestep
+# 3. photon transport for each cooling timestep
+# Each stage makes a fingerprint (a hash) of its inputs and the fingerprint of
+# the stage before it. The fingerprint is saved next to the stage outputs and
+# if the script is run again with the same fingerprint the saved outputs are
+# used instead of rerunning the stage.
+
+# For example changing the photon mesh resolution only reruns the photon
+# simulations while changing the pulse schedule reruns the depletion and
+# photon simulations but not the neutron transport.
+
+import hashlib
+import math
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import openmc
+import openmc.deplete
+
+# users might want to change these to use specific xml files to use particular decay data or transport cross sections
+# openmc.config['chain_file'] = '/nuclear_data/chain-endf-b8.0.xml'
+# openmc.config['cross_sections'] = 'cross_sections.xml'
+
+# a few user settings
+n_particles = 1_00000
+p_particles = 1_000
+statepoints_folder = Path('statepoints_folder_cached_stages')
+
+
+def fingerprint(*inputs):
+    """Makes a hash of the stage inputs. Models are hashed using their xml and
+    files are hashed using their contents so any change to them is noticed.
+
+    Args:
+        inputs: openmc.Model, pathlib.Path or any object with a stable repr
+
+    Returns:
+        str: the hash of all the inputs
+    """
+    hash_of_inputs = hashlib.sha256()
+    for item in inputs:
+        if isinstance(item, openmc.Model):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                model_xml = Path(tmp_dir) / 'model.xml'
+                item.export_to_model_xml(model_xml)
+                hash_of_inputs.update(model_xml.read_bytes())
+        elif isinstance(item, Path):
+            hash_of_inputs.update(item.read_bytes())
+        else:
+            hash_of_inputs.update(repr(item).encode())
+    return hash_of_inputs.hexdigest()
+
+
+def stage_is_up_to_date(stage_folder, stage_fingerprint, output_files):
+    """Checks if a stage has already been run with the same inputs
+
+    Args:
+        stage_folder (pathlib.Path): the folder containing the stage outputs
+        stage_fingerprint (str): the fingerprint of the stage inputs
+        output_files (list): the filenames the stage makes
+
+    Returns:
+        bool: True if the saved outputs can be reused
+    """
+    fingerprint_file = stage_folder / 'fingerprint.txt'
+    if not fingerprint_file.exists():
+        return False
+    if fingerprint_file.read_text() != stage_fingerprint:
+        return False
+    return all((stage_folder / filename).exists() for filename in output_files)
+
+
+def save_fingerprint(stage_folder, stage_fingerprint):
+    """Records the fingerprint once the stage has finished so that a stage
+    that failed part of the way through is rerun next time"""
+    (stage_folder / 'fingerprint.txt').write_text(stage_fingerprint)
+
+
+# First we make a simple geometry with three cells, (two with material)
+sphere_surf_1 = openmc.Sphere(r=20, boundary_type="vacuum")
+sphere_surf_2 = openmc.Sphere(r=1, y0=10)
+sphere_surf_3 = openmc.Sphere(r=5, z0=10)
+
+sphere_region_1 = -sphere_surf_1 & +sphere_surf_2 & +sphere_surf_3  # void space
+sphere_region_2 = -sphere_surf_2
+sphere_region_3 = -sphere_surf_3
+
+sphere_cell_1 = openmc.Cell(region=sphere_region_1)
+sphere_cell_2 = openmc.Cell(region=sphere_region_2)
+sphere_cell_3 = openmc.Cell(region=sphere_region_3)
+
+# We make a iron material which should produce a few activation products
+mat_iron = openmc.Material()
+mat_iron.id = 1
+mat_iron.add_element("Fe", 1.0)
+mat_iron.set_density("g/cm3", 7.7)
+# must set the depletion to True to deplete the material
+mat_iron.depletable = True
+# volume must set the volume as well as openmc calculates number of atoms
+mat_iron.volume = (4 / 3) * math.pi * math.pow(sphere_surf_2.r, 3)
+sphere_cell_2.fill = mat_iron
+
+# We make a Al material which should produce a few different activation products
+mat_aluminum = openmc.Material()
+mat_aluminum.id = 2
+mat_aluminum.add_element("Al", 1.0)
+mat_aluminum.set_density("g/cm3", 2.7)
+# must set the depletion to True to deplete the material
+mat_aluminum.depletable = True
+# volume must set the volume as well as openmc calculates number of atoms
+mat_aluminum.volume = (4 / 3) * math.pi * math.pow(sphere_surf_3.r, 3)
+sphere_cell_3.fill = mat_aluminum
+
+my_geometry = openmc.Geometry([sphere_cell_1, sphere_cell_2, sphere_cell_3])
+
+my_materials = openmc.Materials([mat_iron, mat_aluminum])
+
+all_depletable_cells = [c for c in my_geometry.get_all_material_cells().values() if c.fill.depletable]
+all_depletable_materials = [c.fill for c in all_depletable_cells]
+
+# 14MeV neutron source that activates material
+my_source = openmc.IndependentSource()
+my_source.space = openmc.stats.Point((0, 0, 0))
+my_source.angle = openmc.stats.Isotropic()
+my_source.energy = openmc.stats.Discrete([14.06e6], [1])
+my_source.particle = "neutron"
+
+# settings for the neutron simulation(s)
+my_neutron_settings = openmc.Settings()
+my_neutron_settings.run_mode = "fixed source"
+my_neutron_settings.particles = n_particles
+my_neutron_settings.batches = 10
+my_neutron_settings.source = my_source
+my_neutron_settings.photon_transport = False
+
+model_neutron = openmc.Model(my_geometry, my_materials, my_neutron_settings)
+
+hour_in_seconds = 60*60
+
+# This section defines the neutron pulse schedule.
+timesteps_and_source_rates = [
+    (1, 1e18),  # 1 second
+    (hour_in_seconds, 0),  # 1 hour
+    (1, 1e18),  # 1 second
+    (hour_in_seconds, 0),  # 2 hour
+    (1, 1e18),  # 1 second
+    (hour_in_seconds, 0),  # 3 hour
+]
+
+timesteps = [item[0] for item in timesteps_and_source_rates]
+source_rates = [item[1] for item in timesteps_and_source_rates]
+
+chain_file = Path(openmc.config['chain_file'])
+energy_groups = [0, 30e6]  # one energy bin from 0 to 30MeV
+
+# STAGE 1 neutron transport to get the flux and micro xs
+neutron_folder = statepoints_folder / "neutrons"
+neutron_fingerprint = fingerprint(
+    model_neutron,
+    [c.id for c in all_depletable_cells],
+    energy_groups,
+    chain_file,
+)
+micro_xs_filenames = [f"micro_xs_{c.id}.csv" for c in all_depletable_cells]
+
+if stage_is_up_to_date(neutron_folder, neutron_fingerprint, micro_xs_filenames + ["flux.npy"]):
+    print("reusing saved flux and micro xs")
+    flux_in_each_group = np.load(neutron_folder / "flux.npy")
+    micro_xs = [openmc.deplete.MicroXS.from_csv(neutron_folder / f) for f in micro_xs_filenames]
+else:
+    print("running neutron transport to get flux and micro xs")
+    neutron_folder.mkdir(parents=True, exist_ok=True)
+    flux_in_each_group, micro_xs = openmc.deplete.get_microxs_and_flux(
+        model=model_neutron,
+        domains=all_depletable_cells,
+        energies=energy_groups,
+        chain_file=chain_file,
+    )
+    np.save(neutron_folder / "flux.npy", np.array(flux_in_each_group))
+    for micro_xs_for_cell, filename in zip(micro_xs, micro_xs_filenames):
+        micro_xs_for_cell.to_csv(neutron_folder / filename)
+    save_fingerprint(neutron_folder, neutron_fingerprint)
+
+# STAGE 2 depletion, this depends on the neutron stage and the pulse schedule
+depletion_folder = statepoints_folder / "depletion"
+depletion_fingerprint = fingerprint(neutron_fingerprint, timesteps, source_rates)
+
+if stage_is_up_to_date(depletion_folder, depletion_fingerprint, ["depletion_results.h5"]):
+    print("reusing saved depletion results")
+else:
+    print("running depletion")
+    depletion_folder.mkdir(parents=True, exist_ok=True)
+    operator = openmc.deplete.IndependentOperator(
+        materials=openmc.Materials(all_depletable_materials),
+        fluxes=[i[0] for i in flux_in_each_group],
+        micros=micro_xs,
+        chain_file=chain_file,
+        reduce_chain=True,  # reduced to only the isotopes present in depletable materials and their possible progeny
+        reduce_chain_level=5,
+        normalization_mode="source-rate"
+    )
+
+    integrator = openmc.deplete.PredictorIntegrator(
+        operator=operator,
+        timesteps=timesteps,
+        source_rates=source_rates,
+        timestep_units='s'
+    )
+    integrator.integrate(path=depletion_folder / "depletion_results.h5")
+    save_fingerprint(depletion_folder, depletion_fingerprint)
+
+results = openmc.deplete.Results(depletion_folder / "depletion_results.h5")
+
+# STAGE 3 photon transport, this depends on the depletion stage and the photon model
+my_gamma_settings = openmc.Settings()
+my_gamma_settings.run_mode = "fixed source"
+my_gamma_settings.batches = 100
+my_gamma_settings.particles = p_particles
+
+# creates a regular mesh that surrounds the geometry
+mesh = openmc.RegularMesh().from_domain(
+    my_geometry,
+    dimension=[10, 10, 10],  # 10 voxels in each axis direction (x, y, z)
+)
+
+# AP, PA, LLAT, RLAT, ROT, ISO are ICRP incident dose field directions, AP is front facing
+energies, pSv_cm2 = openmc.data.dose_coefficients(particle="photon", geometry="AP")
+dose_filter = openmc.EnergyFunctionFilter(
+    energies, pSv_cm2, interpolation="cubic"  # interpolation method recommended by ICRP
+)
+particle_filter = openmc.ParticleFilter(["photon"])
+mesh_filter = openmc.MeshFilter(mesh)
+flux_tally = openmc.Tally()
+flux_tally.filters = [mesh_filter, dose_filter, particle_filter]
+flux_tally.scores = ["flux"]
+flux_tally.name = "photon_dose_on_mesh"
+
+tallies = openmc.Tallies([flux_tally])
+
+model_gamma = openmc.Model(my_geometry, my_materials, my_gamma_settings, tallies)
+
+statepoint_filename = f"statepoint.{my_gamma_settings.batches}.h5"
+
+# range starts at 1 to skip the first step as that is the state before irradiation
+for i_cool in range(1, len(timesteps)):
+
+    # the photon source is made from the depletion results so it is covered by
+    # the depletion fingerprint and is added after the photon model is hashed
+    photon_folder = statepoints_folder / "photons" / f"photon_at_time_{i_cool}"
+    model_gamma.settings.source = []
+    photon_fingerprint = fingerprint(depletion_fingerprint, i_cool, model_gamma)
+
+    if stage_is_up_to_date(photon_folder, photon_fingerprint, [statepoint_filename]):
+        print(f"reusing saved photon simulation for timestep {i_cool}")
+        continue
+
+    photon_sources_for_timestep = []
+    for activated_cell in all_depletable_cells:
+        activated_mat = results[i_cool].get_material(str(activated_cell.fill.id))
+        energy = activated_mat.get_decay_photon_energy(
+            clip_tolerance=1e-6,  # cuts out a small fraction of the very low energy (and hence negligible dose contribution) photons
+            units='Bq',
+        )
+        if energy is None:
+            continue
+        strength = energy.integral()
+
+        if strength > 0.:
+            source = openmc.IndependentSource(
+                space=openmc.stats.Box(*activated_cell.bounding_box),
+                energy=energy,
+                particle="photon",
+                strength=strength,
+                domains=[activated_cell],
+            )
+            photon_sources_for_timestep.append(source)
+
+    model_gamma.settings.source = photon_sources_for_timestep
+
+    print(f"running photon simulation for timestep {i_cool}")
+    model_gamma.run(cwd=photon_folder)
+    save_fingerprint(photon_folder, photon_fingerprint)
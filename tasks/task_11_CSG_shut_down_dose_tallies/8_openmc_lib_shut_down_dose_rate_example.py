@@ -0,0 +1,184 @@
+# This script runs the decay photon part of the R2S shut down dose rate method
+# for every cooling timestep inside a single openmc.lib session so that the
+# photon cross sections are only loaded once.
+
+# Running model_gamma.run() for each cooling timestep starts a new openmc
+# process which loads the photon data each time. The openmc.lib module (see
+# task_05 3_example_tritium_production_study_with_openmc_lib.py) lets us load
+# the data once and run many simulations. However the source can't be changed
+# in a live openmc.lib session, only materials, cells and tallies can.
+
+# So instead of changing the source, the sources of every cooling timestep are
+# added to the photon model at once and each timestep's sources are given a
+# different birth time. Decay photons cross this model in nanoseconds so a
+# TimeFilter with one bin around each birth time splits the dose tally into the
+# contribution from each cooling timestep. The mesh tally results are then read
+# straight from memory and a statepoint file is only written if requested.
+
+# This script reuses the neutron model xml files and the depletion results
+# made by 2_faster_mulitiple_puse_shut_down_dose_rate_example.py so that
+# script must be run first.
+
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import openmc
+import openmc.deplete
+import openmc.lib
+from matplotlib.colors import LogNorm
+
+# users might want to change these to use specific xml files to use particular decay data or transport cross sections
+# openmc.config['chain_file'] = '/nuclear_data/chain-endf-b8.0.xml'
+# openmc.config['cross_sections'] = 'cross_sections.xml'
+
+# a few user settings
+p_particles = 1_000  # particles per batch for each cooling timestep
+statepoints_folder = Path('statepoints_folder')
+neutron_folder = statepoints_folder / "neutrons"
+photon_folder = statepoints_folder / "photons_openmc_lib"
+write_statepoint = False  # set to True to also save the tally results to a statepoint file
+
+my_materials = openmc.Materials.from_xml(neutron_folder / "materials.xml")
+my_geometry = openmc.Geometry.from_xml(neutron_folder / "geometry.xml", materials=my_materials)
+
+results = openmc.deplete.Results(neutron_folder / "depletion_results.h5")
+
+activated_cells = [c for c in my_geometry.get_all_material_cells().values() if c.fill.depletable]
+
+# range starts at 1 to skip the first step as that is the state before irradiation
+cooling_steps = list(range(1, len(results) - 1))
+
+# the birth time of the photons from each cooling timestep. These are just
+# labels so they only need to be much further apart than the time it takes a
+# photon to leave the model
+time_label_spacing = 1.  # seconds
+
+all_photon_sources = []
+source_strength_of_each_step = np.zeros(len(cooling_steps))
+for i_step, i_cool in enumerate(cooling_steps):
+
+    photon_sources_for_timestep = []
+    for activated_cell in activated_cells:
+        activated_mat = results[i_cool].get_material(str(activated_cell.fill.id))
+        energy = activated_mat.get_decay_photon_energy(
+            clip_tolerance=1e-6,  # cuts out a small fraction of the very low energy (and hence negligible dose contribution) photons
+            units='Bq',
+        )
+        if energy is None:
+            continue
+        strength = energy.integral()
+
+        if strength > 0.:
+            source = openmc.IndependentSource(
+                space=openmc.stats.Box(*activated_cell.bounding_box),
+                energy=energy,
+                time=openmc.stats.Discrete([i_step * time_label_spacing], [1.]),
+                particle="photon",
+                strength=strength,
+                domains=[activated_cell],
+            )
+            photon_sources_for_timestep.append(source)
+
+    # the strengths are normalised so that every cooling timestep gets the
+    # same number of photons, otherwise the weaker late timesteps would have
+    # very few particles. The true strength is used to scale the tally later
+    step_strength = sum(source.strength for source in photon_sources_for_timestep)
+    source_strength_of_each_step[i_step] = step_strength
+    for source in photon_sources_for_timestep:
+        source.strength = source.strength / step_strength
+    if step_strength == 0.:
+        print(f"no decay photons at timestep {i_cool}")
+    all_photon_sources += photon_sources_for_timestep
+
+my_gamma_settings = openmc.Settings()
+my_gamma_settings.run_mode = "fixed source"
+my_gamma_settings.batches = 100
+my_gamma_settings.particles = p_particles * len(cooling_steps)
+my_gamma_settings.source = all_photon_sources
+# no statepoint or summary file is written by the run, the results are read
+# from memory and the statepoint is only written below if it is requested
+my_gamma_settings.statepoint = {'batches': []}
+my_gamma_settings.output = {'summary': False, 'tallies': False}
+
+# creates a regular mesh that surrounds the geometry
+mesh = openmc.RegularMesh().from_domain(
+    my_geometry,
+    dimension=[10, 10, 10],  # 10 voxels in each axis direction (x, y, z)
+)
+
+# one time bin around the birth time of each cooling timestep's photons
+time_bin_edges = (np.arange(len(cooling_steps) + 1) - 0.5) * time_label_spacing
+time_filter = openmc.TimeFilter(time_bin_edges)
+
+# AP, PA, LLAT, RLAT, ROT, ISO are ICRP incident dose field directions, AP is front facing
+energies, pSv_cm2 = openmc.data.dose_coefficients(particle="photon", geometry="AP")
+dose_filter = openmc.EnergyFunctionFilter(
+    energies, pSv_cm2, interpolation="cubic"  # interpolation method recommended by ICRP
+)
+particle_filter = openmc.ParticleFilter(["photon"])
+mesh_filter = openmc.MeshFilter(mesh)
+flux_tally = openmc.Tally(tally_id=1)
+# the time filter is first so the results can be reshaped to (timestep, voxel)
+flux_tally.filters = [time_filter, mesh_filter, dose_filter, particle_filter]
+flux_tally.scores = ["flux"]
+flux_tally.name = "photon_dose_on_mesh"
+
+tallies = openmc.Tallies([flux_tally])
+
+model_gamma = openmc.Model(my_geometry, my_materials, my_gamma_settings, tallies)
+photon_folder.mkdir(parents=True, exist_ok=True)
+model_gamma.export_to_model_xml(photon_folder / "model.xml")
+
+# the path argument tells openmc where to find the model.xml file. The photon
+# data is loaded here, once for all the cooling timesteps
+openmc.lib.init(args=[str(photon_folder)])
+openmc.lib.run()
+
+# gets the tally results straight from memory instead of reading a statepoint file
+lib_tally = openmc.lib.tallies[flux_tally.id]
+dose_mean = lib_tally.mean.reshape(len(cooling_steps), mesh.num_mesh_cells)
+dose_std_dev = lib_tally.std_dev.reshape(len(cooling_steps), mesh.num_mesh_cells)
+
+if write_statepoint:
+    openmc.lib.statepoint_write(filename=str(photon_folder / "statepoint_all_timesteps.h5"))
+
+# close down openmc lib interface
+openmc.lib.finalize()
+
+# tally.mean is in units of pSv-cm3/source photon. Each timestep with decay
+# photons has an equal share of the source photons so multiplying by the number
+# of these timesteps and the timestep's true source strength gives pSv-cm3/second
+n_steps_with_photons = np.count_nonzero(source_strength_of_each_step)
+dose_mean = dose_mean * n_steps_with_photons * source_strength_of_each_step[:, np.newaxis]
+dose_std_dev = dose_std_dev * n_steps_with_photons * source_strength_of_each_step[:, np.newaxis]
+
+pico_to_micro = 1e-6
+seconds_to_hours = 60*60
+
+# multiplication by pico_to_micro converts from (pico) pSv/s to (micro) uSv/s
+# dividing by mesh voxel volume cancels out the cm3 units
+scaling_factor = (seconds_to_hours * pico_to_micro) / mesh.volumes[0][0][0]
+dose_mean = dose_mean * scaling_factor
+dose_std_dev = dose_std_dev * scaling_factor
+
+# mesh tally values are ordered with the x index changing fastest
+dose_mean = dose_mean.reshape((len(cooling_steps),) + tuple(mesh.dimension), order="F")
+
+for i_step, i_cool in enumerate(cooling_steps):
+    # gets a slice through the middle of the mesh in the xz plane
+    data_slice = dose_mean[i_step, :, mesh.dimension[1] // 2, :]
+
+    plt.cla()
+    plt.clf()
+    plot = plt.imshow(
+        data_slice.T,
+        origin="lower",
+        extent=(mesh.lower_left[0], mesh.upper_right[0], mesh.lower_left[2], mesh.upper_right[2]),
+        norm=LogNorm(),
+    )
+    cbar = plt.colorbar(plot)
+    cbar.set_label("Decay photon dose [µSv/h]")
+    plt.xlabel("X [cm]")
+    plt.ylabel("Z [cm]")
+    plt.savefig(f'openmc_lib_shut_down_dose_map_timestep_{i_cool}')
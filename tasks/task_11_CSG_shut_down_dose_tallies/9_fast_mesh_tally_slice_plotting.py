@@ -0,0 +1,162 @@
+# This script plots a slice of the shut down dose mesh tally for every cooling
+# timestep without loading the whole statepoint file.
+
+# openmc.StatePoint reads the summary of every tally, filter and mesh in the
+# file and get_tally reads all the tally results, even when we only want to
+# plot a single slice. For large meshes (for example 200 x 200 x 200 voxels)
+# this takes seconds and gigabytes of memory for each statepoint.
+
+# Here the statepoint HDF5 file is opened directly with h5py and only the
+# values for the slice being plotted are read from the tally results dataset.
+# The plots for each timestep are independent so they are made at the same
+# time using a pool of processes.
+
+# This script plots the statepoints made by
+# 2_faster_mulitiple_puse_shut_down_dose_rate_example.py so that script must be
+# run first.
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+# a few user settings
+statepoints_folder = Path('statepoints_folder')
+statepoint_name = 'statepoint.100.h5'
+
+pico_to_micro = 1e-6
+seconds_to_hours = 60*60
+
+
+def get_tally_group(statepoint_file, tally_name):
+    """Finds the HDF5 group of a tally using the tally name
+
+    Args:
+        statepoint_file (h5py.File): the open statepoint file
+        tally_name (str): the name of the tally
+
+    Returns:
+        h5py.Group: the group containing the tally results
+    """
+    for tally_id in statepoint_file['tallies'].attrs['ids']:
+        group = statepoint_file[f'tallies/tally {tally_id}']
+        if 'name' in group and group['name'][()].decode() == tally_name:
+            return group
+    raise ValueError(f'tally with name {tally_name} not found in {statepoint_file.filename}')
+
+
+def sum_to_mean_and_std_dev(tally_sum, tally_sum_sq, n_realizations):
+    """Converts the sum and sum of squares saved in the statepoint to the mean
+    and standard deviation, in the same way as openmc.Tally does"""
+    mean = tally_sum / n_realizations
+    variance = (tally_sum_sq / n_realizations - np.square(mean)) / (n_realizations - 1)
+    return mean, np.sqrt(np.clip(variance, 0., None))
+
+
+def read_mesh_tally_slice(statepoint_filename, tally_name, basis='xz', slice_index=None, score_index=0):
+    """Reads a single slice of a mesh tally from a statepoint file. Only the
+    values in the slice are read from the disk.
+
+    Args:
+        statepoint_filename (pathlib.Path): the statepoint file
+        tally_name (str): the name of the tally, the tally must have a
+            MeshFilter on a RegularMesh and all the other filters must have a
+            single bin
+        basis (str): the plane of the slice 'xy', 'xz' or 'yz'
+        slice_index (int): the mesh index along the axis normal to the slice,
+            defaults to the middle of the mesh
+        score_index (int): the index of the score (and nuclide) to read
+
+    Returns:
+        tuple: the mean and std_dev 2D arrays, the extent of the slice and
+            the volume of a mesh voxel
+    """
+    # the axis across the plot, the axis up the plot and the axis normal to the slice
+    axes = {'xy': (0, 1, 2), 'xz': (0, 2, 1), 'yz': (1, 2, 0)}[basis]
+
+    with h5py.File(statepoint_filename, 'r') as statepoint_file:
+        group = get_tally_group(statepoint_file, tally_name)
+        n_realizations = group['n_realizations'][()]
+
+        # finds the mesh used by the mesh filter
+        mesh_group = None
+        n_filter_bins = []
+        for filter_id in group['filters'][()]:
+            filter_group = statepoint_file[f'tallies/filters/filter {filter_id}']
+            n_filter_bins.append(filter_group['n_bins'][()])
+            if filter_group['type'][()].decode() == 'mesh':
+                mesh_id = np.atleast_1d(filter_group['bins'][()])[0]
+                mesh_group = statepoint_file[f'tallies/meshes/mesh {mesh_id}']
+        if mesh_group is None or int(np.prod(n_filter_bins)) != int(np.prod(mesh_group['dimension'][()])):
+            raise ValueError('tally must have a MeshFilter and all other filters must have a single bin')
+
+        dimension = mesh_group['dimension'][()]
+        lower_left = mesh_group['lower_left'][()]
+        upper_right = mesh_group['upper_right'][()]
+
+        # mesh tally values are ordered with the x index changing fastest
+        strides = (1, dimension[0], dimension[0] * dimension[1])
+        across, up, normal = axes
+        if slice_index is None:
+            slice_index = dimension[normal] // 2
+
+        results = group['results']
+        tally_sum = np.zeros((dimension[up], dimension[across]))
+        tally_sum_sq = np.zeros((dimension[up], dimension[across]))
+        for j in range(dimension[up]):
+            # each row of the slice is a regularly spaced selection of the
+            # filter bins so it can be read as a single strided hyperslab
+            start = slice_index * strides[normal] + j * strides[up]
+            stop = start + dimension[across] * strides[across]
+            row = results[start:stop:strides[across], score_index, :]
+            tally_sum[j] = row[:, 0]
+            tally_sum_sq[j] = row[:, 1]
+
+    mean, std_dev = sum_to_mean_and_std_dev(tally_sum, tally_sum_sq, n_realizations)
+    extent = (lower_left[across], upper_right[across], lower_left[up], upper_right[up])
+    voxel_volume = np.prod((upper_right - lower_left) / dimension)
+    return mean, std_dev, extent, voxel_volume
+
+
+def plot_timestep(i_cool):
+    """Plots the dose slice for one cooling timestep, this is called in a
+    separate process for each timestep"""
+
+    # matplotlib is imported in each process with a backend that does not need a display
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+
+    statepoint_filename = statepoints_folder / "photons" / f"photon_at_time_{i_cool}" / statepoint_name
+    mean, std_dev, extent, voxel_volume = read_mesh_tally_slice(
+        statepoint_filename,
+        tally_name="photon_dose_on_mesh",
+        basis="xz",
+    )
+
+    # multiplication by pico_to_micro converts from (pico) pSv/s to (micro) uSv/s
+    # dividing by mesh voxel volume cancels out the cm3 units
+    scaling_factor = (seconds_to_hours * pico_to_micro) / voxel_volume
+
+    fig, ax = plt.subplots()
+    plot = ax.imshow(mean * scaling_factor, origin="lower", extent=extent, norm=LogNorm())
+    cbar = fig.colorbar(plot, ax=ax)
+    cbar.set_label("Decay photon dose [µSv/h]")
+    ax.set_xlabel("X [cm]")
+    ax.set_ylabel("Z [cm]")
+    fig.savefig(f'shut_down_dose_map_timestep_{i_cool}')
+    plt.close(fig)
+    return i_cool
+
+
+# the if __name__ == "__main__" is needed as each process in the pool imports this script
+if __name__ == "__main__":
+
+    photon_folders = sorted((statepoints_folder / "photons").glob("photon_at_time_*"))
+    cooling_steps = sorted(int(folder.name.split('_')[-1]) for folder in photon_folders)
+
+    with ProcessPoolExecutor() as executor:
+        for i_cool in executor.map(plot_timestep, cooling_steps):
+            print(f"plotted timestep {i_cool}")
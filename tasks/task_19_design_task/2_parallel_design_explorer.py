@@ -0,0 +1,339 @@
+"""
+This script searches every combination of coolant, first wall and breeder
+material for the design task instead of running each combination by hand.
+
+The designs are simulated at the same time in a pool of processes. Each
+design first runs a small number of pilot batches. If the pilot result already
+rules out the design against a constraint (for example the TBR is below the
+minimum even allowing for three standard deviations) the design is pruned and
+no more batches are run. Otherwise the simulation is restarted from the pilot
+statepoint and run to the full number of batches.
+
+The TBR, heating and damage results of each design are saved to a JSON file
+keyed by the design and the simulation settings, so running the script again
+skips the designs that have already been simulated.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import openmc
+
+# the design options
+coolant_names = ['water', 'helium', 'super_critical_co2']
+first_wall_names = ['tungsten', 'steel', 'silicon_carbide']
+breeder_names = ['lithium_lead', 'lithium_orthosilicate', 'lithium_titanate', 'liquid_lithium']
+reflector_name = 'graphite'  # the reflector is the same for every design
+
+# the constraints, designs that can not meet these are pruned after the pilot batches
+minimum_tbr = 1.0
+maximum_conductor_damage = None  # eV per source neutron, None for no limit
+minimum_blanket_heating = None  # eV per source neutron, None for no limit
+maximum_centre_column_heating = None  # eV per source neutron, None for no limit
+
+# the objective the designs that meet the constraints are ranked by, 'TBR' and
+# 'blanket_heating' are maximised and 'centre_column_heating' is minimised
+rank_by = 'TBR'
+
+# simulation settings
+particles = 500
+pilot_batches = 5
+batches = 20
+max_concurrent_designs = 4
+results_filename = 'design_results.json'
+designs_folder = Path('designs')
+
+
+def make_material(name):
+    """Makes one of the material options from the design task"""
+    material = openmc.Material(name=name)
+    if name == 'water':
+        material.add_element('H', 2)
+        material.add_element('O', 1)
+        material.set_density('g/cm3', 1)
+    elif name == 'helium':
+        material.add_element('He', 1)
+        material.set_density('g/cm3', 0.0014)
+    elif name == 'super_critical_co2':
+        material.add_element('C', 1)
+        material.add_element('O', 2)
+        material.set_density('g/cm3', 0.001)
+    elif name == 'tungsten':
+        material.add_element('W', 1, percent_type='wo')
+        material.set_density('g/cm3', 19.2)
+    elif name == 'steel':
+        material.add_element('Fe', 0.95, percent_type='wo')
+        material.add_element('C', 0.05, percent_type='wo')
+        material.set_density('g/cm3', 7.75)
+    elif name == 'silicon_carbide':
+        material.add_element('Si', 1)
+        material.add_element('C', 1)
+        material.set_density('g/cm3', 3.21)
+    elif name == 'graphite':
+        material.add_element('C', 1, percent_type='wo')
+        material.set_density('g/cm3', 2.2)
+    elif name == 'lithium_lead':
+        material.add_element('Pb', 84.2, percent_type='ao')
+        material.add_element('Li', 15.8, percent_type='ao', enrichment=90.0, enrichment_target='Li6', enrichment_type='ao')
+        material.set_density('g/cm3', 9.5)
+    elif name == 'lithium_orthosilicate':
+        material.add_element('Si', 1, percent_type='ao')
+        material.add_element('O', 4, percent_type='ao')
+        material.add_element('Li', 4, percent_type='ao', enrichment=50.0, enrichment_target='Li6', enrichment_type='ao')
+        material.set_density('g/cm3', 2.2)
+    elif name == 'lithium_titanate':
+        material.add_element('O', 12, percent_type='ao')
+        material.add_element('Ti', 5, percent_type='ao')
+        material.add_element('Li', 4, percent_type='ao', enrichment=40.0, enrichment_target='Li6', enrichment_type='ao')
+        material.set_density('g/cm3', 2.4)
+    elif name == 'liquid_lithium':
+        material.add_element('Li', 1, percent_type='ao', enrichment=7.0, enrichment_target='Li6', enrichment_type='ao')
+        material.set_density('g/cm3', 0.5)
+    else:
+        raise ValueError(f'unknown material {name}')
+    return material
+
+
+def make_model(coolant_name, first_wall_name, breeder_name):
+    """Makes the design task model with the chosen materials"""
+
+    mat_coolant = make_material(coolant_name)
+    mat_firstwall = make_material(first_wall_name)
+    mat_breeder = make_material(breeder_name)
+    mat_reflector = make_material(reflector_name)
+
+    mat_conductor = openmc.Material(name='mat_conductor')
+    mat_conductor.add_element('Nb', 1, percent_type='ao')
+    mat_conductor.add_element('Sn', 3, percent_type='ao')
+    mat_conductor.set_density('g/cm3', 8.96)
+
+    my_materials = openmc.Materials([mat_conductor, mat_coolant, mat_firstwall, mat_breeder, mat_reflector])
+
+    # surfaces
+    central_column_surface_outer = openmc.ZCylinder(r=100)
+    central_column_surface_mid = openmc.ZCylinder(r=95)
+    central_column_surface_inner = openmc.ZCylinder(r=90)
+
+    inner_sphere_surface = openmc.Sphere(r=495)
+    middle_sphere_surface = openmc.Sphere(r=500)
+    outer_sphere_surface = openmc.Sphere(r=505)
+    outer_outer_sphere_surface = openmc.Sphere(r=600)
+    edge_of_simulation_surface = openmc.Sphere(r=700, boundary_type='vacuum')
+
+    # regions
+    central_column_region = -central_column_surface_inner & -edge_of_simulation_surface
+    central_column_coolant_region = +central_column_surface_inner & -central_column_surface_mid & -edge_of_simulation_surface
+    central_column_fw_region = +central_column_surface_mid & -central_column_surface_outer & -edge_of_simulation_surface
+
+    inner_vessel_region = +central_column_surface_outer & -inner_sphere_surface
+
+    blanket_fw_region = -middle_sphere_surface & +inner_sphere_surface & +central_column_surface_outer
+    blanket_coolant_region = +middle_sphere_surface & -outer_sphere_surface & +central_column_surface_outer
+    blanket_breeder_region = +outer_sphere_surface & -outer_outer_sphere_surface & +central_column_surface_outer
+    blanket_reflector_region = +outer_outer_sphere_surface & -edge_of_simulation_surface & +central_column_surface_outer
+
+    # cells
+    central_column_cell = openmc.Cell(region=central_column_region, fill=mat_conductor)
+    central_column_coolant_cell = openmc.Cell(region=central_column_coolant_region, fill=mat_coolant)
+    central_column_fw_cell = openmc.Cell(region=central_column_fw_region, fill=mat_firstwall)
+    inner_vessel_cell = openmc.Cell(region=inner_vessel_region)
+    blanket_fw_cell = openmc.Cell(region=blanket_fw_region, fill=mat_firstwall)
+    blanket_coolant_cell = openmc.Cell(region=blanket_coolant_region, fill=mat_coolant)
+    blanket_breeder_cell = openmc.Cell(region=blanket_breeder_region, fill=mat_breeder)
+    blanket_reflector_cell = openmc.Cell(region=blanket_reflector_region, fill=mat_reflector)
+
+    my_geometry = openmc.Geometry([
+        central_column_cell,
+        central_column_coolant_cell,
+        central_column_fw_cell,
+        inner_vessel_cell,
+        blanket_fw_cell,
+        blanket_coolant_cell,
+        blanket_breeder_cell,
+        blanket_reflector_cell,
+    ])
+
+    my_source = openmc.IndependentSource()
+    radius = openmc.stats.Discrete([300], [1])
+    z_values = openmc.stats.Discrete([0], [1])
+    angle = openmc.stats.Uniform(a=0., b=2 * 3.14159265359)
+    my_source.space = openmc.stats.CylindricalIndependent(r=radius, phi=angle, z=z_values, origin=(0.0, 0.0, 0.0))
+    my_source.angle = openmc.stats.Isotropic()
+    my_source.energy = openmc.stats.muir(e0=14080000.0, m_rat=5.0, kt=20000.0)
+
+    my_settings = openmc.Settings()
+    my_settings.batches = pilot_batches  # this is increased after the pilot batches
+    my_settings.inactive = 0
+    my_settings.particles = particles
+    my_settings.run_mode = 'fixed source'
+    my_settings.source = my_source
+    # the statepoint after the pilot batches is used to restart the simulation
+    my_settings.statepoint = {'batches': [pilot_batches]}
+
+    tbr_tally = openmc.Tally(name='TBR')
+    tbr_tally.filters = [openmc.CellFilter(blanket_breeder_cell)]
+    tbr_tally.scores = ['(n,Xt)']
+
+    # the blanket heating is to be maximised and the centre column heating
+    # minimised so they are separate tallies
+    blanket_heating_tally = openmc.Tally(name='blanket_heating')
+    blanket_heating_tally.filters = [openmc.CellFilter([
+        blanket_breeder_cell,
+        blanket_coolant_cell,
+        blanket_fw_cell,
+    ])]
+    blanket_heating_tally.scores = ['heating']
+
+    centre_column_heating_tally = openmc.Tally(name='centre_column_heating')
+    centre_column_heating_tally.filters = [openmc.CellFilter([
+        central_column_cell,
+        central_column_coolant_cell,
+        central_column_fw_cell,
+    ])]
+    centre_column_heating_tally.scores = ['heating']
+
+    conductor_damage_tally = openmc.Tally(name='conductor_damage')
+    conductor_damage_tally.filters = [openmc.CellFilter(central_column_cell)]
+    conductor_damage_tally.scores = ['damage-energy']
+
+    my_tallies = openmc.Tallies([tbr_tally, blanket_heating_tally, centre_column_heating_tally, conductor_damage_tally])
+
+    return openmc.model.Model(my_geometry, my_materials, my_settings, my_tallies)
+
+
+tally_names = ['TBR', 'blanket_heating', 'centre_column_heating', 'conductor_damage']
+
+
+def get_design_key(coolant_name, first_wall_name, breeder_name):
+    """The key used in the results file. The simulation settings are part of
+    the key so that changing them causes the designs to be simulated again."""
+    settings_hash = hashlib.sha256(
+        repr((reflector_name, particles, pilot_batches, batches, tally_names)).encode()
+    ).hexdigest()[:8]
+    return f'{coolant_name}-{first_wall_name}-{breeder_name}-{settings_hash}'
+
+
+def read_tally_results(statepoint_filename):
+    """Reads the total of each tally from the statepoint"""
+    results = {}
+    with openmc.StatePoint(statepoint_filename) as statepoint:
+        for name in tally_names:
+            tally = statepoint.get_tally(name=name)
+            # the heating tallies have several cells in the same region which are added together
+            results[name] = {
+                'mean': float(tally.mean.sum()),
+                'std_dev': float(np.sqrt(np.sum(tally.std_dev**2))),
+            }
+    return results
+
+
+def is_ruled_out(results):
+    """Checks if a design can not meet the constraints. Three standard
+    deviations are allowed so that designs are not pruned because of noise"""
+    tbr = results['TBR']
+    if tbr['mean'] + 3 * tbr['std_dev'] < minimum_tbr:
+        return True
+    if maximum_conductor_damage is not None:
+        damage = results['conductor_damage']
+        if damage['mean'] - 3 * damage['std_dev'] > maximum_conductor_damage:
+            return True
+    if minimum_blanket_heating is not None:
+        heating = results['blanket_heating']
+        if heating['mean'] + 3 * heating['std_dev'] < minimum_blanket_heating:
+            return True
+    if maximum_centre_column_heating is not None:
+        heating = results['centre_column_heating']
+        if heating['mean'] - 3 * heating['std_dev'] > maximum_centre_column_heating:
+            return True
+    return False
+
+
+def simulate_design(coolant_name, first_wall_name, breeder_name, threads):
+    """Runs the pilot batches and then the rest of the batches if the design
+    has not been ruled out
+
+    Returns:
+        dict: the design materials, the status ('pruned' or 'complete'), the
+            number of batches run and the tally results
+    """
+    design_folder = designs_folder / get_design_key(coolant_name, first_wall_name, breeder_name)
+    model = make_model(coolant_name, first_wall_name, breeder_name)
+
+    pilot_statepoint = model.run(cwd=design_folder, threads=threads, output=False)
+    results = read_tally_results(pilot_statepoint)
+
+    design = {'coolant': coolant_name, 'first_wall': first_wall_name, 'breeder': breeder_name}
+    if is_ruled_out(results):
+        return {**design, 'status': 'pruned', 'batches': pilot_batches, 'results': results}
+
+    # continues from the pilot batches instead of starting again
+    model.settings.batches = batches
+    model.settings.statepoint = {'batches': [batches]}
+    final_statepoint = model.run(
+        cwd=design_folder,
+        threads=threads,
+        output=False,
+        restart_file=Path(pilot_statepoint).resolve(),
+    )
+    results = read_tally_results(final_statepoint)
+    status = 'pruned' if is_ruled_out(results) else 'complete'
+    return {**design, 'status': status, 'batches': batches, 'results': results}
+
+
+# the if __name__ == "__main__" is needed as each design is run in a separate process
+if __name__ == "__main__":
+
+    if Path(results_filename).exists():
+        with open(results_filename) as results_file:
+            results_store = json.load(results_file)
+    else:
+        results_store = {}
+
+    designs = list(itertools.product(coolant_names, first_wall_names, breeder_names))
+    designs_to_run = [design for design in designs if get_design_key(*design) not in results_store]
+    print(f'{len(designs)} designs, {len(designs) - len(designs_to_run)} found in {results_filename}')
+
+    # each design gets an equal share of the cores as threads
+    threads = max(1, os.cpu_count() // max_concurrent_designs)
+
+    with ProcessPoolExecutor(max_workers=max_concurrent_designs) as executor:
+        futures = {
+            executor.submit(simulate_design, *design, threads): design for design in designs_to_run
+        }
+        for future in as_completed(futures):
+            design_result = future.result()
+            results_store[get_design_key(*futures[future])] = design_result
+            tbr = design_result['results']['TBR']
+            print(f"{'-'.join(futures[future])} {design_result['status']} after {design_result['batches']} batches, TBR {tbr['mean']:.3f} +/- {tbr['std_dev']:.3f}")
+
+            # saves after each design so results are kept if the script is stopped
+            # only this process writes to the file so there are no clashes
+            with open(results_filename, 'w') as results_file:
+                json.dump(results_store, results_file, indent=2)
+
+    # ranks the designs that meet the constraints by the chosen objective
+    current_keys = {get_design_key(*design) for design in designs}
+    complete_designs = [
+        result for key, result in results_store.items()
+        if key in current_keys and result['status'] == 'complete'
+    ]
+    complete_designs.sort(
+        key=lambda result: result['results'][rank_by]['mean'],
+        reverse=rank_by != 'centre_column_heating',
+    )
+
+    print(f'\ndesigns that meet the constraints, best {rank_by} first')
+    for result in complete_designs:
+        r = result['results']
+        print(
+            f"{result['coolant']:20} {result['first_wall']:16} {result['breeder']:22} "
+            f"TBR {r['TBR']['mean']:.3f}  "
+            f"blanket heating {r['blanket_heating']['mean'] / 1e6:.2f} MeV  "
+            f"centre column heating {r['centre_column_heating']['mean'] / 1e6:.3f} MeV  "
+            f"conductor damage {r['conductor_damage']['mean']:.3e} eV"
+        )